@@ -1,15 +1,32 @@
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import pdfplumber
 import requests
 import json
-import re
-import io
 import logging
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import ContextVar, copy_context
 from datetime import datetime
 
+from documents import DocumentStore
+from downloads import DownloadError, download_pdf, sha256_stream
+from extraction import EXTRACTION_MODES, PAGE_SEPARATOR, ExtractionEngine, MemoryLimitExceeded
+from jobs import JobQueue, QueueFull, check_callback_url
+from llm_cache import FlightAborted, LLMCache, make_llm_key
+from llm_client import DEFAULT_API_BASE, GeminiClient, LLMError
+from metrics import Registry
+from normalizer import normalize_text
+from prompts import TRUNCATION_NOTE, build_prompt, build_reduce_prompt, estimate_tokens
+from quota import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, FileState, QuotaError, QuotaGovernor
+from retrieval import PassageIndex, PassageIndexCache, text_digest
+from structured_output import RESPONSE_SCHEMAS, parse_structured_response
+from summarizer import split_into_chunks, summarize_chunks
+from text_cache import TextCache, make_text_key
+from url_cache import UrlCache
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,273 +34,517 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+# Métriques exportées par /metrics (format texte Prometheus)
+metrics = Registry()
+DOWNLOAD_SECONDS = metrics.histogram("smartpdf_download_seconds", "Durée du téléchargement d'un PDF depuis une URL")
+EXTRACT_PAGE_SECONDS = metrics.histogram("smartpdf_extract_page_seconds", "Durée d'extraction du texte d'une page")
+EXTRACT_PEAK_MEMORY = metrics.histogram(
+    "smartpdf_extract_peak_memory_bytes", "Pic de mémoire résidente supplémentaire pendant l'extraction d'un PDF",
+    buckets=tuple(mb * 2 ** 20 for mb in (8, 16, 32, 64, 128, 256, 512, 1024, 2048))
+)
+CLEAN_SECONDS = metrics.histogram(
+    "smartpdf_clean_seconds", "Durée de clean_text_spaces sur une page",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+PROMPT_CHARS = metrics.histogram(
+    "smartpdf_prompt_chars", "Taille des prompts envoyés au modèle (caractères)", ["endpoint"],
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+)
+PROMPT_TOKENS = metrics.histogram(
+    "smartpdf_prompt_tokens", "Taille estimée des prompts envoyés au modèle (tokens)", ["endpoint"],
+    buckets=(125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+)
+LLM_SECONDS = metrics.histogram(
+    "smartpdf_llm_seconds", "Latence d'un appel au modèle, nouvelles tentatives HTTP comprises", ["endpoint"]
+)
+LLM_RETRIES = metrics.counter("smartpdf_llm_retries_total", "Nouvelles tentatives d'appel au modèle", ["endpoint"])
+FALLBACKS = metrics.counter(
+    "smartpdf_fallbacks_total", "Contenus de secours renvoyés à la place de la réponse du modèle",
+    ["endpoint", "section"]
+)
+VALIDATION_FAILURES = metrics.counter(
+    "smartpdf_llm_validation_failures_total",
+    "Réponses JSON du modèle rejetées (scope=response) ou éléments écartés (scope=item) par la validation",
+    ["endpoint", "scope"]
+)
+UPSTREAM_RESPONSES = metrics.counter(
+    "smartpdf_upstream_responses_total", "Réponses de l'API Gemini par code de statut", ["status"]
+)
+LLM_QUEUE_SECONDS = metrics.histogram(
+    "smartpdf_llm_queue_seconds", "Attente dans la file du gouverneur de quota avant une requête au modèle",
+    ["endpoint"], buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+LLM_THROTTLED = metrics.counter(
+    "smartpdf_llm_throttled_total",
+    "Appels au modèle refusés sans être envoyés (reason=circuit_open ou max_wait), contenu de secours servi",
+    ["endpoint", "reason"]
+)
+
+# Endpoint à l'origine de l'appel au modèle en cours (pour étiqueter les métriques du client HTTP)
+llm_endpoint = ContextVar("llm_endpoint", default="unknown")
+# Priorité des appels au modèle en cours : les tâches de POST /jobs passent après les requêtes interactives
+llm_priority = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+# Échéance (time.monotonic) des appels au modèle en cours : une section de /generate_all
+# s'arrête vraiment à SECTION_TIMEOUT, résumés partiels compris
+llm_deadline = ContextVar("llm_deadline", default=None)
+
+def record_llm_attempt(status, attempt):
+    """Observateur des tentatives HTTP du client Gemini"""
+    UPSTREAM_RESPONSES.inc(status=status)
+    if attempt:
+        LLM_RETRIES.inc(endpoint=llm_endpoint.get())
+
+def observe_prompt(endpoint, prompt):
+    PROMPT_CHARS.observe(len(prompt), endpoint=endpoint)
+    PROMPT_TOKENS.observe(estimate_tokens(prompt), endpoint=endpoint)
+
 # Config API Gemini
 API_KEY = os.getenv("API_KEY")
 MODEL = os.getenv("MODEL")
-BASE_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL}:generateContent?key={API_KEY}"
+
+# Quota de l'API : débit plafonné, file équitable et disjoncteur (état partagé entre workers
+# si LLM_QUOTA_STATE désigne un fichier, par exemple dans /dev/shm)
+LLM_QUOTA_STATE = os.getenv("LLM_QUOTA_STATE") or None
+quota_governor = QuotaGovernor(
+    rpm=float(os.getenv("LLM_RPM", "0")),
+    tpm=float(os.getenv("LLM_TPM", "0")),
+    state=FileState(LLM_QUOTA_STATE) if LLM_QUOTA_STATE else None,
+    max_wait=float(os.getenv("LLM_QUEUE_TIMEOUT", "20")),
+    breaker_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+    breaker_cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+    background_reserve=float(os.getenv("LLM_BACKGROUND_RESERVE", "0.2")),
+    on_wait=lambda seconds, endpoint: LLM_QUEUE_SECONDS.observe(seconds, endpoint=endpoint),
+)
+metrics.collected("gauge", "smartpdf_llm_circuit_open", "Disjoncteur de l'API Gemini ouvert (1) ou non (0)", [],
+                  lambda: {(): int(quota_governor.stats()["circuit"] == "open")})
+metrics.collected("gauge", "smartpdf_llm_queue_waiting", "Requêtes au modèle en attente de leur tour", [],
+                  lambda: {(): quota_governor.stats()["waiting"]})
+
+# Client HTTP partagé (pool de connexions keep-alive, backoff exponentiel avec jitter)
+gemini_client = GeminiClient(
+    API_KEY,
+    MODEL,
+    api_base=os.getenv("GEMINI_API_BASE", DEFAULT_API_BASE),
+    timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+    pool_size=int(os.getenv("LLM_POOL_SIZE", "10")),
+    pool_per_host=int(os.getenv("LLM_POOL_PER_HOST", "10")),
+    on_attempt=record_llm_attempt,
+    rate_limiter=quota_governor,
+)
+
+# Cache des réponses du modèle (TTL par endpoint)
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_TTLS = {
+    name: int(os.getenv(f"LLM_CACHE_TTL_{name.upper()}", str(LLM_CACHE_DEFAULT_TTL)))
+    for name in ("summary", "summary_chunk", "quiz", "flashcards", "resources")
+}
+# Sorties structurées natives (responseMimeType + responseSchema) ; LLM_JSON_MODE=0 pour un modèle
+# qui ne les accepte pas (seule la consigne dans le prompt est alors envoyée)
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "1").lower() in ("1", "true", "yes", "on")
+DEFAULT_MAX_OUTPUT_TOKENS = {
+    "summary": 1024,
+    "summary_chunk": 512,
+    "quiz": 2048,
+    "flashcards": 1536,
+    "resources": 1536,
+}
+MAX_OUTPUT_TOKENS = {
+    name: int(os.getenv(f"MAX_OUTPUT_TOKENS_{name.upper()}", str(default)))
+    for name, default in DEFAULT_MAX_OUTPUT_TOKENS.items()
+}
+
+llm_cache = LLMCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+    db_path=os.getenv("LLM_CACHE_DB") or None,
+    # La base garde les réponses le temps du plus long TTL, dans la limite de LLM_CACHE_DB_MAX_MB
+    ttl=max([LLM_CACHE_DEFAULT_TTL, *LLM_CACHE_TTLS.values()]) or None,
+    max_disk_bytes=int(os.getenv("LLM_CACHE_DB_MAX_MB", "256")) * 2 ** 20 or None,
+)
+# Attente maximale d'un appel identique déjà en cours (toutes ses tentatives et la file du
+# quota) ; au-delà, l'appelant interroge le modèle lui-même
+LLM_COALESCE_WAIT = 2 * (gemini_client.timeout * gemini_client.max_retries + quota_governor.max_wait)
+
+# Cache du texte extrait (partagé par tous les endpoints)
+text_cache = TextCache(
+    max_entries=int(os.getenv("TEXT_CACHE_SIZE", "128")),
+    db_path=os.getenv("TEXT_CACHE_DB") or None,
+    ttl=int(os.getenv("TEXT_CACHE_TTL", str(7 * 24 * 3600))),
+)
+
+# Cache du texte par page, adressé par l'empreinte de chaque page : une version modifiée
+# d'un PDF ne réextrait que ses pages modifiées (PAGE_CACHE_SIZE=0 et sans base : désactivé)
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "4096"))
+PAGE_CACHE_DB = os.getenv("PAGE_CACHE_DB", os.getenv("TEXT_CACHE_DB", "")) or None
+page_cache = TextCache(
+    max_entries=PAGE_CACHE_SIZE,
+    max_chars=int(os.getenv("PAGE_CACHE_MAX_CHARS", str(16_000_000))),
+    db_path=PAGE_CACHE_DB,
+    ttl=int(os.getenv("TEXT_CACHE_TTL", str(7 * 24 * 3600))),
+) if PAGE_CACHE_SIZE or PAGE_CACHE_DB else None
+
+# Extraction du texte des PDF (pool de processus pour les gros documents).
+# Mode par défaut : layout (mise en page reconstruite par pdfplumber), fast (lecture directe
+# du flux de texte, sans reconstruction) ou auto (fast, sauf pages en colonnes ou tableaux) ;
+# une requête peut choisir le sien avec le paramètre `extraction_mode`.
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "layout").lower()
+if EXTRACT_MODE not in EXTRACTION_MODES:
+    logger.warning(f"EXTRACT_MODE invalide ignoré: {EXTRACT_MODE}")
+    EXTRACT_MODE = "layout"
+# Garde-fou mémoire : une extraction qui fait grossir le processus (ou un worker) de plus
+# de EXTRACT_MAX_MEMORY_MB est interrompue avec une erreur explicite (0 : pas de limite)
+EXTRACT_MAX_MEMORY_MB = int(os.getenv("EXTRACT_MAX_MEMORY_MB", "1024"))
+extraction_engine = ExtractionEngine(
+    max_pages=int(os.getenv("EXTRACT_MAX_PAGES", "50")),
+    workers=int(os.getenv("EXTRACT_WORKERS", "0")) or None,
+    pages_per_task=int(os.getenv("EXTRACT_PAGES_PER_TASK", "4")),
+    page_timeout=float(os.getenv("EXTRACT_PAGE_TIMEOUT", "10")),
+    pool_min_pages=int(os.getenv("EXTRACT_POOL_MIN_PAGES", "8")),
+    on_page=EXTRACT_PAGE_SECONDS.observe,
+    page_cache=page_cache,
+    mode=EXTRACT_MODE,
+    memory_limit=EXTRACT_MAX_MEMORY_MB * 2 ** 20 or None,
+    on_memory=EXTRACT_PEAK_MEMORY.observe,
+)
+
+# Téléchargement des PDF depuis une URL
+URL_MAX_BYTES = int(os.getenv("URL_MAX_BYTES", str(50 * 1024 * 1024)))
+URL_SPOOL_BYTES = int(os.getenv("URL_SPOOL_BYTES", str(5 * 1024 * 1024)))
+
+# Cache HTTP local des PDF téléchargés (requêtes conditionnelles, LRU par octets)
+URL_CACHE_MAX_BYTES = int(os.getenv("URL_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+url_cache = UrlCache(
+    os.getenv("URL_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "smartpdf-url-cache"),
+    max_bytes=URL_CACHE_MAX_BYTES,
+) if URL_CACHE_MAX_BYTES > 0 else None
+
+# Budgets de tokens (estimés localement, voir prompts.py) des prompts envoyés au modèle.
+# Un texte de résumé qui ne tient pas dans son budget passe par le map-reduce.
+DEFAULT_PROMPT_TOKEN_BUDGETS = {
+    "summary": 8000,
+    "quiz": 3000,
+    "flashcards": 3000,
+    "resources": 3000,
+}
+PROMPT_TOKEN_BUDGETS = {
+    name: int(os.getenv(f"PROMPT_TOKEN_BUDGET_{name.upper()}", str(default)))
+    for name, default in DEFAULT_PROMPT_TOKEN_BUDGETS.items()
+}
+
+# Budgets de caractères du texte extrait, par endpoint
+DEFAULT_TEXT_BUDGET = 6000
+TEXT_BUDGET_MAX = int(os.getenv("TEXT_BUDGET_MAX", "50000"))
+TEXT_BUDGETS = {
+    # Le résumé couvre tout le document (map-reduce au-delà de SUMMARY_CHUNK_CHARS)
+    "summary": int(os.getenv("TEXT_BUDGET_SUMMARY", str(TEXT_BUDGET_MAX))),
+    # Quiz et flashcards indexent tout le document puis n'en gardent que les passages pertinents
+    "quiz": int(os.getenv("TEXT_BUDGET_QUIZ", str(TEXT_BUDGET_MAX))),
+    "flashcards": int(os.getenv("TEXT_BUDGET_FLASHCARDS", str(TEXT_BUDGET_MAX))),
+    # Assez de texte pour remplir le prompt, même avec beaucoup d'espaces (6 caractères par token)
+    "resources": int(os.getenv("TEXT_BUDGET_RESOURCES", str(6 * PROMPT_TOKEN_BUDGETS["resources"]))),
+    "documents": int(os.getenv("TEXT_BUDGET_DOCUMENTS", str(TEXT_BUDGET_MAX))),
+}
+TEXT_BUDGETS["all"] = max(TEXT_BUDGETS[name] for name in ("summary", "quiz", "flashcards", "resources"))
+
+# Appels LLM parallèles de /generate_all
+SECTION_TIMEOUT = float(os.getenv("SECTION_TIMEOUT", "45"))
+llm_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_WORKERS", "8")),
+    thread_name_prefix="llm"
+)
+
+# Résumé map-reduce des documents longs : morceaux résumés en parallèle puis synthétisés
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", str(DEFAULT_TEXT_BUDGET)))
+SUMMARY_MAP_WORKERS = int(os.getenv("SUMMARY_MAP_WORKERS", "4"))
+summary_executor = ThreadPoolExecutor(
+    max_workers=SUMMARY_MAP_WORKERS,
+    thread_name_prefix="summary"
+)
+
+# Sélection des passages pertinents (index BM25) pour les prompts du quiz et des flashcards
+PASSAGE_CHARS = int(os.getenv("PASSAGE_CHARS", "800"))
+PASSAGE_TOKEN_BUDGETS = {
+    name: int(os.getenv(f"PASSAGE_TOKEN_BUDGET_{name.upper()}", "1500"))
+    for name in ("quiz", "flashcards")
+}
+passage_indexes = PassageIndexCache(max_entries=int(os.getenv("PASSAGE_INDEX_CACHE_SIZE", "64")))
+
+# Documents extraits une fois puis réutilisés via leur document_id
+document_store = DocumentStore(
+    max_documents=int(os.getenv("DOCUMENT_STORE_SIZE", "256")),
+    max_bytes=int(os.getenv("DOCUMENT_STORE_MAX_BYTES", str(64 * 1024 * 1024))),
+    idle_ttl=int(os.getenv("DOCUMENT_IDLE_TTL", "3600")),
+)
+
+def _cache_counters(field):
+    caches = {"text": text_cache, "llm": llm_cache, "passage_index": passage_indexes}
+    values = {name: cache.stats()[field] for name, cache in caches.items()}
+    if page_cache:
+        values["page"] = page_cache.stats()[field]
+    if url_cache:
+        values["url"] = url_cache.stats()["revalidated" if field == "hits" else "misses"]
+    return values
+
+metrics.collected("counter", "smartpdf_cache_hits_total", "Succès des caches", ["cache"],
+                  lambda: _cache_counters("hits"))
+metrics.collected("counter", "smartpdf_cache_misses_total", "Échecs des caches", ["cache"],
+                  lambda: _cache_counters("misses"))
+
 def clean_text_spaces(text):
     """
     Nettoie et corrige les espaces dans le texte extrait.
+    (motifs précompilés, voir normalizer.py)
     """
-    if not text:
-        return text
-    
-    # 1. Remplacer les espaces multiples et tabulations par un seul espace
-    text = re.sub(r'[ \t]+', ' ', text)
-    
-    # 2. Ajouter un espace après les ponctuations si manquant
-    text = re.sub(r'([.,;:!?])(?=[A-Za-zÀ-ÿ])', r'\1 ', text)
-    
-    # 3. Corriger les mots collés (minuscule suivie de majuscule)
-    text = re.sub(r'([a-zà-ÿ])([A-ZÀ-Ÿ])', r'\1 \2', text)
-    
-    # 4. Corriger les chiffres collés aux lettres
-    text = re.sub(r'(\d)([A-Za-zÀ-ÿ])', r'\1 \2', text)
-    text = re.sub(r'([A-Za-zÀ-ÿ])(\d)', r'\1 \2', text)
-    
-    # 5. Ajouter espace avant parenthèses ouvrantes
-    text = re.sub(r'([A-Za-zÀ-ÿ])\(', r'\1 (', text)
-    
-    # 6. Ajouter espace après parenthèses fermantes (sauf si ponctuation après)
-    text = re.sub(r'\)(?=[A-Za-zÀ-ÿ])', ') ', text)
-    
-    # 7. Conserver les sauts de ligne significatifs
-    text = re.sub(r'\.\s+', '.\n', text)
-    text = re.sub(r'\?\s+', '?\n', text)
-    text = re.sub(r'!\s+', '!\n', text)
-    
-    # 8. Supprimer les espaces en début/fin de ligne
-    text = '\n'.join(line.strip() for line in text.split('\n') if line.strip())
-    
-    # 9. Remplacer les espaces insécables ou spéciaux par des espaces normaux
-    text = text.replace('\u00A0', ' ')  # espace insécable
-    text = text.replace('\u200B', '')   # espace de largeur nulle
-    
-    # 10. Final: remplacer les espaces multiples consécutifs par un seul
-    text = re.sub(r' +', ' ', text)
-    
-    return text
+    return normalize_text(text)
 
-def parse_markdown_quiz(markdown_text):
-    """Parse le texte Markdown du quiz pour le convertir en structure JSON"""
-    quiz_data = []
+def build_payload(prompt, is_json=False, endpoint=None):
+    """
+    Construit la requête generateContent.
+    En mode JSON, le schéma de l'endpoint est envoyé (responseSchema) : le modèle produit
+    directement la structure attendue, sans consigne supplémentaire dans le prompt.
+    """
+    generation_config = {
+        "temperature": 0.3,
+        "topP": 0.8,
+        "topK": 40
+    }
+    if MAX_OUTPUT_TOKENS.get(endpoint):
+        generation_config["maxOutputTokens"] = MAX_OUTPUT_TOKENS[endpoint]
+
+    full_prompt = prompt
+    if is_json and LLM_JSON_MODE:
+        generation_config["responseMimeType"] = "application/json"
+        if endpoint in RESPONSE_SCHEMAS:
+            generation_config["responseSchema"] = RESPONSE_SCHEMAS[endpoint]
+    elif is_json:
+        system_instruction = """Tu dois répondre UNIQUEMENT avec un objet JSON valide.
+        Réponds UNIQUEMENT avec le JSON, sans texte supplémentaire."""
+        
+        full_prompt = f"{system_instruction}\n\n{prompt}"
     
+    return {
+        "contents": [{
+            "parts": [{"text": full_prompt}]
+        }],
+        "generationConfig": generation_config
+    }
+
+def call_gemini(prompt, is_json=False, max_retries=2, endpoint=None, fresh=False, deadline=None):
+    """
+    Appelle l'API Gemini avec gestion des erreurs.
+    Les réponses valides sont mises en cache (TTL par endpoint, `fresh` pour ignorer le cache)
+    et les appels identiques simultanés n'en font qu'un.
+    `deadline` (time.monotonic, par défaut celle du contexte) borne l'appel et ses nouvelles tentatives.
+    """
+    if deadline is None:
+        deadline = llm_deadline.get()
+    payload = build_payload(prompt, is_json, endpoint)
+    cache_key = make_llm_key(MODEL, payload)
+
+    if not fresh:
+        cached = llm_cache.get(cache_key, LLM_CACHE_TTLS.get(endpoint, LLM_CACHE_DEFAULT_TTL))
+        if cached is not None:
+            logger.info(f"Réponse du modèle servie depuis le cache ({endpoint})")
+            return cached
+
+    def generate():
+        observe_prompt(endpoint or "unknown", prompt)
+        result = _generate_content(payload, is_json, max_retries, endpoint or "unknown", deadline)
+        if result is not None:
+            llm_cache.set(cache_key, result)
+        elif deadline is not None and time.monotonic() >= deadline:
+            # Échec dû à l'échéance de cet appelant : les appelants regroupés refont l'appel
+            raise FlightAborted()
+        return result
+
+    context_token = llm_endpoint.set(endpoint or "unknown")
     try:
-        if "### Questions" not in markdown_text or "### Corrections" not in markdown_text:
-            return None
-        
-        questions_section = markdown_text.split("### Questions")[1].split("### Corrections")[0]
-        corrections_section = markdown_text.split("### Corrections")[1]
-        
-        questions = []
-        question_pattern = r'\*\*(\d+)\.\s*(.+?)\*\*'
-        question_matches = list(re.finditer(question_pattern, questions_section, re.DOTALL))
-        
-        for i, match in enumerate(question_matches):
-            question_num = int(match.group(1))
-            question_text = match.group(2).strip()
-            
-            start_pos = match.end()
-            if i < len(question_matches) - 1:
-                end_pos = question_matches[i + 1].start()
-                options_text = questions_section[start_pos:end_pos]
-            else:
-                options_text = questions_section[start_pos:]
-            
-            options = []
-            option_pattern = r'([a-d])\)\s*(.+?)(?=\n[a-d]\)|\n\n|$)'
-            option_matches = re.findall(option_pattern, options_text, re.DOTALL)
-            
-            for letter, option_text in option_matches:
-                options.append(f"{letter}) {option_text.strip()}")
-            
-            if len(options) != 4:
-                while len(options) < 4:
-                    options.append("")
-            
-            questions.append({
-                'number': question_num,
-                'question': question_text,
-                'options': options
-            })
-        
-        corrections = {}
-        correction_pattern = r'\*\*(\d+)\.\s*Réponse\s*:\s*([a-d])\)\s*(.+?)\*\*'
-        correction_matches = re.findall(correction_pattern, corrections_section, re.DOTALL)
-        
-        for num, letter, answer_text in correction_matches:
-            corrections[int(num)] = {
-                'answer_letter': letter,
-                'answer_text': answer_text.strip()
-            }
-        
-        explanations = {}
-        explanation_pattern = r'\*\*(\d+)\.\s*Réponse\s*:\s*[a-d]\)\s*.+?\*\*\s*\*Explication\s*:\s*(.+?)(?=\n\*\*\d+\.|\n\n|$)'
-        explanation_matches = re.findall(explanation_pattern, corrections_section, re.DOTALL)
-        
-        for num, explanation in explanation_matches:
-            explanations[int(num)] = explanation.strip()
-        
-        for q in questions:
-            question_num = q['number']
-            correct_option = ""
-            
-            if question_num in corrections:
-                correct_letter = corrections[question_num]['answer_letter']
-                for option in q['options']:
-                    if option.startswith(f"{correct_letter})"):
-                        correct_option = option
-                        break
-            
-            explanation = explanations.get(question_num, "Pas d'explication disponible.")
-            
-            quiz_data.append({
-                'question': q['question'],
-                'options': q['options'],
-                'answer': correct_option,
-                'explanation': explanation
-            })
-        
-        return quiz_data
-        
-    except Exception as e:
-        logger.error(f"Erreur lors du parsing du Markdown: {e}")
-        return None
-
-def call_gemini(prompt, is_json=False, max_retries=2):
-    """Appelle l'API Gemini avec gestion des erreurs"""
+        if fresh:
+            # Un appel `fresh` veut sa propre réponse : il ne rejoint pas un appel en cours
+            result = generate()
+        else:
+            wait_limit = LLM_COALESCE_WAIT
+            if deadline is not None:
+                wait_limit = min(wait_limit, max(deadline - time.monotonic(), 0))
+            result = llm_cache.singleflight(cache_key, generate, wait_limit)
+    except FlightAborted:
+        result = None
+    finally:
+        llm_endpoint.reset(context_token)
+    if result is None:
+        return None if is_json else "Erreur: Impossible de générer le contenu."
+    return result
+
+def _generate_content(payload, is_json, max_retries, endpoint="unknown", deadline=None):
+    """Appel du modèle avec nouvelles tentatives si la réponse est inexploitable ; None en cas d'échec"""
     for attempt in range(max_retries):
+        if attempt:
+            LLM_RETRIES.inc(endpoint=endpoint)
         try:
-            if is_json:
-                system_instruction = """Tu dois répondre UNIQUEMENT avec un objet JSON valide.
-                Réponds UNIQUEMENT avec le JSON, sans texte supplémentaire."""
-                
-                full_prompt = f"{system_instruction}\n\n{prompt}"
-            else:
-                full_prompt = prompt
-            
-            payload = {
-                "contents": [{
-                    "parts": [{"text": full_prompt}]
-                }],
-                "generationConfig": {
-                    "temperature": 0.3,
-                    "topP": 0.8,
-                    "topK": 40
-                }
-            }
-            
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(BASE_URL, json=payload, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                if "candidates" in result and result["candidates"]:
-                    text_response = result["candidates"][0]["content"]["parts"][0]["text"]
-                    
-                    if is_json:
-                        clean_text = text_response.strip()
-                        
-                        if clean_text.startswith("```json"):
-                            clean_text = clean_text[7:]
-                        if clean_text.startswith("```"):
-                            clean_text = clean_text[3:]
-                        if clean_text.endswith("```"):
-                            clean_text = clean_text[:-3]
-                        clean_text = clean_text.strip()
-                        
-                        try:
-                            return json.loads(clean_text)
-                        except json.JSONDecodeError:
-                            logger.warning("JSON invalide, tentative de parsing Markdown")
-                            parsed = parse_markdown_quiz(clean_text)
-                            if parsed:
-                                return parsed
-                            continue
-                    else:
-                        return text_response
-                        
-            else:
-                logger.error(f"Erreur API: {response.status_code}")
-                
-        except Exception as e:
-            logger.error(f"Exception lors de l'appel Gemini: {e}")
-        
-        import time
-        time.sleep(1)
+            # Les erreurs réseau / HTTP sont déjà réessayées par le client
+            with LLM_SECONDS.time(endpoint=endpoint):
+                text_response = gemini_client.generate_text(payload, endpoint, llm_priority.get(), deadline)
+        except QuotaError as e:
+            # API saturée ou indisponible : contenu de secours tout de suite, sans autre tentative
+            LLM_THROTTLED.inc(endpoint=endpoint, reason=e.reason)
+            logger.warning(f"Appel Gemini non envoyé ({endpoint}): {e}")
+            break
+        except LLMError as e:
+            logger.error(f"Appel Gemini abandonné: {e}")
+            break
+
+        result = parse_model_response(text_response, is_json, endpoint)
+        if result is not None:
+            return result
+
+        if attempt < max_retries - 1:
+            delay = gemini_client.delay(attempt)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
     
-    return None if is_json else "Erreur: Impossible de générer le contenu."
+    return None
 
-def extract_text_from_pdf(pdf_file, clean_spaces=True):
-    """Extrait le texte d'un PDF avec option de nettoyage des espaces"""
-    text = ""
-    try:
-        with pdfplumber.open(pdf_file) as pdf:
-            for i, page in enumerate(pdf.pages[:10]):
-                # Utiliser layout=True pour mieux préserver la structure
-                page_text = page.extract_text(layout=True)
-                if page_text:
-                    text += page_text + "\n"
-        
-        if not text.strip():
-            return None, "Le PDF ne contient pas de texte lisible"
-        
-        # Nettoyer les espaces si demandé
+def parse_model_response(text_response, is_json, endpoint=None):
+    """
+    Texte de la réponse, ou structure JSON validée pour l'endpoint ; None si inexploitable.
+    Les réponses JSON imparfaites (texte autour, virgules finales, troncature...) sont réparées.
+    """
+    if text_response is None:
+        logger.warning("Réponse Gemini sans candidat")
+        return None
+    if not is_json:
+        return text_response
+
+    endpoint = endpoint or "unknown"
+    result = parse_structured_response(
+        text_response, endpoint,
+        on_invalid=lambda count: VALIDATION_FAILURES.inc(count, endpoint=endpoint, scope="item")
+    )
+    if result is None:
+        VALIDATION_FAILURES.inc(endpoint=endpoint, scope="response")
+        logger.warning(f"Réponse JSON inexploitable ({endpoint})")
+    return result
+
+def truncate_text(text, max_chars, complete=True):
+    """Coupe le texte au budget de caractères, avec une mention si le document continue"""
+    if len(text) > max_chars or not complete:
+        return text[:max_chars] + TRUNCATION_NOTE
+    return text
+
+def iter_page_texts(source, clean_spaces=True, mode=None):
+    """Produit le texte (nettoyé si demandé) de chaque page non vide, page par page"""
+    for page_text in extraction_engine.iter_pages(source, mode):
+        if not page_text:
+            continue
         if clean_spaces:
-            text = clean_text_spaces(text)
-            
-        if len(text) > 6000:
-            text = text[:6000] + "\n\n[Texte tronqué pour des raisons de performance]"
-            
-        return text, None
+            with CLEAN_SECONDS.time():
+                page_text = clean_text_spaces(page_text)
+            if not page_text:
+                continue
+        yield page_text
+
+def _extract_text(source, digest, clean_spaces=True, max_chars=None, mode=None):
+    """
+    Extrait le texte d'un PDF (octets ou fichier binaire), via le cache de texte
+    indexé par le SHA-256 `digest` du PDF et le mode d'extraction.
+    L'extraction s'arrête dès que le budget de caractères est atteint.
+    """
+    max_chars = max_chars or DEFAULT_TEXT_BUDGET
+    mode = mode or EXTRACT_MODE
+    cache_key = make_text_key(digest, clean_spaces, mode)
+    cached = text_cache.get(cache_key)
+    if cached is not None:
+        text, complete = cached
+        # Un texte partiel n'est utilisable que s'il couvre le budget demandé
+        if complete or len(text) > max_chars:
+            logger.info("Texte extrait servi depuis le cache")
+            return truncate_text(text, max_chars, complete), None
+
+    # Extraction page par page, arrêtée une fois le budget atteint
+    parts = []
+    length = 0
+    complete = True
+    pages = iter_page_texts(source, clean_spaces, mode)
+    try:
+        for page_text in pages:
+            parts.append(page_text)
+            length += len(page_text) + len(PAGE_SEPARATOR)
+            if length > max_chars:
+                complete = False
+                break
+    except MemoryLimitExceeded as e:
+        logger.warning(f"Extraction abandonnée: {e}")
+        return None, str(e)
+    finally:
+        pages.close()
+
+    # Pages séparées par un saut de page : le résumé map-reduce coupe ses morceaux aux pages
+    text = PAGE_SEPARATOR.join(parts)
+    if not clean_spaces:
+        text += "\n"
+
+    if not text.strip():
+        return None, "Le PDF ne contient pas de texte lisible"
+
+    text_cache.set(cache_key, text, complete=complete)
+    return truncate_text(text, max_chars, complete), None
+
+def extract_text_from_pdf(pdf_file, clean_spaces=True, max_chars=None, mode=None):
+    """Extrait le texte d'un PDF avec option de nettoyage des espaces et mode d'extraction (EXTRACTION_MODES)"""
+    try:
+        # Fichier uploadé : lu sur place (werkzeug le garde en mémoire ou sur disque ;
+        # `.stream` pour Flask, `.file` pour Starlette)
+        stream = getattr(pdf_file, "stream", None) or getattr(pdf_file, "file", pdf_file)
+        return _extract_text(stream, sha256_stream(stream), clean_spaces, max_chars, mode)
         
     except Exception as e:
         logger.error(f"Erreur lors de l'extraction PDF: {e}")
         return None, f"Erreur lors de la lecture du PDF: {str(e)}"
 
-def process_pdf_from_url(url, clean_spaces=True):
-    """Télécharge et traite un PDF depuis une URL"""
+def process_pdf_from_url(url, clean_spaces=True, max_chars=None, mode=None):
+    """Télécharge et traite un PDF depuis une URL (mode d'extraction : voir extract_text_from_pdf)"""
     try:
         # Valider l'URL
         if not url.startswith(('http://', 'https://')):
             return None, "URL invalide"
         
-        # Télécharger le PDF
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        if response.status_code != 200:
-            return None, f"Impossible de télécharger le PDF (HTTP {response.status_code})"
+        # Revalider la copie locale éventuelle (If-None-Match / If-Modified-Since)
+        cached = url_cache.lookup(url) if url_cache else None
         
-        # Vérifier que c'est bien un PDF
-        content_type = response.headers.get('content-type', '').lower()
-        if 'pdf' not in content_type and not url.lower().endswith('.pdf'):
-            return None, "Le contenu n'est pas un PDF"
+        # Télécharger le PDF par blocs (taille plafonnée, en-tête %PDF- vérifié)
+        with DOWNLOAD_SECONDS.time():
+            download = download_pdf(
+                url,
+                max_bytes=URL_MAX_BYTES,
+                timeout=30,
+                spool_bytes=URL_SPOOL_BYTES,
+                headers=UrlCache.validators(cached)
+            )
         
-        # Lire le PDF depuis les bytes
-        pdf_bytes = io.BytesIO(response.content)
-        text = ""
+        if download.not_modified:
+            reused = url_cache.open(url)
+            if reused is not None:
+                # 304 : octets et texte déjà extrait réutilisés
+                logger.info("PDF non modifié, copie locale réutilisée")
+                fileobj, digest = reused
+                with fileobj:
+                    return _extract_text(fileobj, digest, clean_spaces, max_chars, mode)
+            # Copie locale disparue entre-temps : téléchargement complet
+            with DOWNLOAD_SECONDS.time():
+                download = download_pdf(url, max_bytes=URL_MAX_BYTES, timeout=30, spool_bytes=URL_SPOOL_BYTES)
         
-        with pdfplumber.open(pdf_bytes) as pdf:
-            for i, page in enumerate(pdf.pages[:10]):
-                # Utiliser layout=True pour mieux préserver la structure
-                page_text = page.extract_text(layout=True)
-                if page_text:
-                    text += page_text + "\n"
+        if url_cache:
+            url_cache.record_miss()
+            url_cache.store(url, download.buffer, download.digest, download.etag, download.last_modified)
         
-        if not text.strip():
-            return None, "Le PDF ne contient pas de texte lisible"
-        
-        # Nettoyer les espaces si demandé
-        if clean_spaces:
-            text = clean_text_spaces(text)
-        
-        # Limiter la taille du texte
-        if len(text) > 6000:
-            text = text[:6000] + "\n\n[Texte tronqué pour des raisons de performance]"
-        print("OK")
-        return text, None
+        # pdfplumber lit directement le fichier temporaire
+        with download.buffer:
+            return _extract_text(download.buffer, download.digest, clean_spaces, max_chars, mode)
         
+    except DownloadError as e:
+        logger.warning(f"Téléchargement refusé: {e}")
+        return None, str(e)
     except requests.exceptions.RequestException as e:
         logger.error(f"Erreur de téléchargement: {e}")
         return None, f"Erreur de téléchargement: {str(e)}"
@@ -352,6 +613,62 @@ def generate_fallback_resources():
         }
     ]
 
+def _summarize_chunk(prompt):
+    """Résumé d'un morceau (mis en cache individuellement) ; None en cas d'échec"""
+    summary = call_gemini(prompt, is_json=False, endpoint="summary_chunk")
+    if not summary or summary.startswith("Erreur"):
+        return None
+    return summary
+
+def prepare_summary_prompt(text):
+    """
+    Construit le prompt du résumé final et retourne (Prompt, nombre de morceaux).
+    Un texte qui dépasse le budget de tokens du résumé est découpé, chaque morceau est
+    résumé en parallèle, puis le prompt demande la synthèse des résumés partiels.
+    """
+    budget = PROMPT_TOKEN_BUDGETS["summary"]
+    prompt = build_prompt("summary", text, budget)
+    if not prompt.truncated:
+        return prompt, 1
+
+    chunks = split_into_chunks(text, SUMMARY_CHUNK_CHARS)
+    partial_summaries = summarize_chunks(chunks, _summarize_chunk, summary_executor)
+    if not partial_summaries:
+        logger.warning("Aucun morceau résumé, résumé du début du document uniquement")
+        return prompt, 1
+    if len(partial_summaries) < len(chunks):
+        logger.warning(f"{len(chunks) - len(partial_summaries)} morceau(x) sur {len(chunks)} non résumé(s)")
+    return build_reduce_prompt(partial_summaries, budget), len(chunks)
+
+def select_passages(text, endpoint):
+    """
+    Retourne (texte, nombre de passages) : les passages les plus pertinents de tout
+    le document, dans le budget de tokens de l'endpoint. L'index est mis en cache
+    par hash du texte, il est donc construit une seule fois par document.
+    """
+    text = text.removesuffix(TRUNCATION_NOTE)
+    if estimate_tokens(text) <= PASSAGE_TOKEN_BUDGETS[endpoint]:
+        return text, None
+
+    index = passage_indexes.get_or_build(
+        text_digest(text),
+        lambda: PassageIndex(split_into_chunks(text, PASSAGE_CHARS))
+    )
+    passages = index.select(PASSAGE_TOKEN_BUDGETS[endpoint])
+    if not passages:
+        return truncate_text(text, PASSAGE_TOKEN_BUDGETS[endpoint] * 4), None
+    return "\n\n[...]\n\n".join(passages), len(passages)
+
+def build_section_prompt(name, text):
+    """
+    Prompt d'une section JSON (quiz, flashcards, ressources) dans son budget de tokens ;
+    retourne (Prompt, nombre de passages sélectionnés ou None)
+    """
+    passages_count = None
+    if name in PASSAGE_TOKEN_BUDGETS:
+        text, passages_count = select_passages(text, name)
+    return build_prompt(name, text, PROMPT_TOKEN_BUDGETS[name]), passages_count
+
 @app.route("/process_pdf", methods=["POST"])
 def process_pdf():
     """Traite un PDF envoyé depuis l'extension (fichier ou URL)"""
@@ -360,13 +677,13 @@ def process_pdf():
         if 'pdf' in request.files:
             file = request.files['pdf']
             if file and file.filename != '' and file.filename.lower().endswith('.pdf'):
-                return process_uploaded_pdf(file)
+                return process_uploaded_pdf(file, resolve_extraction_mode())
         
         # Vérifier si c'est une URL envoyée en JSON
         if request.is_json:
             data = request.get_json()
             if 'url' in data:
-                return process_pdf_url_endpoint(data['url'])
+                return process_pdf_url_endpoint(data['url'], resolve_extraction_mode(data))
         
         return jsonify({"error": "Aucun PDF valide reçu"}), 400
         
@@ -374,10 +691,10 @@ def process_pdf():
         logger.error(f"Erreur inattendue: {e}")
         return jsonify({"error": str(e)}), 500
 
-def process_uploaded_pdf(file):
+def process_uploaded_pdf(file, mode=None):
     """Traite un fichier PDF uploadé"""
     try:
-        text, error = extract_text_from_pdf(file, clean_spaces=True)
+        text, error = extract_text_from_pdf(file, clean_spaces=True, mode=mode)
         if error:
             return jsonify({"error": error}), 400
         
@@ -395,10 +712,10 @@ def process_uploaded_pdf(file):
         logger.error(f"Erreur lors du traitement du fichier PDF: {e}")
         return jsonify({"error": f"Erreur de traitement: {str(e)}"}), 500
 
-def process_pdf_url_endpoint(url):
+def process_pdf_url_endpoint(url, mode=None):
     """Point d'entrée pour traiter un PDF depuis une URL"""
     try:
-        text, error = process_pdf_from_url(url, clean_spaces=True)
+        text, error = process_pdf_from_url(url, clean_spaces=True, mode=mode)
         if error:
             return jsonify({"error": error}), 400
         
@@ -416,60 +733,160 @@ def process_pdf_url_endpoint(url):
         logger.error(f"Erreur lors du traitement de l'URL: {e}")
         return jsonify({"error": f"Erreur de traitement: {str(e)}"}), 500
 
-@app.route("/generate_summary", methods=["POST"])
-def generate_summary():
-    """Génère uniquement le résumé"""
+def is_fresh_request():
+    """Vrai si le client demande une génération fraîche (paramètre `fresh`), sans cache"""
+    data = request.get_json(silent=True) if request.is_json else None
+    value = (data or {}).get("fresh") if isinstance(data, dict) else None
+    if value is None:
+        value = request.form.get("fresh") or request.args.get("fresh")
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+def sse_event(event, data):
+    """Formate un événement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def resolve_text_budget(endpoint, data=None, form=None):
+    """Budget de caractères : paramètre max_chars de la requête, sinon budget de l'endpoint"""
+    form = request.form if form is None else form
+    requested = (data or {}).get("max_chars") or form.get("max_chars")
+    if requested:
+        try:
+            return max(500, min(int(requested), TEXT_BUDGET_MAX))
+        except (TypeError, ValueError):
+            logger.warning(f"max_chars invalide ignoré: {requested}")
+    return TEXT_BUDGETS.get(endpoint, DEFAULT_TEXT_BUDGET)
+
+def resolve_extraction_mode(data=None, form=None):
+    """Mode d'extraction : paramètre extraction_mode de la requête, sinon EXTRACT_MODE"""
+    form = request.form if form is None else form
+    requested = (data or {}).get("extraction_mode") or form.get("extraction_mode")
+    if requested:
+        if str(requested).lower() in EXTRACTION_MODES:
+            return str(requested).lower()
+        logger.warning(f"extraction_mode invalide ignoré: {requested}")
+    return EXTRACT_MODE
+
+def get_request_text(endpoint):
+    """
+    Récupère le texte à traiter pour la requête courante, limité au budget de l'endpoint.
+    Sources acceptées : document_id, PDF uploadé, URL (FormData ou JSON) ou texte brut.
+    Retourne (text, error, status_code).
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    data = data if isinstance(data, dict) else {}
+    return load_text(endpoint, data, request.form, request.files, request.is_json)
+
+def load_text(endpoint, data, form, files, is_json):
+    """
+    Cœur de get_request_text, indépendant du framework web (réutilisé par asgi.py) :
+    `data` est le corps JSON, `form` et `files` les champs et fichiers d'un FormData.
+    """
+    max_chars = resolve_text_budget(endpoint, data, form)
+    mode = resolve_extraction_mode(data, form)
+
+    # Cas 0 : document déjà extrait via POST /documents
+    document_id = data.get("document_id") or form.get("document_id")
+    if document_id:
+        text = document_store.get(document_id)
+        if text is None:
+            return None, "Document inconnu ou expiré", 404
+        return truncate_text(text, max_chars), None, 200
+
+    # Cas 1 : PDF Uploadé (FormData)
+    if "pdf" in files:
+        file = files.get("pdf")
+        if not file or file.filename == "":
+            return None, "Aucun fichier PDF reçu", 400
+        text, error = extract_text_from_pdf(file, clean_spaces=True, max_chars=max_chars, mode=mode)
+
+    # Cas 2 : URL envoyée via FormData
+    elif "url" in form:
+        text, error = process_pdf_from_url(form.get("url"), clean_spaces=True, max_chars=max_chars, mode=mode)
+
+    # Cas 3 : JSON
+    elif is_json:
+        if "url" in data:
+            text, error = process_pdf_from_url(data["url"], clean_spaces=True, max_chars=max_chars, mode=mode)
+        elif "text" in data:
+            text, error = truncate_text(data["text"], max_chars), None
+        else:
+            return None, "Aucun PDF ou URL fourni", 400
+
+    else:
+        return None, "Aucun fichier ou URL reçu", 400
+
+    if error:
+        return None, error, 400
+    return text, None, 200
+
+@app.route("/documents", methods=["POST"])
+def create_document():
+    """Extrait un PDF une seule fois et retourne un document_id réutilisable"""
     try:
-        # Cas 1 : PDF Uploadé
+        data = request.get_json(silent=True) if request.is_json else None
+        data = data if isinstance(data, dict) else {}
+        max_chars = resolve_text_budget("documents", data)
+        mode = resolve_extraction_mode(data)
+
         if "pdf" in request.files:
             file = request.files.get("pdf")
             if not file or file.filename == "":
                 return jsonify({"error": "Aucun fichier PDF reçu"}), 400
+            source = file.filename
+            text, error = extract_text_from_pdf(file, clean_spaces=True, max_chars=max_chars, mode=mode)
+        else:
+            url = request.form.get("url") or data.get("url")
+            if not url:
+                return jsonify({"error": "Aucun fichier ou URL reçu"}), 400
+            source = url
+            text, error = process_pdf_from_url(url, clean_spaces=True, max_chars=max_chars, mode=mode)
 
-            text, error = extract_text_from_pdf(file, clean_spaces=True)
+        if error:
+            return jsonify({"error": error}), 400
 
-        # Cas 2 : URL via FormData
-        elif "url" in request.form:
-            url = request.form.get("url")
-            text, error = process_pdf_from_url(url, clean_spaces=True)
+        document_id = document_store.put(text, source=source)
+        return jsonify({
+            "success": True,
+            "document_id": document_id,
+            "text_length": len(text),
+            "expires_in": document_store.idle_ttl
+        }), 201
 
-        # Cas 3 : JSON (optionnel)
-        elif request.is_json:
-            data = request.get_json()
-            if "url" in data:
-                text, error = process_pdf_from_url(data["url"], clean_spaces=True)
-            elif "text" in data:
-                text = data["text"]
-                error = None
-            else:
-                return jsonify({"error": "Aucun PDF ou URL fourni"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        logger.error(f"Erreur lors de la création du document: {e}")
+        return jsonify({"error": f"Erreur de traitement: {str(e)}"}), 500
 
-        else:
-            return jsonify({"error": "Aucun fichier ou URL reçu"}), 400
+@app.route("/documents/<document_id>", methods=["DELETE"])
+def delete_document(document_id):
+    """Libère un document avant son expiration"""
+    if not document_store.delete(document_id):
+        return jsonify({"error": "Document inconnu ou expiré"}), 404
+    return jsonify({"success": True}), 200
 
-        # Gestion erreurs extraction PDF
+@app.route("/generate_summary", methods=["POST"])
+def generate_summary():
+    """Génère uniquement le résumé"""
+    try:
+        text, error, status = get_request_text("summary")
         if error:
-            return jsonify({"error": error}), 400
+            return jsonify({"error": error}), status
 
-        # Construction du prompt
-        summary_prompt = f"""
-Tu es un expert en synthèse de documents.
-Fais un résumé clair, structuré et concis du texte suivant.
-Le résumé doit être en français et ne pas dépasser 300 mots.
+        summary_prompt, chunks_count = prepare_summary_prompt(text)
 
-Texte à résumer:
-{text}
-"""
-
-        summary = call_gemini(summary_prompt, is_json=False)
+        summary = call_gemini(summary_prompt.text, is_json=False, endpoint="summary", fresh=is_fresh_request())
 
         if not summary or summary.startswith("Erreur"):
+            FALLBACKS.inc(endpoint="summary", section="summary")
             summary = "Impossible de générer le résumé. Veuillez réessayer."
 
         return jsonify({
             "summary": summary,
             "metadata": {
                 "text_length": len(text),
+                "chunks": chunks_count,
+                "prompt_tokens": summary_prompt.tokens,
                 "status": "success"
             }
         })
@@ -481,74 +898,99 @@ Texte à résumer:
             "summary": "Une erreur est survenue lors de la génération du résumé."
         }), 500
 
-@app.route("/generate_quiz", methods=["POST"])
-def generate_quiz():
-    """Génère uniquement le quiz"""
+@app.route("/generate_summary_stream", methods=["POST"])
+def generate_summary_stream():
+    """Génère le résumé en streaming (Server-Sent Events)"""
     try:
-        # ----- Cas 1 : PDF Upload (FormData) -----
-        if "pdf" in request.files:
-            file = request.files.get("pdf")
-            if not file or file.filename == "":
-                return jsonify({"error": "Aucun fichier PDF reçu"}), 400
-
-            text, error = extract_text_from_pdf(file, clean_spaces=True)
+        text, error, status = get_request_text("summary")
+        if error:
+            return jsonify({"error": error}), status
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération du résumé: {e}")
+        return jsonify({"error": f"Erreur lors de la génération du résumé: {str(e)}"}), 500
 
-        # ----- Cas 2 : URL envoyée via FormData -----
-        elif "url" in request.form:
-            url = request.form.get("url")
-            text, error = process_pdf_from_url(url, clean_spaces=True)
+    fresh = is_fresh_request()
 
-        # ----- Cas 3 : Envoi JSON (optionnel) -----
-        elif request.is_json:
-            data = request.get_json()
-            if "url" in data:
-                text, error = process_pdf_from_url(data["url"], clean_spaces=True)
-            elif "text" in data:
-                text = data["text"]
-                error = None
-            else:
-                return jsonify({"error": "Aucun PDF ou URL fourni"}), 400
+    def events():
+        # Pour un document long, les morceaux sont résumés avant de streamer la synthèse
+        try:
+            summary_prompt, chunks_count = prepare_summary_prompt(text)
+        except Exception as e:
+            logger.error(f"Erreur lors du résumé des morceaux: {e}")
+            FALLBACKS.inc(endpoint="summary_stream", section="summary")
+            yield sse_event("error", {"error": "Impossible de générer le résumé. Veuillez réessayer."})
+            return
+        payload = build_payload(summary_prompt.text, endpoint="summary")
+        cache_key = make_llm_key(MODEL, payload)
+        cached = None if fresh else llm_cache.get(cache_key, LLM_CACHE_TTLS["summary"])
+
+        if cached is not None:
+            # Résumé déjà généré : envoyé en un seul fragment
+            yield sse_event("chunk", {"text": cached})
+            yield sse_event("done", {
+                "metadata": {
+                    "text_length": len(text),
+                    "chunks": chunks_count,
+                    "prompt_tokens": summary_prompt.tokens,
+                    "summary_length": len(cached),
+                    "status": "success"
+                }
+            })
+            return
 
+        chunks = []
+        summary_length = 0
+        observe_prompt("summary_stream", summary_prompt.text)
+        context_token = llm_endpoint.set("summary_stream")
+        started = time.perf_counter()
+        try:
+            for chunk in gemini_client.stream_text(payload, "summary_stream", llm_priority.get()):
+                chunks.append(chunk)
+                summary_length += len(chunk)
+                yield sse_event("chunk", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Erreur lors du streaming du résumé: {e}")
+            if not summary_length:
+                FALLBACKS.inc(endpoint="summary_stream", section="summary")
+                yield sse_event("error", {"error": "Impossible de générer le résumé. Veuillez réessayer."})
+                return
         else:
-            return jsonify({"error": "Aucun fichier ou URL reçu"}), 400
+            if chunks:
+                llm_cache.set(cache_key, "".join(chunks))
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, endpoint="summary_stream")
+            llm_endpoint.reset(context_token)
+        yield sse_event("done", {
+            "metadata": {
+                "text_length": len(text),
+                "chunks": chunks_count,
+                "prompt_tokens": summary_prompt.tokens,
+                "summary_length": summary_length,
+                "status": "success" if summary_length else "empty"
+            }
+        })
 
-        # ----- Vérification erreurs extraction -----
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/generate_quiz", methods=["POST"])
+def generate_quiz():
+    """Génère uniquement le quiz"""
+    try:
+        text, error, status = get_request_text("quiz")
         if error:
-            return jsonify({"error": error}), 400
+            return jsonify({"error": error}), status
+
+        quiz_prompt, passages_count = build_section_prompt("quiz", text)
 
-        # ----- Prompt génération quiz -----
-        quiz_prompt = f"""
-Tu es un générateur expert de quiz pédagogiques.
-
-Basé sur le texte suivant, génère un quiz de 5 questions à choix multiples.
-
-INSTRUCTIONS:
-1. Génère exactement 5 questions.
-2. Chaque question doit avoir exactement 4 options.
-3. Formate les options ainsi : "a) ...", "b) ...", "c) ...", "d) ...".
-4. Indique clairement la bonne réponse : "answer": "a) ...".
-5. Ajoute une explication pour chaque bonne réponse.
-6. Utilise uniquement les informations contenues dans le texte.
-7. Retourne la réponse en JSON valide.
-
-Format attendu:
-[
-  {{
-    "question": "Texte",
-    "options": ["a) ...", "b) ...", "c) ...", "d) ..."],
-    "answer": "a) ...",
-    "explanation": "..."
-  }}
-]
-
-Texte:
-{text}
-"""
-
-        quiz_data = call_gemini(quiz_prompt, is_json=True)
+        quiz_data = call_gemini(quiz_prompt.text, is_json=True, endpoint="quiz", fresh=is_fresh_request())
 
         # Si modèle ne renvoie rien → fallback
         if quiz_data is None:
+            FALLBACKS.inc(endpoint="quiz", section="quiz")
             quiz_data = generate_fallback_quiz()
 
         return jsonify({
@@ -556,6 +998,8 @@ Texte:
             "metadata": {
                 "text_length": len(text),
                 "questions_count": len(quiz_data) if quiz_data else 0,
+                "passages": passages_count,
+                "prompt_tokens": quiz_prompt.tokens,
                 "status": "success"
             }
         })
@@ -571,67 +1015,16 @@ Texte:
 def generate_flashcards():
     """Génère des flashcards basées sur le PDF ou l’URL"""
     try:
-        # ----- Cas 1 : PDF Uploadé (FormData) -----
-        if "pdf" in request.files:
-            file = request.files.get("pdf")
-            if not file or file.filename == "":
-                return jsonify({"error": "Aucun fichier PDF reçu"}), 400
-
-            text, error = extract_text_from_pdf(file, clean_spaces=True)
-
-        # ----- Cas 2 : URL envoyée via FormData -----
-        elif "url" in request.form:
-            url = request.form.get("url")
-            text, error = process_pdf_from_url(url, clean_spaces=True)
-
-        # ----- Cas 3 : Envoi JSON (optionnel) -----
-        elif request.is_json:
-            data = request.get_json()
-            if "url" in data:
-                text, error = process_pdf_from_url(data["url"], clean_spaces=True)
-            elif "text" in data:
-                text = data["text"]
-                error = None
-            else:
-                return jsonify({"error": "Aucun PDF ou URL fourni"}), 400
-        
-        else:
-            return jsonify({"error": "Aucun fichier ou URL reçu"}), 400
-
-        # ----- Vérification erreurs extraction -----
+        text, error, status = get_request_text("flashcards")
         if error:
-            return jsonify({"error": error}), 400
+            return jsonify({"error": error}), status
 
-        # ----- Prompt génération flashcards -----
-        flashcards_prompt = f"""
-Tu es un expert pédagogique spécialisé dans la création de flashcards.
+        flashcards_prompt, passages_count = build_section_prompt("flashcards", text)
 
-Basé sur le texte suivant, génère exactement **10 flashcards éducatives**.
-
-INSTRUCTIONS STRICTES :
-1. Génère exactement 10 flashcards.
-2. Chaque flashcard doit contenir :
-   - "recto": une question ou un concept
-   - "verso": la réponse ou l’explication
-3. Les flashcards doivent couvrir les concepts les plus importants du texte.
-4. Sois clair, concis et pédagogique.
-5. Retourne uniquement du JSON valide.
-
-FORMAT EXACT :
-[
-  {{
-    "recto": "Question ou concept",
-    "verso": "Réponse ou explication"
-  }}
-]
-
-Texte :
-{text}
-"""
-
-        flashcards_data = call_gemini(flashcards_prompt, is_json=True)
+        flashcards_data = call_gemini(flashcards_prompt.text, is_json=True, endpoint="flashcards", fresh=is_fresh_request())
 
         if flashcards_data is None:
+            FALLBACKS.inc(endpoint="flashcards", section="flashcards")
             flashcards_data = generate_fallback_flashcards()
 
         return jsonify({
@@ -639,6 +1032,8 @@ Texte :
             "metadata": {
                 "text_length": len(text),
                 "flashcards_count": len(flashcards_data) if flashcards_data else 0,
+                "passages": passages_count,
+                "prompt_tokens": flashcards_prompt.tokens,
                 "status": "success"
             }
         })
@@ -654,70 +1049,16 @@ Texte :
 def generate_educational_resources():
     """Génère des ressources éducatives basées sur le PDF ou l'URL"""
     try:
-        # ----- Cas 1 : PDF Uploadé via FormData -----
-        if "pdf" in request.files:
-            file = request.files.get("pdf")
-            if not file or file.filename == "":
-                return jsonify({"error": "Aucun fichier PDF reçu"}), 400
-
-            text, error = extract_text_from_pdf(file, clean_spaces=True)
-
-        # ----- Cas 2 : URL envoyée via FormData -----
-        elif "url" in request.form:
-            url = request.form.get("url")
-            text, error = process_pdf_from_url(url, clean_spaces=True)
-
-        # ----- Cas 3 : JSON (optionnel) -----
-        elif request.is_json:
-            data = request.get_json()
-            if "url" in data:
-                text, error = process_pdf_from_url(data["url"], clean_spaces=True)
-            elif "text" in data:
-                text = data["text"]
-                error = None
-            else:
-                return jsonify({"error": "Aucun PDF ou URL fourni"}), 400
-
-        else:
-            return jsonify({"error": "Aucun fichier ou URL reçu"}), 400
-
-        # ----- Vérification erreurs extraction -----
+        text, error, status = get_request_text("resources")
         if error:
-            return jsonify({"error": error}), 400
+            return jsonify({"error": error}), status
 
-        # ----- Prompt -----
-        resources_prompt = f"""
-Tu es un expert en pédagogie et recommandation de ressources d'apprentissage.
-
-Basé sur le texte suivant, génère **5 à 8 ressources éducatives** pour approfondir le sujet.
-
-INSTRUCTIONS STRICTES :
-1. Génère entre 5 et 8 ressources.
-2. Pour chaque ressource, fournis :
-   - "type": (livre, article, vidéo, cours en ligne, MOOC, documentaire, etc.)
-   - "title": titre de la ressource
-   - "description": bref résumé (1 à 3 phrases)
-   - "why_useful": pourquoi cette ressource est pertinente pour comprendre le sujet
-3. Propose des ressources **réelles si possible**, sinon cohérentes.
-4. Retourne uniquement un JSON valide.
-
-FORMAT ATTENDU :
-[
-  {{
-    "type": "livre",
-    "title": "Titre du livre",
-    "description": "Courte description",
-    "why_useful": "Raison de pertinence"
-  }}
-]
-
-Texte :
-{text}
-"""
-
-        resources_data = call_gemini(resources_prompt, is_json=True)
+        resources_prompt, _ = build_section_prompt("resources", text)
+
+        resources_data = call_gemini(resources_prompt.text, is_json=True, endpoint="resources", fresh=is_fresh_request())
 
         if resources_data is None:
+            FALLBACKS.inc(endpoint="resources", section="resources")
             resources_data = generate_fallback_resources()
 
         return jsonify({
@@ -725,6 +1066,7 @@ Texte :
             "metadata": {
                 "text_length": len(text),
                 "resources_count": len(resources_data) if resources_data else 0,
+                "prompt_tokens": resources_prompt.tokens,
                 "status": "success"
             }
         })
@@ -736,21 +1078,275 @@ Texte :
             "resources": generate_fallback_resources()
         }), 500
 
-@app.route("/health", methods=["GET"])
-def health_check():
-    """Vérifie que le serveur fonctionne"""
-    return jsonify({
+# Sections produites par /generate_all : (réponse JSON attendue, secours)
+GENERATE_ALL_SECTIONS = {
+    "summary": (False, lambda: "Impossible de générer le résumé. Veuillez réessayer."),
+    "quiz": (True, generate_fallback_quiz),
+    "flashcards": (True, generate_fallback_flashcards),
+    "resources": (True, generate_fallback_resources),
+}
+
+def run_section(name, text, fresh=False, deadline=None):
+    """
+    Appelle le modèle pour une section de /generate_all (ou du traitement par lots, batch.py) ;
+    retourne (résultat, tokens du prompt). Passé `deadline` (time.monotonic), les appels au
+    modèle de la section (résumés partiels compris) abandonnent au lieu de continuer en arrière-plan.
+    """
+    is_json = GENERATE_ALL_SECTIONS[name][0]
+    deadline_token = llm_deadline.set(deadline)
+    try:
+        if name == "summary":
+            prompt, _ = prepare_summary_prompt(truncate_text(text, TEXT_BUDGETS[name]))
+        else:
+            prompt, _ = build_section_prompt(name, truncate_text(text, TEXT_BUDGETS[name]))
+        result = call_gemini(prompt.text, is_json=is_json, endpoint=name, fresh=fresh, deadline=deadline)
+    finally:
+        llm_deadline.reset(deadline_token)
+    if result is None or (not is_json and (not result or result.startswith("Erreur"))):
+        raise ValueError("Réponse vide ou invalide du modèle")
+    return result, prompt.tokens
+
+@app.route("/generate_all", methods=["POST"])
+def generate_all():
+    """Génère résumé, quiz, flashcards et ressources en un seul appel (requêtes LLM en parallèle)"""
+    try:
+        text, error, status = get_request_text("all")
+        if error:
+            return jsonify({"error": error}), status
+
+        started = time.monotonic()
+        fresh = is_fresh_request()
+        # Les sections en retard s'arrêtent d'elles-mêmes à l'échéance (future.cancel n'arrête pas un thread)
+        deadline = started + SECTION_TIMEOUT
+        futures = {
+            # copy_context : la priorité de l'appelant (tâche de fond ou non) suit chaque section
+            name: llm_executor.submit(copy_context().run, run_section, name, text, fresh, deadline)
+            for name in GENERATE_ALL_SECTIONS
+        }
+        done, _ = wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
+
+        results = {}
+        sections_status = {}
+        prompt_tokens = {}
+        for name, future in futures.items():
+            fallback = GENERATE_ALL_SECTIONS[name][1]
+            if future not in done:
+                # Section pas encore démarrée : annulée ; en cours : elle abandonne à l'échéance
+                future.cancel()
+                logger.warning(f"Section {name} : délai dépassé, utilisation du secours")
+                FALLBACKS.inc(endpoint="all", section=name)
+                results[name] = fallback()
+                sections_status[name] = "timeout"
+                continue
+            try:
+                results[name], prompt_tokens[name] = future.result()
+                sections_status[name] = "success"
+            except Exception as e:
+                logger.warning(f"Section {name} : échec ({e}), utilisation du secours")
+                FALLBACKS.inc(endpoint="all", section=name)
+                results[name] = fallback()
+                sections_status[name] = "fallback"
+
+        results["metadata"] = {
+            "text_length": len(text),
+            "questions_count": len(results["quiz"]),
+            "flashcards_count": len(results["flashcards"]),
+            "resources_count": len(results["resources"]),
+            "sections": sections_status,
+            "prompt_tokens": prompt_tokens,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+            "status": "success"
+        }
+        return jsonify(results)
+
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération combinée: {e}")
+        return jsonify({
+            "error": f"Erreur lors de la génération combinée: {str(e)}",
+            "quiz": generate_fallback_quiz(),
+            "flashcards": generate_fallback_flashcards(),
+            "resources": generate_fallback_resources()
+        }), 500
+
+# Tâches asynchrones : vue exécutée par la file de tâches, selon l'endpoint demandé
+JOB_VIEWS = {
+    "summary": ("/generate_summary", generate_summary),
+    "quiz": ("/generate_quiz", generate_quiz),
+    "flashcards": ("/generate_flashcards", generate_flashcards),
+    "resources": ("/generate_educational_resources", generate_educational_resources),
+    "all": ("/generate_all", generate_all),
+}
+
+def spool_job_pdf(stream, filename):
+    """
+    Copie par blocs un PDF uploadé dans un fichier temporaire, pour qu'une tâche en file
+    ne le garde pas en mémoire. Retourne (paramètre `pdf` de la tâche, taille en octets) ;
+    lève ValueError si le fichier dépasse URL_MAX_BYTES.
+    """
+    fd, path = tempfile.mkstemp(prefix="smartpdf-job-", suffix=".pdf")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > URL_MAX_BYTES:
+                    raise ValueError("Le PDF dépasse la taille maximale autorisée")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return (path, filename), size
+
+def release_job_params(params):
+    """Supprime le PDF temporaire d'une tâche terminée ou refusée"""
+    if "pdf" in params:
+        os.remove(params["pdf"][0])
+
+def run_job(job):
+    """Exécute une tâche en rejouant sa requête sur la vue de l'endpoint ; retourne (JSON, code HTTP)"""
+    path, view = JOB_VIEWS[job.endpoint]
+    params = dict(job.params)
+    pdf_file = None
+    if "pdf" in params:
+        pdf_path, filename = params.pop("pdf")
+        pdf_file = open(pdf_path, "rb")
+        params["data"] = {**params.get("data", {}), "pdf": (pdf_file, filename)}
+    priority_token = llm_priority.set(PRIORITY_BACKGROUND)
+    try:
+        with app.test_request_context(path, method="POST", **params):
+            response = app.make_response(view())
+            return response.get_json(silent=True), response.status_code
+    finally:
+        llm_priority.reset(priority_token)
+        if pdf_file is not None:
+            pdf_file.close()
+
+# Hôtes autorisés comme callback_url malgré une adresse non publique (réseau interne de confiance)
+JOB_CALLBACK_ALLOWED_HOSTS = tuple(
+    host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+)
+job_queue = JobQueue(
+    run_job,
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queued=int(os.getenv("JOB_QUEUE_SIZE", "64")),
+    # PDF des tâches non terminées (fichiers temporaires) : au-delà, POST /jobs répond 429
+    max_queued_bytes=int(os.getenv("JOB_QUEUE_MAX_MB", "512")) * 1024 * 1024,
+    release=release_job_params,
+    retention=int(os.getenv("JOB_RETENTION", "3600")),
+    callback_allowed_hosts=JOB_CALLBACK_ALLOWED_HOSTS,
+)
+metrics.collected("gauge", "smartpdf_jobs", "Tâches en attente ou en cours", ["state"],
+                  lambda: {state: job_queue.stats()[state] for state in ("queued", "running")})
+metrics.collected("counter", "smartpdf_jobs_rejected_total", "Tâches refusées (file pleine)", [],
+                  lambda: {(): job_queue.stats()["rejected"]})
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Met en file une génération (champ `endpoint` : summary, quiz, flashcards, resources ou all)
+    avec les mêmes entrées que l'endpoint synchrone, et retourne aussitôt un job_id.
+    `callback_url` (optionnel) reçoit le résultat en POST à la fin de la tâche.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    data = data if isinstance(data, dict) else {}
+    endpoint = data.get("endpoint") or request.form.get("endpoint")
+    if endpoint not in JOB_VIEWS:
+        return jsonify({"error": f"endpoint invalide, valeurs possibles: {', '.join(JOB_VIEWS)}"}), 400
+
+    callback_url = data.get("callback_url") or request.form.get("callback_url")
+    if callback_url:
+        error = check_callback_url(callback_url, JOB_CALLBACK_ALLOWED_HOSTS)
+        if error:
+            return jsonify({"error": error}), 400
+
+    size = 0
+    if request.is_json:
+        params = {"json": data}
+    else:
+        params = {"data": request.form.to_dict()}
+        if "pdf" in request.files:
+            file = request.files["pdf"]
+            try:
+                params["pdf"], size = spool_job_pdf(file.stream, file.filename)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 413
+
+    try:
+        job_id = job_queue.submit(endpoint, params, callback_url=callback_url, size=size)
+    except QueueFull as e:
+        response = jsonify({"error": "Serveur occupé, réessayez plus tard", "retry_after": e.retry_after})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+
+    response = jsonify({"job_id": job_id, "status": "queued"})
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return response, 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """État et résultat d'une tâche"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Tâche inconnue ou expirée"}), 404
+    return jsonify(job), 200
+
+def cancel_response(job):
+    """Corps et code HTTP de DELETE /jobs/<job_id> pour l'état retourné par job_queue.cancel"""
+    body = {"job_id": job["job_id"], "status": job["status"], "cancel_requested": job["cancel_requested"]}
+    if job["status"] == "running":
+        # Une génération en cours ne s'interrompt pas : seul son résultat sera ignoré
+        body["message"] = "Tâche déjà en cours : elle ira à son terme, son résultat sera ignoré"
+        return body, 202
+    return body, 200
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Annule une tâche en attente, demande l'annulation d'une tâche en cours, ou oublie une tâche terminée"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Tâche inconnue ou expirée"}), 404
+    body, status_code = cancel_response(job)
+    return jsonify(body), status_code
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Métriques au format texte de Prometheus"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def health_payload():
+    """Contenu de GET /health, commun au serveur Flask et au serveur ASGI (asgi.py)"""
+    return {
         "status": "healthy",
         "service": "PDF Mentor IA",
         "timestamp": datetime.now().isoformat(),
         "endpoints": {
             "process_pdf": "POST /process_pdf (fichier ou URL)",
+            "documents": "POST /documents (fichier ou URL) -> document_id",
             "summary": "POST /generate_summary",
+            "summary_stream": "POST /generate_summary_stream (SSE)",
             "quiz": "POST /generate_quiz",
             "flashcards": "POST /generate_flashcards",
-            "resources": "POST /generate_educational_resources"
-        }
-    }), 200
+            "resources": "POST /generate_educational_resources",
+            "all": "POST /generate_all",
+            "jobs": "POST /jobs, GET /jobs/<id>, DELETE /jobs/<id>",
+            "metrics": "GET /metrics"
+        },
+        "text_cache": text_cache.stats(),
+        "page_cache": page_cache.stats() if page_cache else None,
+        "url_cache": url_cache.stats() if url_cache else None,
+        "llm_cache": llm_cache.stats(),
+        "passage_indexes": passage_indexes.stats(),
+        "documents": document_store.stats(),
+        "jobs": job_queue.stats()
+    }
+
+@app.route("/health", methods=["GET"])
+def health_check():
+    """Vérifie que le serveur fonctionne"""
+    return jsonify(health_payload()), 200
 
 if __name__ == "__main__":
     print("=" * 60)
@@ -758,10 +1354,15 @@ if __name__ == "__main__":
     print("=" * 60)
     print("Endpoints disponibles:")
     print("1. Process PDF: POST http://localhost:5000/process_pdf (fichier ou URL)")
+    print("   Documents:  POST http://localhost:5000/documents (fichier ou URL)")
     print("2. Résumé:     POST http://localhost:5000/generate_summary")
+    print("   (streaming)  POST http://localhost:5000/generate_summary_stream")
     print("3. Quiz:       POST http://localhost:5000/generate_quiz")
     print("4. Flashcards: POST http://localhost:5000/generate_flashcards")
     print("5. Ressources: POST http://localhost:5000/generate_educational_resources")
-    print("6. Santé:      GET  http://localhost:5000/health")
+    print("6. Tout:       POST http://localhost:5000/generate_all")
+    print("   Tâches:     POST http://localhost:5000/jobs (endpoint + entrées)")
+    print("7. Santé:      GET  http://localhost:5000/health")
+    print("   Métriques:  GET  http://localhost:5000/metrics")
     print("=" * 60)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
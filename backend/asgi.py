@@ -0,0 +1,562 @@
+"""
+Serveur ASGI (Starlette) : mêmes endpoints et même contrat JSON que app.py.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Les appels au modèle sont asynchrones (aiohttp) : une requête qui attend Gemini
+n'occupe pas de thread. L'extraction des PDF, les téléchargements et les calculs
+(index BM25) passent par le pool de threads de Starlette. Configuration, caches,
+documents, prompts et file de tâches sont ceux de app.py.
+"""
+import asyncio
+import contextlib
+import logging
+from collections import namedtuple
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import app as core
+from jobs import QueueFull, check_callback_url
+from llm_cache import make_llm_key
+from llm_client import AsyncGeminiClient, LLMError
+from prompts import build_chunk_prompt, build_prompt, build_reduce_prompt
+from quota import QuotaError
+from summarizer import split_into_chunks
+
+logger = logging.getLogger(__name__)
+
+gemini_client = AsyncGeminiClient(
+    core.API_KEY,
+    core.MODEL,
+    api_base=core.gemini_client.api_base,
+    timeout=core.gemini_client.timeout,
+    max_retries=core.gemini_client.max_retries,
+    pool_size=core.gemini_client.pool_size,
+    pool_per_host=core.gemini_client.pool_per_host,
+    on_attempt=core.record_llm_attempt,
+    # Même gouverneur de quota que le client synchrone (tâches de fond comprises)
+    rate_limiter=core.quota_governor,
+)
+
+# Appels identiques en cours (équivalent asynchrone de LLMCache.singleflight)
+_flights = {}
+_summary_slots = asyncio.Semaphore(core.SUMMARY_MAP_WORKERS)
+
+# Corps de requête décodé : JSON, champs et fichiers d'un FormData
+RequestBody = namedtuple("RequestBody", "data form files is_json fresh")
+
+
+async def read_body(request):
+    content_type = request.headers.get("content-type", "")
+    is_json = content_type.split(";")[0].strip() == "application/json"
+    data, form, files = {}, {}, {}
+    if is_json:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = {}
+        data = data if isinstance(data, dict) else {}
+    elif content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        form_data = await request.form()
+        for key, value in form_data.items():
+            if isinstance(value, UploadFile):
+                files[key] = value
+            else:
+                form[key] = value
+
+    fresh = data.get("fresh")
+    if fresh is None:
+        fresh = form.get("fresh") or request.query_params.get("fresh")
+    fresh = str(fresh).lower() in ("1", "true", "yes", "on")
+    return RequestBody(data, form, files, is_json, fresh)
+
+
+async def get_request_text(body, endpoint):
+    """Version asynchrone de app.get_request_text : l'extraction tourne dans un thread"""
+    return await run_in_threadpool(core.load_text, endpoint, body.data, body.form, body.files, body.is_json)
+
+
+async def _cache_get(key, endpoint):
+    ttl = core.LLM_CACHE_TTLS.get(endpoint, core.LLM_CACHE_DEFAULT_TTL)
+    if core.llm_cache.db_path:
+        return await run_in_threadpool(core.llm_cache.get, key, ttl)
+    return core.llm_cache.get(key, ttl)
+
+
+async def call_gemini(prompt, is_json=False, max_retries=2, endpoint=None, fresh=False):
+    """Version asynchrone de app.call_gemini (même cache, même clé)"""
+    payload = core.build_payload(prompt, is_json, endpoint)
+    cache_key = make_llm_key(core.MODEL, payload)
+
+    if not fresh:
+        cached = await _cache_get(cache_key, endpoint)
+        if cached is not None:
+            logger.info(f"Réponse du modèle servie depuis le cache ({endpoint})")
+            return cached
+
+    endpoint = endpoint or "unknown"
+    # Un appel `fresh` veut sa propre réponse : il ne rejoint ni n'ouvre d'appel partagé
+    flight = None if fresh else _flights.get(cache_key)
+    if flight is None:
+        core.observe_prompt(endpoint, prompt)
+        # La tâche copie le contexte courant : les tentatives HTTP sont étiquetées par endpoint
+        context_token = core.llm_endpoint.set(endpoint)
+        try:
+            flight = asyncio.ensure_future(_generate_content(payload, is_json, max_retries, cache_key, endpoint))
+        finally:
+            core.llm_endpoint.reset(context_token)
+        if not fresh:
+            _flights[cache_key] = flight
+            flight.add_done_callback(lambda _: _flights.pop(cache_key, None))
+
+    # shield : l'annulation d'un appelant ne doit pas annuler l'appel partagé
+    result = await asyncio.shield(flight)
+    if result is None:
+        return None if is_json else "Erreur: Impossible de générer le contenu."
+    return result
+
+
+async def _generate_content(payload, is_json, max_retries, cache_key, endpoint):
+    for attempt in range(max_retries):
+        if attempt:
+            core.LLM_RETRIES.inc(endpoint=endpoint)
+        try:
+            with core.LLM_SECONDS.time(endpoint=endpoint):
+                text_response = await gemini_client.generate_text(payload, endpoint, core.llm_priority.get())
+        except QuotaError as e:
+            core.LLM_THROTTLED.inc(endpoint=endpoint, reason=e.reason)
+            logger.warning(f"Appel Gemini non envoyé ({endpoint}): {e}")
+            break
+        except LLMError as e:
+            logger.error(f"Appel Gemini abandonné: {e}")
+            break
+
+        result = core.parse_model_response(text_response, is_json, endpoint)
+        if result is not None:
+            await run_in_threadpool(core.llm_cache.set, cache_key, result)
+            return result
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(gemini_client.delay(attempt))
+    return None
+
+
+async def _summarize_chunk(chunk):
+    async with _summary_slots:
+        summary = await call_gemini(build_chunk_prompt(chunk), endpoint="summary_chunk")
+    if not summary or summary.startswith("Erreur"):
+        return None
+    return summary
+
+
+async def prepare_summary_prompt(text):
+    """Version asynchrone de app.prepare_summary_prompt"""
+    budget = core.PROMPT_TOKEN_BUDGETS["summary"]
+    prompt = build_prompt("summary", text, budget)
+    if not prompt.truncated:
+        return prompt, 1
+
+    chunks = split_into_chunks(text, core.SUMMARY_CHUNK_CHARS)
+    results = await asyncio.gather(*(_summarize_chunk(chunk) for chunk in chunks))
+    partial_summaries = [summary for summary in results if summary]
+    if not partial_summaries:
+        logger.warning("Aucun morceau résumé, résumé du début du document uniquement")
+        return prompt, 1
+    return build_reduce_prompt(partial_summaries, budget), len(chunks)
+
+
+async def process_pdf(request):
+    """Traite un PDF envoyé depuis l'extension (fichier ou URL)"""
+    try:
+        body = await read_body(request)
+        file = body.files.get("pdf")
+        if file and file.filename and file.filename.lower().endswith(".pdf"):
+            mode = core.resolve_extraction_mode(body.data, body.form)
+            text, error = await run_in_threadpool(core.extract_text_from_pdf, file, True, None, mode)
+        elif body.is_json and "url" in body.data:
+            mode = core.resolve_extraction_mode(body.data, body.form)
+            text, error = await run_in_threadpool(core.process_pdf_from_url, body.data["url"], True, None, mode)
+        else:
+            return JSONResponse({"error": "Aucun PDF valide reçu"}, 400)
+
+        if error:
+            return JSONResponse({"error": error}, 400)
+        if not text:
+            return JSONResponse({"error": "Impossible d'extraire le texte du PDF"}, 400)
+        return JSONResponse({
+            "success": True,
+            "text": text,
+            "text_length": len(text),
+            "message": "PDF traité avec succès"
+        })
+
+    except Exception as e:
+        logger.error(f"Erreur inattendue: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def create_document(request):
+    """Extrait un PDF une seule fois et retourne un document_id réutilisable"""
+    try:
+        body = await read_body(request)
+        max_chars = core.resolve_text_budget("documents", body.data, body.form)
+        mode = core.resolve_extraction_mode(body.data, body.form)
+
+        if "pdf" in body.files:
+            file = body.files["pdf"]
+            if not file.filename:
+                return JSONResponse({"error": "Aucun fichier PDF reçu"}, 400)
+            source = file.filename
+            text, error = await run_in_threadpool(core.extract_text_from_pdf, file, True, max_chars, mode)
+        else:
+            url = body.form.get("url") or body.data.get("url")
+            if not url:
+                return JSONResponse({"error": "Aucun fichier ou URL reçu"}, 400)
+            source = url
+            text, error = await run_in_threadpool(core.process_pdf_from_url, url, True, max_chars, mode)
+
+        if error:
+            return JSONResponse({"error": error}, 400)
+
+        document_id = core.document_store.put(text, source=source)
+        return JSONResponse({
+            "success": True,
+            "document_id": document_id,
+            "text_length": len(text),
+            "expires_in": core.document_store.idle_ttl
+        }, 201)
+
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 413)
+    except Exception as e:
+        logger.error(f"Erreur lors de la création du document: {e}")
+        return JSONResponse({"error": f"Erreur de traitement: {str(e)}"}, 500)
+
+
+async def delete_document(request):
+    """Libère un document avant son expiration"""
+    if not core.document_store.delete(request.path_params["document_id"]):
+        return JSONResponse({"error": "Document inconnu ou expiré"}, 404)
+    return JSONResponse({"success": True}, 200)
+
+
+async def generate_summary(request):
+    """Génère uniquement le résumé"""
+    try:
+        body = await read_body(request)
+        text, error, status = await get_request_text(body, "summary")
+        if error:
+            return JSONResponse({"error": error}, status)
+
+        summary_prompt, chunks_count = await prepare_summary_prompt(text)
+        summary = await call_gemini(summary_prompt.text, is_json=False, endpoint="summary", fresh=body.fresh)
+
+        if not summary or summary.startswith("Erreur"):
+            core.FALLBACKS.inc(endpoint="summary", section="summary")
+            summary = "Impossible de générer le résumé. Veuillez réessayer."
+
+        return JSONResponse({
+            "summary": summary,
+            "metadata": {
+                "text_length": len(text),
+                "chunks": chunks_count,
+                "prompt_tokens": summary_prompt.tokens,
+                "status": "success"
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération du résumé: {e}")
+        return JSONResponse({
+            "error": f"Erreur lors de la génération du résumé: {str(e)}",
+            "summary": "Une erreur est survenue lors de la génération du résumé."
+        }, 500)
+
+
+async def generate_summary_stream(request):
+    """Génère le résumé en streaming (Server-Sent Events)"""
+    try:
+        body = await read_body(request)
+        text, error, status = await get_request_text(body, "summary")
+        if error:
+            return JSONResponse({"error": error}, status)
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération du résumé: {e}")
+        return JSONResponse({"error": f"Erreur lors de la génération du résumé: {str(e)}"}, 500)
+
+    async def events():
+        try:
+            summary_prompt, chunks_count = await prepare_summary_prompt(text)
+        except Exception as e:
+            logger.error(f"Erreur lors du résumé des morceaux: {e}")
+            core.FALLBACKS.inc(endpoint="summary_stream", section="summary")
+            yield core.sse_event("error", {"error": "Impossible de générer le résumé. Veuillez réessayer."})
+            return
+        payload = core.build_payload(summary_prompt.text, endpoint="summary")
+        cache_key = make_llm_key(core.MODEL, payload)
+        cached = None if body.fresh else await _cache_get(cache_key, "summary")
+
+        if cached is not None:
+            yield core.sse_event("chunk", {"text": cached})
+            yield core.sse_event("done", {
+                "metadata": {
+                    "text_length": len(text),
+                    "chunks": chunks_count,
+                    "prompt_tokens": summary_prompt.tokens,
+                    "summary_length": len(cached),
+                    "status": "success"
+                }
+            })
+            return
+
+        chunks = []
+        summary_length = 0
+        core.observe_prompt("summary_stream", summary_prompt.text)
+        context_token = core.llm_endpoint.set("summary_stream")
+        started = asyncio.get_running_loop().time()
+        try:
+            async for chunk in gemini_client.stream_text(payload, "summary_stream", core.llm_priority.get()):
+                chunks.append(chunk)
+                summary_length += len(chunk)
+                yield core.sse_event("chunk", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Erreur lors du streaming du résumé: {e}")
+            if not summary_length:
+                core.FALLBACKS.inc(endpoint="summary_stream", section="summary")
+                yield core.sse_event("error", {"error": "Impossible de générer le résumé. Veuillez réessayer."})
+                return
+        else:
+            if chunks:
+                await run_in_threadpool(core.llm_cache.set, cache_key, "".join(chunks))
+        finally:
+            core.LLM_SECONDS.observe(asyncio.get_running_loop().time() - started, endpoint="summary_stream")
+            core.llm_endpoint.reset(context_token)
+        yield core.sse_event("done", {
+            "metadata": {
+                "text_length": len(text),
+                "chunks": chunks_count,
+                "prompt_tokens": summary_prompt.tokens,
+                "summary_length": summary_length,
+                "status": "success" if summary_length else "empty"
+            }
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _section_prompt(name, text):
+    """Prompt d'une section et nombre de passages, construits comme dans app.py"""
+    if name == "summary":
+        prompt, _ = await prepare_summary_prompt(text)
+        return prompt, None
+    return await run_in_threadpool(core.build_section_prompt, name, text)
+
+
+def section_endpoint(name, result_key, count_key, fallback, label):
+    """Endpoint JSON d'une section (quiz, flashcards, ressources) avec contenu de secours"""
+
+    async def endpoint(request):
+        try:
+            body = await read_body(request)
+            text, error, status = await get_request_text(body, name)
+            if error:
+                return JSONResponse({"error": error}, status)
+
+            prompt, passages_count = await _section_prompt(name, text)
+            data = await call_gemini(prompt.text, is_json=True, endpoint=name, fresh=body.fresh)
+            if data is None:
+                core.FALLBACKS.inc(endpoint=name, section=name)
+                data = fallback()
+
+            metadata = {"text_length": len(text), count_key: len(data) if data else 0}
+            if name in core.PASSAGE_TOKEN_BUDGETS:
+                metadata["passages"] = passages_count
+            metadata["prompt_tokens"] = prompt.tokens
+            metadata["status"] = "success"
+            return JSONResponse({result_key: data, "metadata": metadata})
+
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération {label}: {e}")
+            return JSONResponse({
+                "error": f"Erreur lors de la génération {label}: {str(e)}",
+                result_key: fallback()
+            }, 500)
+
+    return endpoint
+
+
+async def _run_section(name, text, fresh=False):
+    is_json = core.GENERATE_ALL_SECTIONS[name][0]
+    prompt, _ = await _section_prompt(name, core.truncate_text(text, core.TEXT_BUDGETS[name]))
+    result = await call_gemini(prompt.text, is_json=is_json, endpoint=name, fresh=fresh)
+    if result is None or (not is_json and (not result or result.startswith("Erreur"))):
+        raise ValueError("Réponse vide ou invalide du modèle")
+    return result, prompt.tokens
+
+
+async def generate_all(request):
+    """Génère résumé, quiz, flashcards et ressources en un seul appel (requêtes LLM concurrentes)"""
+    try:
+        body = await read_body(request)
+        text, error, status = await get_request_text(body, "all")
+        if error:
+            return JSONResponse({"error": error}, status)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = {
+            name: asyncio.ensure_future(_run_section(name, text, body.fresh))
+            for name in core.GENERATE_ALL_SECTIONS
+        }
+        done, _ = await asyncio.wait(tasks.values(), timeout=core.SECTION_TIMEOUT)
+
+        results = {}
+        sections_status = {}
+        prompt_tokens = {}
+        for name, task in tasks.items():
+            fallback = core.GENERATE_ALL_SECTIONS[name][1]
+            if task not in done:
+                task.cancel()
+                core.FALLBACKS.inc(endpoint="all", section=name)
+                logger.warning(f"Section {name} : délai dépassé, utilisation du secours")
+                results[name] = fallback()
+                sections_status[name] = "timeout"
+            elif task.exception() is not None:
+                core.FALLBACKS.inc(endpoint="all", section=name)
+                logger.warning(f"Section {name} : échec ({task.exception()}), utilisation du secours")
+                results[name] = fallback()
+                sections_status[name] = "fallback"
+            else:
+                results[name], prompt_tokens[name] = task.result()
+                sections_status[name] = "success"
+
+        results["metadata"] = {
+            "text_length": len(text),
+            "questions_count": len(results["quiz"]),
+            "flashcards_count": len(results["flashcards"]),
+            "resources_count": len(results["resources"]),
+            "sections": sections_status,
+            "prompt_tokens": prompt_tokens,
+            "elapsed_seconds": round(loop.time() - started, 3),
+            "status": "success"
+        }
+        return JSONResponse(results)
+
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération combinée: {e}")
+        return JSONResponse({
+            "error": f"Erreur lors de la génération combinée: {str(e)}",
+            "quiz": core.generate_fallback_quiz(),
+            "flashcards": core.generate_fallback_flashcards(),
+            "resources": core.generate_fallback_resources()
+        }, 500)
+
+
+async def submit_job(request):
+    """Met en file une génération ; mêmes paramètres que POST /jobs de app.py"""
+    body = await read_body(request)
+    endpoint = body.data.get("endpoint") or body.form.get("endpoint")
+    if endpoint not in core.JOB_VIEWS:
+        return JSONResponse({"error": f"endpoint invalide, valeurs possibles: {', '.join(core.JOB_VIEWS)}"}, 400)
+
+    callback_url = body.data.get("callback_url") or body.form.get("callback_url")
+    if callback_url:
+        # Résolution DNS : hors de la boucle d'événements
+        error = await run_in_threadpool(check_callback_url, callback_url, core.JOB_CALLBACK_ALLOWED_HOSTS)
+        if error:
+            return JSONResponse({"error": error}, 400)
+
+    size = 0
+    if body.is_json:
+        params = {"json": body.data}
+    else:
+        params = {"data": dict(body.form)}
+        if "pdf" in body.files:
+            file = body.files["pdf"]
+            try:
+                params["pdf"], size = await run_in_threadpool(core.spool_job_pdf, file.file, file.filename)
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, 413)
+
+    try:
+        job_id = core.job_queue.submit(endpoint, params, callback_url=callback_url, size=size)
+    except QueueFull as e:
+        return JSONResponse(
+            {"error": "Serveur occupé, réessayez plus tard", "retry_after": e.retry_after},
+            429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return JSONResponse({"job_id": job_id, "status": "queued"}, 202, headers={"Location": f"/jobs/{job_id}"})
+
+
+async def get_job(request):
+    """État et résultat d'une tâche"""
+    job = core.job_queue.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Tâche inconnue ou expirée"}, 404)
+    return JSONResponse(job, 200)
+
+
+async def cancel_job(request):
+    """Annule une tâche en attente, demande l'annulation d'une tâche en cours, ou oublie une tâche terminée"""
+    job = core.job_queue.cancel(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Tâche inconnue ou expirée"}, 404)
+    body, status_code = core.cancel_response(job)
+    return JSONResponse(body, status_code)
+
+
+async def metrics_endpoint(request):
+    """Métriques au format texte de Prometheus"""
+    return PlainTextResponse(core.metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def health_check(request):
+    """Vérifie que le serveur fonctionne (même contenu que app.py, plus le type de serveur)"""
+    payload = core.health_payload()
+    payload["server"] = "asgi"
+    return JSONResponse(payload)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await gemini_client.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/process_pdf", process_pdf, methods=["POST"]),
+        Route("/documents", create_document, methods=["POST"]),
+        Route("/documents/{document_id}", delete_document, methods=["DELETE"]),
+        Route("/generate_summary", generate_summary, methods=["POST"]),
+        Route("/generate_summary_stream", generate_summary_stream, methods=["POST"]),
+        Route("/generate_quiz", section_endpoint(
+            "quiz", "quiz", "questions_count", core.generate_fallback_quiz, "du quiz"
+        ), methods=["POST"]),
+        Route("/generate_flashcards", section_endpoint(
+            "flashcards", "flashcards", "flashcards_count", core.generate_fallback_flashcards, "des flashcards"
+        ), methods=["POST"]),
+        Route("/generate_educational_resources", section_endpoint(
+            "resources", "resources", "resources_count", core.generate_fallback_resources, "des ressources"
+        ), methods=["POST"]),
+        Route("/generate_all", generate_all, methods=["POST"]),
+        Route("/jobs", submit_job, methods=["POST"]),
+        Route("/jobs/{job_id}", get_job, methods=["GET"]),
+        Route("/jobs/{job_id}", cancel_job, methods=["DELETE"]),
+        Route("/metrics", metrics_endpoint, methods=["GET"]),
+        Route("/health", health_check, methods=["GET"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,412 @@
+"""
+Traitement par lots : pré-génère résumés, quiz, flashcards et ressources pour tout
+un dossier de cours, par exemple pendant la nuit.
+
+    python batch.py cours/ --output cours.jsonl
+    python batch.py manifeste.txt --output cours.sqlite --sections summary quiz --rpm 60
+    LLM_CACHE_DB=llm.sqlite TEXT_CACHE_DB=text.sqlite python batch.py cours/ -o cours.jsonl
+
+Entrées : dossiers (PDF cherchés récursivement), fichiers PDF, ou manifestes texte
+(un chemin ou une URL par ligne, `#` pour les commentaires).
+
+Étapes :
+1. lecture / téléchargement (threads) ;
+2. extraction dans un pool de processus, un PDF par tâche, avec les réglages du
+   serveur (EXTRACT_MAX_PAGES, EXTRACT_PAGE_TIMEOUT, EXTRACT_MODE sauf `--mode`) ;
+   le texte alimente le cache de texte ;
+3. génération : appels au modèle avec une concurrence bornée (`--concurrency`), en
+   priorité basse auprès du gouverneur de quota (quota propre avec `--rpm` / `--tpm`,
+   sinon celui du serveur, partagé avec lui via LLM_QUOTA_STATE), avec les mêmes
+   prompts que les endpoints ; les réponses alimentent le cache du modèle ;
+4. écriture d'un enregistrement par document (JSONL ou SQLite selon l'extension).
+
+Avec LLM_CACHE_DB et TEXT_CACHE_DB partagés avec le serveur, les endpoints servent
+ensuite ces documents directement depuis le cache. Le traitement est reprenable :
+les documents déjà réussis dans le fichier de résultats (même contenu) sont ignorés.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+
+logger = logging.getLogger("batch")
+
+SECTIONS = ("summary", "quiz", "flashcards", "resources")
+
+
+def load_sources(inputs):
+    """Sources (chemins de PDF ou URL) des dossiers, fichiers et manifestes donnés, sans doublon"""
+    sources = []
+    for item in inputs:
+        path = Path(item)
+        if item.startswith(("http://", "https://")):
+            sources.append(item)
+        elif path.is_dir():
+            sources.extend(str(pdf) for pdf in sorted(path.rglob("*")) if pdf.suffix.lower() == ".pdf")
+        elif path.suffix.lower() == ".pdf":
+            sources.append(str(path))
+        else:
+            for line in path.read_text(encoding="utf-8").splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith(("http://", "https://")):
+                    sources.append(line)
+                else:
+                    sources.append(str((path.parent / line).resolve() if not Path(line).is_absolute() else line))
+    return list(dict.fromkeys(sources))
+
+
+class JsonlResults:
+    """Résultats en JSON Lines : une ligne par document, la dernière ligne d'une source fait foi"""
+
+    def __init__(self, path):
+        self.path = path
+        self.succeeded = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # dernière ligne coupée par une interruption
+                    if record.get("status") == "success":
+                        self.succeeded[record["source"]] = record.get("digest")
+                    else:
+                        self.succeeded.pop(record.get("source"), None)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteResults:
+    """Résultats dans une table SQLite `batch_results` (une ligne par source)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_results ("
+            "source TEXT PRIMARY KEY, digest TEXT, status TEXT NOT NULL, "
+            "record TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.succeeded = dict(self._conn.execute(
+            "SELECT source, digest FROM batch_results WHERE status = 'success'"
+        ))
+
+    def write(self, record):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batch_results (source, digest, status, record, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (record["source"], record.get("digest"), record["status"],
+                 json.dumps(record, ensure_ascii=False), time.time())
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def open_results(path):
+    if path.endswith((".sqlite", ".sqlite3", ".db")):
+        return SqliteResults(path)
+    return JsonlResults(path)
+
+
+class StageStats:
+    """Débit d'une étape : éléments traités, unités (pages, octets, tokens) et durée écoulée"""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.units = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, started, units=0, busy_seconds=None, error=False):
+        ended = time.monotonic()
+        self.first_start = started if self.first_start is None else min(self.first_start, started)
+        self.last_end = ended if self.last_end is None else max(self.last_end, ended)
+        self.items += 1
+        self.units += units
+        self.errors += int(error)
+        self.busy_seconds += ended - started if busy_seconds is None else busy_seconds
+
+    def to_dict(self):
+        elapsed = (self.last_end - self.first_start) if self.items else 0.0
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            self.unit: self.units,
+            "elapsed_seconds": round(elapsed, 3),
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / elapsed, 2) if elapsed else None,
+            f"{self.unit}_per_second": round(self.units / elapsed, 1) if elapsed else None,
+        }
+
+
+class Document:
+    def __init__(self, source):
+        self.source = source
+        self.started = time.monotonic()
+        self.digest = None
+        self.text = None
+        self.record = {"source": source}
+        self.pending_sections = 0
+
+
+def read_source(source, core):
+    """Octets et SHA-256 d'une source : fichier local, ou téléchargement (copie gardée dans le cache d'URL)"""
+    if not source.startswith(("http://", "https://")):
+        data = Path(source).read_bytes()
+        return data, hashlib.sha256(data).hexdigest()
+    download = core.download_pdf(
+        source, max_bytes=core.URL_MAX_BYTES, timeout=30, spool_bytes=core.URL_SPOOL_BYTES
+    )
+    with download.buffer:
+        if core.url_cache:
+            core.url_cache.store(source, download.buffer, download.digest, download.etag, download.last_modified)
+        download.buffer.seek(0)
+        return download.buffer.read(), download.digest
+
+
+def generate_section(core, name, text, fresh):
+    """Section d'un document ; pendant une coupure de l'API (disjoncteur ouvert), attend au lieu d'échouer"""
+    while core.gemini_client.rate_limiter.stats()["circuit"] == "open":
+        time.sleep(1)
+    return core.run_section(name, text, fresh)
+
+
+def run(args, core):
+    from extraction import extract_document
+    from normalizer import normalize_text
+
+    sources = load_sources(args.inputs)
+    results = open_results(args.output)
+    stats = {
+        "read": StageStats("read", "bytes"),
+        "extract": StageStats("extract", "pages"),
+        "generate": StageStats("generate", "prompt_tokens"),
+        "write": StageStats("write", "documents"),
+    }
+    engine = core.extraction_engine
+    mode = args.mode or engine.mode
+    max_in_flight = args.max_in_flight or (2 * args.workers + args.concurrency)
+    events = queue.Queue()
+    waiting = deque(sources)
+    in_flight = 0
+    finished = 0
+    skipped = 0
+    started = time.monotonic()
+
+    def finish(document, status, error=None):
+        nonlocal in_flight, finished
+        write_started = time.monotonic()
+        document.record.update(status=status, elapsed_seconds=round(time.monotonic() - document.started, 3))
+        if error:
+            document.record["error"] = error
+        results.write(document.record)
+        stats["write"].record(write_started, units=1)
+        in_flight -= 1
+        finished += 1
+        logger.info(f"[{finished + skipped}/{len(sources)}] {document.source} : {status}"
+                    + (f" ({error})" if error else ""))
+
+    def on_read(document, future, read_started):
+        events.put(("read", document, future, read_started))
+
+    read_pool = ThreadPoolExecutor(max_workers=args.download_workers, thread_name_prefix="read")
+    extract_pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    generate_pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="generate")
+    interrupted = False
+    try:
+        while waiting or in_flight:
+            # Nouveaux documents tant que le pipeline n'est pas plein
+            while waiting and in_flight < max_in_flight:
+                document = Document(waiting.popleft())
+                if document.source in results.succeeded and not document.source.startswith(("http://", "https://")):
+                    # Fichier local : ignoré seulement si son contenu n'a pas changé
+                    digest = hashlib.sha256(Path(document.source).read_bytes()).hexdigest()
+                    if results.succeeded[document.source] == digest:
+                        skipped += 1
+                        continue
+                elif document.source in results.succeeded:
+                    skipped += 1
+                    continue
+                in_flight += 1
+                read_started = time.monotonic()
+                future = read_pool.submit(read_source, document.source, core)
+                future.add_done_callback(lambda f, d=document, s=read_started: on_read(d, f, s))
+
+            if not in_flight:
+                break
+            kind, document, future, stage_started = events.get()
+
+            if kind == "read":
+                try:
+                    data, document.digest = future.result()
+                except Exception as e:
+                    stats["read"].record(stage_started, error=True)
+                    finish(document, "error", f"Lecture impossible: {e}")
+                    continue
+                stats["read"].record(stage_started, units=len(data))
+                document.record["digest"] = document.digest
+                extract_started = time.monotonic()
+                future = extract_pool.submit(
+                    extract_document, data, engine.max_pages, engine.page_timeout,
+                    normalize_text, core.TEXT_BUDGET_MAX, mode, engine.memory_limit
+                )
+                future.add_done_callback(
+                    lambda f, d=document, s=extract_started: events.put(("extract", d, f, s))
+                )
+
+            elif kind == "extract":
+                try:
+                    text, complete, pages, seconds = future.result()
+                except Exception as e:
+                    stats["extract"].record(stage_started, error=True)
+                    finish(document, "error", f"Erreur lors de la lecture du PDF: {e}")
+                    continue
+                stats["extract"].record(stage_started, units=pages, busy_seconds=seconds)
+                if not text.strip():
+                    finish(document, "error", "Le PDF ne contient pas de texte lisible")
+                    continue
+                # Même clé que l'extraction du serveur : les requêtes sur ce PDF seront servies du cache
+                core.text_cache.set(core.make_text_key(document.digest, True, mode), text, complete=complete)
+                document.text = core.truncate_text(text, core.TEXT_BUDGET_MAX, complete)
+                document.record.update(pages=pages, text_length=len(text), complete=complete,
+                                       sections={}, prompt_tokens={})
+                document.pending_sections = len(args.sections)
+                for name in args.sections:
+                    generate_started = time.monotonic()
+                    future = generate_pool.submit(
+                        copy_context().run, generate_section, core, name, document.text, args.fresh
+                    )
+                    future.add_done_callback(
+                        lambda f, d=document, n=name, s=generate_started: events.put(("generate", d, (n, f), s))
+                    )
+
+            elif kind == "generate":
+                name, future = future
+                document.pending_sections -= 1
+                try:
+                    result, prompt_tokens = future.result()
+                except Exception as e:
+                    stats["generate"].record(stage_started, error=True)
+                    document.record["sections"][name] = f"error: {e}"
+                else:
+                    stats["generate"].record(stage_started, units=prompt_tokens)
+                    document.record[name] = result
+                    document.record["sections"][name] = "success"
+                    document.record["prompt_tokens"][name] = prompt_tokens
+                if document.pending_sections == 0:
+                    failed = [n for n, status in document.record["sections"].items() if status != "success"]
+                    finish(document, "partial" if failed else "success",
+                           f"sections en échec : {', '.join(failed)}" if failed else None)
+                    document.text = None
+    except KeyboardInterrupt:
+        # Chaque document terminé est déjà écrit : une relance reprend après lui
+        interrupted = True
+        logger.warning("Interrompu : relancer la même commande pour reprendre")
+    finally:
+        for pool in (read_pool, extract_pool, generate_pool):
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+        results.close()
+    report = {
+        "documents": len(sources),
+        "processed": finished,
+        "skipped": skipped,
+        "interrupted": interrupted,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+        "stages": {name: stage.to_dict() for name, stage in stats.items()},
+    }
+    return report
+
+
+def print_report(report):
+    print(f"{report['processed']} document(s) traité(s), {report['skipped']} déjà fait(s), "
+          f"en {report['elapsed_seconds']} s", file=sys.stderr)
+    print(f"{'étape':<10} {'éléments':>9} {'erreurs':>8} {'durée (s)':>10} {'élém./s':>9}  unités/s", file=sys.stderr)
+    for name, stage in report["stages"].items():
+        unit = next(key for key in stage if key.endswith("_per_second") and key != "items_per_second")
+        print(f"{name:<10} {stage['items']:>9} {stage['errors']:>8} {stage['elapsed_seconds']:>10} "
+              f"{stage['items_per_second'] or '-':>9}  {stage[unit] or '-'} {unit.removesuffix('_per_second')}/s",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="dossiers, fichiers PDF ou manifestes (chemins / URL)")
+    parser.add_argument("-o", "--output", required=True, help="résultats : .jsonl, ou .sqlite / .db")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="processus d'extraction")
+    parser.add_argument("--concurrency", type=int, default=4, help="sections générées en parallèle")
+    parser.add_argument("--rpm", type=float, default=0,
+                        help="requêtes au modèle par minute (défaut : quota du serveur, LLM_RPM)")
+    parser.add_argument("--tpm", type=float, default=0,
+                        help="tokens par minute (défaut : quota du serveur, LLM_TPM)")
+    parser.add_argument("--max-wait", type=float, default=600,
+                        help="attente maximale (s) d'une requête dans la file du quota")
+    parser.add_argument("--mode", choices=["fast", "layout", "auto"],
+                        help="mode d'extraction (par défaut EXTRACT_MODE du serveur)")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=0,
+                        help="documents en cours dans le pipeline (défaut : 2 × workers + concurrency)")
+    parser.add_argument("--fresh", action="store_true", help="ignore les réponses déjà en cache")
+    parser.add_argument("--report", help="écrit aussi le rapport de débit (JSON) dans ce fichier")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    # Assez de connexions pour les sections parallèles et les résumés de morceaux
+    pool_size = str(args.concurrency + int(os.getenv("SUMMARY_MAP_WORKERS", "4")))
+    os.environ.setdefault("LLM_POOL_SIZE", pool_size)
+    os.environ.setdefault("LLM_POOL_PER_HOST", pool_size)
+
+    import app as core
+    from quota import PRIORITY_BACKGROUND, QuotaGovernor
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    logger.setLevel(logging.INFO)
+    if not core.llm_cache.db_path:
+        logger.warning("LLM_CACHE_DB non défini : les réponses ne seront pas réutilisables par le serveur")
+    governor = core.quota_governor
+    if args.rpm or args.tpm:
+        # Quota propre au lot (état en mémoire, distinct de celui du serveur)
+        governor = core.gemini_client.rate_limiter = QuotaGovernor(
+            rpm=args.rpm, tpm=args.tpm,
+            breaker_threshold=governor.breaker_threshold, breaker_cooldown=governor.breaker_cooldown,
+            on_wait=governor.on_wait,
+        )
+    governor.max_wait = args.max_wait
+    # Les appels du lot passent après les requêtes interactives du serveur
+    core.llm_priority.set(PRIORITY_BACKGROUND)
+
+    report = run(args, core)
+    print_report(report)
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    if report["interrupted"]:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentStore:
+    """
+    Stockage des documents extraits ("upload once, generate many").
+
+    Le stockage est borné en nombre de documents et en octets de texte ;
+    les documents inactifs depuis plus de `idle_ttl` secondes expirent.
+    Les documents les moins récemment utilisés sont évincés en premier.
+    """
+
+    def __init__(self, max_documents=256, max_bytes=64 * 1024 * 1024, idle_ttl=3600):
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._documents = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _size(text):
+        return len(text.encode("utf-8"))
+
+    def put(self, text, source=None):
+        """Enregistre un texte extrait et retourne son document_id"""
+        size = self._size(text)
+        if size > self.max_bytes:
+            raise ValueError("Document trop volumineux pour le stockage")
+
+        document_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._documents[document_id] = {
+                "text": text,
+                "source": source,
+                "size": size,
+                "created_at": now,
+                "last_access": now,
+            }
+            self._bytes += size
+            while len(self._documents) > self.max_documents or self._bytes > self.max_bytes:
+                _, evicted = self._documents.popitem(last=False)
+                self._bytes -= evicted["size"]
+                self.evictions += 1
+        return document_id
+
+    def get(self, document_id):
+        """Retourne le texte d'un document (et prolonge sa durée de vie) ou None"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            document = self._documents.get(document_id)
+            if document is None:
+                return None
+            document["last_access"] = now
+            self._documents.move_to_end(document_id)
+            return document["text"]
+
+    def delete(self, document_id):
+        """Supprime un document ; retourne True s'il existait"""
+        with self._lock:
+            document = self._documents.pop(document_id, None)
+            if document is None:
+                return False
+            self._bytes -= document["size"]
+            return True
+
+    def _expire(self, now):
+        # Les documents sont ordonnés par dernier accès : on s'arrête au premier actif
+        while self._documents:
+            document_id, document = next(iter(self._documents.items()))
+            if now - document["last_access"] <= self.idle_ttl:
+                break
+            self._documents.popitem(last=False)
+            self._bytes -= document["size"]
+            self.expirations += 1
+
+    def stats(self):
+        """Compteurs exposés par /health"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "documents": len(self._documents),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
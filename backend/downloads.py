@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import tempfile
+from collections import namedtuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b"%PDF-"
+# La spécification tolère quelques octets avant l'en-tête %PDF-
+MAGIC_SEARCH_BYTES = 1024
+
+
+# Résultat de download_pdf ; `buffer` et `digest` valent None si not_modified
+Download = namedtuple("Download", "buffer digest etag last_modified not_modified")
+
+
+class DownloadError(Exception):
+    """Erreur de téléchargement présentable à l'utilisateur"""
+
+
+def format_size(size):
+    """Taille lisible (Ko / Mo)"""
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.0f} Mo"
+    return f"{max(1, size // 1024)} Ko"
+
+
+def sha256_stream(fileobj, chunk_size=1024 * 1024):
+    """SHA-256 d'un fichier binaire lu par blocs ; le fichier est rembobiné"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def download_pdf(url, max_bytes, timeout=30, chunk_size=64 * 1024, spool_bytes=5 * 1024 * 1024,
+                 session=None, headers=None):
+    """
+    Télécharge un PDF par blocs dans un SpooledTemporaryFile (en mémoire jusqu'à
+    `spool_bytes`, puis sur disque).
+
+    Le téléchargement est interrompu dès que `Content-Length` ou le volume reçu
+    dépasse `max_bytes`, ou si le début du fichier n'est pas un en-tête PDF.
+    `headers` permet une requête conditionnelle : une réponse 304 donne un
+    Download avec not_modified=True.
+    Retourne un Download (fichier rembobiné, SHA-256 hexadécimal, validateurs) ;
+    lève DownloadError.
+    """
+    http = session or requests
+    with http.get(url, stream=True, timeout=timeout, headers=headers) as response:
+        response.raise_for_status()
+        if response.status_code == 304:
+            return Download(None, None, None, None, True)
+        if response.status_code != 200:
+            raise DownloadError(f"Impossible de télécharger le PDF (HTTP {response.status_code})")
+
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise DownloadError(f"Le PDF dépasse la taille maximale autorisée ({format_size(max_bytes)})")
+
+        buffer = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        digest = hashlib.sha256()
+        received = 0
+        head = b""
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                received += len(chunk)
+                if received > max_bytes:
+                    raise DownloadError(
+                        f"Le PDF dépasse la taille maximale autorisée ({format_size(max_bytes)})"
+                    )
+                if len(head) < MAGIC_SEARCH_BYTES:
+                    head += chunk[:MAGIC_SEARCH_BYTES - len(head)]
+                    if len(head) >= MAGIC_SEARCH_BYTES and PDF_MAGIC not in head:
+                        raise DownloadError("Le contenu n'est pas un PDF")
+                digest.update(chunk)
+                buffer.write(chunk)
+
+            if PDF_MAGIC not in head:
+                raise DownloadError("Le contenu n'est pas un PDF")
+        except Exception:
+            buffer.close()
+            raise
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+    buffer.seek(0)
+    return Download(buffer, digest.hexdigest(), etag, last_modified, False)
@@ -0,0 +1,556 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import pdfplumber
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFPageInterpreter
+from pdfminer.pdftypes import PDFObjRef, PDFStream
+
+from text_cache import make_page_key
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Séparateur des pages dans le texte assemblé : un saut de page seul sur sa ligne,
+# frontière que le découpage du résumé map-reduce respecte (summarizer.split_into_chunks)
+PAGE_SEPARATOR = "\n\f\n"
+
+# Entre dans chaque empreinte de page : une nouvelle version de pdfplumber invalide le cache
+FINGERPRINT_VERSION = f"2:{pdfplumber.__version__}"
+
+# Modes d'extraction :
+# - layout : extract_text(layout=True) de pdfplumber, positions reconstruites caractère par caractère ;
+# - fast   : lecture directe du flux de contenu (fast_page_text), lignes rangées de haut en bas ;
+# - auto   : fast, sauf pour les pages qui ressemblent à des colonnes ou à un tableau.
+EXTRACTION_MODES = ("fast", "layout", "auto")
+
+# Heuristique du mode auto (voir fast_page_text)
+AUTO_TABLE_MIN_RULES = 12       # traits droits tracés à partir desquels la page est un tableau
+AUTO_WIDE_GAP = 3.0             # écart horizontal (en tailles de police) qui sépare deux colonnes
+AUTO_COLUMN_MIN_RATIO = 0.3     # part des lignes coupées par un tel écart
+AUTO_COLUMN_MIN_LINES = 4
+
+
+class PageTimeout(Exception):
+    """Levée lorsqu'une page dépasse son délai d'extraction"""
+
+
+class MemoryLimitExceeded(Exception):
+    """Levée lorsque l'extraction d'un document dépasse sa limite de mémoire"""
+
+
+def resident_memory():
+    """Mémoire résidente du processus (octets) ; à défaut de /proc, le pic atteint ; None si inconnue"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryGuard:
+    """
+    Suit la croissance de la mémoire résidente du processus pendant l'extraction d'un
+    document, mesurée après chaque page (avant la libération de ses objets).
+    Au-delà de `limit` octets (None : pas de limite), `check` lève MemoryLimitExceeded.
+    La mesure porte sur tout le processus : les extractions simultanées d'un même
+    processus s'y additionnent.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.baseline = resident_memory()
+        self.peak = 0
+
+    def check(self, page_number=None):
+        if self.baseline is None:
+            return
+        self.observe(max(resident_memory() - self.baseline, 0), page_number)
+
+    def observe(self, used, page_number=None):
+        """Enregistre une croissance mesurée ailleurs (par un worker du pool) et la compare à la limite"""
+        self.peak = max(self.peak, used)
+        if self.limit and used > self.limit:
+            where = f" à la page {page_number}" if page_number else ""
+            raise MemoryLimitExceeded(
+                f"Extraction interrompue{where} : le PDF demande plus de {self.limit / 2 ** 20:.0f} Mo de mémoire"
+            )
+
+
+def _can_use_alarm():
+    # setitimer n'existe pas sous Windows et ne fonctionne que dans le thread principal
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+class _TextDevice(PDFTextDevice):
+    """Device pdfminer du mode fast : position et texte des caractères, traits droits comptés"""
+
+    def __init__(self, rsrcmgr):
+        super().__init__(rsrcmgr)
+        self.chars = []     # (ligne de base, x début, x fin, taille, texte)
+        self.rules = 0
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate):
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = f"(cid:{cid})"
+        advance = font.char_width(cid) * fontsize * scaling
+        a, b, c, d, e, f = matrix
+        self.chars.append((f + rise * d, e, e + advance * a, fontsize * (abs(d) or abs(b) or 1), text))
+        return advance
+
+    def paint_path(self, graphicstate, stroke, fill, evenodd, path):
+        self.rules += sum(1 for segment in path if segment[0] == "l")
+
+
+def fast_page_text(page):
+    """
+    Texte d'une page sans reconstruction de la mise en page : le flux de contenu est
+    interprété par pdfminer sans créer d'objets caractère, les caractères sont regroupés
+    en lignes par ligne de base puis rangés de gauche à droite, une espace marquant
+    chaque écart entre mots.
+    Retourne (texte, besoin de layout) : le second terme est vrai si la page ressemble
+    à un tableau (nombreux traits) ou à des colonnes (lignes coupées par un large écart),
+    cas où le mode auto préfère extract_text(layout=True).
+    """
+    device = _TextDevice(page.pdf.rsrcmgr)
+    PDFPageInterpreter(page.pdf.rsrcmgr, device).process_page(page.page_obj)
+    if not device.chars:
+        return "", device.rules >= AUTO_TABLE_MIN_RULES
+
+    lines = []
+    current = []
+    baseline = None
+    for char in sorted(device.chars, key=lambda char: -char[0]):
+        if baseline is None or baseline - char[0] > char[3] * 0.5:
+            current = []
+            lines.append(current)
+            baseline = char[0]
+        current.append(char)
+
+    output = []
+    split_lines = 0
+    for line in lines:
+        line.sort(key=lambda char: char[1])
+        parts = []
+        end = None
+        wide = False
+        for _, start, stop, size, text in line:
+            if end is not None:
+                gap = start - end
+                if gap > size * 0.2 and parts[-1] != " " and text != " ":
+                    parts.append(" ")
+                wide = wide or gap > size * AUTO_WIDE_GAP
+            parts.append(text)
+            end = max(stop, end) if end is not None else stop
+        split_lines += wide
+        output.append("".join(parts).strip())
+
+    needs_layout = device.rules >= AUTO_TABLE_MIN_RULES or (
+        len(lines) >= AUTO_COLUMN_MIN_LINES and split_lines >= AUTO_COLUMN_MIN_RATIO * len(lines)
+    )
+    return "\n".join(line for line in output if line), needs_layout
+
+
+def _page_text(page, mode):
+    if mode == "layout":
+        return page.extract_text(layout=True)
+    text, needs_layout = fast_page_text(page)
+    if mode == "auto" and needs_layout:
+        return page.extract_text(layout=True)
+    return text
+
+
+def extract_page_text(page, page_timeout=None, mode="layout"):
+    """Extrait le texte d'une page dans le mode demandé ; retourne None si la page dépasse page_timeout"""
+    if not page_timeout or not _can_use_alarm():
+        return _page_text(page, mode)
+
+    timed_out = False
+
+    def on_alarm(signum, frame):
+        nonlocal timed_out
+        timed_out = True
+        raise PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+    try:
+        return _page_text(page, mode)
+    except Exception:
+        # pdfplumber peut encapsuler PageTimeout dans sa propre exception
+        if not timed_out:
+            raise
+        logger.warning(f"Page {page.page_number} ignorée : délai de {page_timeout}s dépassé")
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def timed_page_text(page, page_timeout=None, mode="layout", guard=None):
+    """
+    Comme extract_page_text, mais retourne (texte, durée en secondes).
+    Les objets analysés de la page (caractères, mise en page) sont libérés aussitôt le
+    texte pris : sans cela pdfplumber les garde jusqu'à la fermeture du PDF.
+    `guard` (MemoryGuard) mesure la mémoire avant cette libération.
+    """
+    started = time.perf_counter()
+    try:
+        text = extract_page_text(page, page_timeout, mode)
+        if guard is not None:
+            guard.check(page.page_number)
+    finally:
+        page.close()
+    return text, time.perf_counter() - started
+
+
+def _object_digest(obj, memo, active):
+    """Empreinte d'un objet PDF, références résolues ; `memo` : objid -> empreinte, `active` : objids en cours"""
+    if isinstance(obj, PDFObjRef):
+        objid = obj.objid
+        if objid in memo:
+            return memo[objid]
+        if objid in active:
+            return b"cycle:%d" % objid
+        active.add(objid)
+        try:
+            value = _object_digest(obj.resolve(), memo, active)
+        finally:
+            active.discard(objid)
+        memo[objid] = value
+        return value
+
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(obj, PDFStream):
+        digest.update(b"stream")
+        digest.update(_object_digest(obj.attrs, memo, active))
+        # Les pixels d'une image n'ont pas d'effet sur le texte : ils ne sont ni décodés ni hachés
+        if getattr(obj.attrs.get("Subtype"), "name", None) != "Image":
+            # Données décodées : identiques que le flux ait déjà été lu ou non
+            digest.update(obj.get_data())
+    elif isinstance(obj, dict):
+        digest.update(b"dict")
+        for key in sorted(obj, key=str):
+            if key == "Parent":  # remonte l'arbre des pages, sans effet sur le texte
+                continue
+            digest.update(str(key).encode("utf-8"))
+            digest.update(_object_digest(obj[key], memo, active))
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b"list")
+        for item in obj:
+            digest.update(_object_digest(item, memo, active))
+    elif isinstance(obj, bytes):
+        digest.update(b"bytes")
+        digest.update(obj)
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+    return digest.digest()
+
+
+def page_fingerprint(page, memo=None):
+    """
+    Empreinte (hex) de tout ce qui détermine le texte d'une page : flux de contenu,
+    ressources (polices, XObjects...), boîtes et rotation. Une page inchangée garde son
+    empreinte d'une version du PDF à l'autre, même si le reste du fichier a changé.
+    `memo` évite de hacher plusieurs fois les objets partagés (polices) d'un même document.
+    """
+    page_obj = page.page_obj
+    memo = {} if memo is None else memo
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(FINGERPRINT_VERSION.encode("utf-8"))
+    digest.update(repr((page_obj.mediabox, page_obj.cropbox, page_obj.rotate)).encode("utf-8"))
+    for stream in page_obj.contents:
+        digest.update(_object_digest(stream, memo, set()))
+    digest.update(_object_digest(page_obj.resources, memo, set()))
+    return digest.hexdigest()
+
+
+def open_pdf(source):
+    """Ouvre un PDF depuis des octets ou un fichier binaire (lu sur place, sans copie)"""
+    if isinstance(source, (bytes, bytearray)):
+        return pdfplumber.open(io.BytesIO(source))
+    source.seek(0)
+    return pdfplumber.open(source)
+
+
+def _pool_source(source):
+    """
+    Retourne (chemin, temporaire) du fichier lu par les workers du pool. Un fichier déjà
+    sur disque est repris tel quel ; sinon le PDF est copié par blocs dans un fichier
+    temporaire, que l'appelant supprime. Le PDF n'est jamais copié en mémoire ni
+    transmis à chaque tâche.
+    """
+    name = getattr(source, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name, False
+    fd, path = tempfile.mkstemp(prefix="smartpdf-extract-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if isinstance(source, (bytes, bytearray)):
+                out.write(source)
+            else:
+                # pdfminer lit le fichier depuis sa position courante : elle est rétablie
+                position = source.tell()
+                source.seek(0)
+                shutil.copyfileobj(source, out, 1024 * 1024)
+                source.seek(position)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, True
+
+
+def _extract_pages(pdf_path, indices, page_timeout, mode="layout", memory_limit=None):
+    """
+    Tâche exécutée dans un processus du pool : extrait les pages `indices` du PDF `pdf_path`.
+    Retourne ([(texte, durée)], croissance maximale de la mémoire du worker en octets).
+    """
+    guard = MemoryGuard(memory_limit)
+    results = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in indices:
+            results.append(timed_page_text(pdf.pages[index], page_timeout, mode, guard))
+    return results, guard.peak
+
+
+def extract_document(pdf_bytes, max_pages=None, page_timeout=None, clean=None, max_chars=None, mode="layout",
+                     memory_limit=None):
+    """
+    Tâche du traitement par lots (batch.py) : extrait tout un PDF dans le processus courant.
+    Le texte est assemblé comme par le serveur (pages non vides, nettoyées par `clean`,
+    séparées par PAGE_SEPARATOR, arrêt une fois `max_chars` dépassé).
+    Retourne (texte, complet, pages lues, secondes d'extraction) ; lève MemoryLimitExceeded
+    au-delà de `memory_limit` octets.
+    """
+    guard = MemoryGuard(memory_limit)
+    parts = []
+    length = 0
+    complete = True
+    pages_read = 0
+    seconds = 0.0
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        pages = pdf.pages[:max_pages] if max_pages else pdf.pages
+        for page in pages:
+            text, page_seconds = timed_page_text(page, page_timeout, mode, guard)
+            pages_read += 1
+            seconds += page_seconds
+            if text and clean is not None:
+                text = clean(text)
+            if not text:
+                continue
+            parts.append(text)
+            length += len(text) + len(PAGE_SEPARATOR)
+            if max_chars and length > max_chars:
+                complete = False
+                break
+    return PAGE_SEPARATOR.join(parts), complete, pages_read, seconds
+
+
+class ExtractionEngine:
+    """
+    Extraction du texte page par page, dans l'un des modes EXTRACTION_MODES.
+
+    Les petits documents sont traités dans le processus courant ; au-delà de
+    `pool_min_pages` pages, les plages de pages sont réparties sur un
+    ProcessPoolExecutor (chaque processus ouvre le même fichier, voir _pool_source) puis
+    le texte est réassemblé dans l'ordre des pages. Les pages qui dépassent `page_timeout`
+    sont ignorées ; ce délai (SIGALRM) ne s'applique que dans le thread principal : dans
+    les workers du pool, mais pas aux petits documents extraits par un thread du serveur.
+    L'extraction est paresseuse : le consommateur peut s'arrêter dès que son
+    budget de caractères est atteint.
+    Avec `page_cache` (un TextCache), le texte de chaque page est mis en cache sous
+    l'empreinte de la page (page_fingerprint) : pour une nouvelle version d'un PDF, seules
+    les pages modifiées sont extraites, les autres sont reprises du cache.
+    `on_page(secondes)` est appelé dans le processus courant pour chaque page extraite.
+    `mode` : mode d'extraction par défaut (EXTRACTION_MODES), remplaçable à chaque appel.
+    Les objets de chaque page sont libérés dès son texte extrait ; au-delà de `memory_limit`
+    octets de mémoire supplémentaires (processus courant ou worker), l'extraction s'arrête
+    sur MemoryLimitExceeded. `on_memory(octets)` reçoit le pic de chaque extraction.
+    """
+
+    def __init__(self, max_pages=50, workers=None, pages_per_task=4, page_timeout=10.0, pool_min_pages=8,
+                 on_page=None, page_cache=None, mode="layout", memory_limit=None, on_memory=None):
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"Mode d'extraction inconnu: {mode}")
+        self.max_pages = max_pages
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.pages_per_task = max(1, pages_per_task)
+        self.page_timeout = page_timeout
+        self.pool_min_pages = pool_min_pages
+        self.on_page = on_page
+        self.page_cache = page_cache
+        self.mode = mode
+        self.memory_limit = memory_limit
+        self.on_memory = on_memory
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # "spawn" : les workers ne partagent aucun verrou hérité des threads Flask
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def iter_pages(self, source, mode=None):
+        """
+        Produit le texte de chaque page (None pour les pages vides ou ignorées), dans l'ordre.
+        `source` : octets ou fichier binaire rembobinable ; `mode` : mode d'extraction
+        (par défaut celui du moteur).
+        Les pages ne sont ouvertes qu'à la demande : arrêter l'itération arrête l'extraction.
+        """
+        mode = mode or self.mode
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"Mode d'extraction inconnu: {mode}")
+        guard = MemoryGuard(self.memory_limit)
+        try:
+            yield from self._iter_pages(source, mode, guard)
+        finally:
+            if self.on_memory is not None:
+                self.on_memory(guard.peak)
+
+    def _iter_pages(self, source, mode, guard):
+        memo = {}
+        with open_pdf(source) as pdf:
+            page_count = len(pdf.pages)
+            if self.max_pages:
+                page_count = min(page_count, self.max_pages)
+
+            if self.workers <= 1 or page_count < self.pool_min_pages:
+                for page in pdf.pages[:page_count]:
+                    key = self._page_key(page, memo, mode)
+                    text = self._cached_page(key)
+                    if text is None:
+                        result = timed_page_text(page, self.page_timeout, mode, guard)
+                        text = self._store_page(key, self._observe(result))
+                    yield text
+                return
+
+            pdf_path, temporary = _pool_source(source)
+            try:
+                yield from self._iter_with_pool(pdf, pdf_path, page_count, memo, mode, guard)
+            finally:
+                if temporary:
+                    os.unlink(pdf_path)
+
+    def _observe(self, result):
+        text, seconds = result
+        if self.on_page is not None:
+            self.on_page(seconds)
+        return text
+
+    def _page_key(self, page, memo, mode):
+        """Clé de cache de la page, ou None (pas de cache, ou page illisible pour l'empreinte)"""
+        if self.page_cache is None:
+            return None
+        try:
+            return make_page_key(page_fingerprint(page, memo), mode)
+        except Exception as e:
+            logger.warning(f"Empreinte de la page {page.page_number} impossible: {e}")
+            return None
+
+    def _cached_page(self, key):
+        if key is None:
+            return None
+        entry = self.page_cache.get(key)
+        return entry[0] if entry is not None else None
+
+    def _store_page(self, key, text):
+        # Les pages vides ou ignorées (délai dépassé) ne sont pas mises en cache
+        if key is not None and text:
+            self.page_cache.set(key, text)
+        return text
+
+    def extract_pages(self, source, mode=None):
+        """Retourne la liste complète des textes de page"""
+        return list(self.iter_pages(source, mode))
+
+    def _iter_with_pool(self, pdf, pdf_path, page_count, memo, mode, guard):
+        """
+        Pages extraites par le pool et réassemblées dans l'ordre avec les pages en cache.
+        Les pages ne sont examinées (empreinte, cache) qu'en entrant dans la fenêtre
+        glissante : arrêter l'itération laisse les pages suivantes intactes.
+        """
+        lookahead = self.workers * self.pages_per_task
+        keys = {}
+        ready = {}          # index -> texte, pages prêtes à produire
+        batch = []          # pages absentes du cache, pas encore confiées au pool
+        pending = deque()   # (indices, future), dans l'ordre des pages
+        next_scan = 0
+        next_page = 0
+
+        def submit():
+            nonlocal batch
+            future = self._get_executor().submit(_extract_pages, pdf_path, batch, self.page_timeout, mode, self.memory_limit)
+            pending.append((batch, future))
+            batch = []
+
+        try:
+            while next_page < page_count:
+                # Fenêtre glissante : un lot d'avance par worker et au plus `lookahead` pages examinées d'avance
+                while next_scan < page_count and len(pending) < self.workers and next_scan - next_page < lookahead:
+                    key = keys[next_scan] = self._page_key(pdf.pages[next_scan], memo, mode)
+                    text = self._cached_page(key)
+                    if text is not None:
+                        ready[next_scan] = text
+                    else:
+                        batch.append(next_scan)
+                    next_scan += 1
+                    if len(batch) == self.pages_per_task or (batch and next_scan == page_count):
+                        submit()
+
+                if next_page in ready:
+                    yield ready.pop(next_page)
+                    next_page += 1
+                    continue
+                if batch and batch[0] == next_page:
+                    # Lot incomplet (fenêtre pleine) contenant la page attendue
+                    submit()
+
+                indices, future = pending.popleft()
+                # Filet de sécurité si le délai par page ne peut pas s'appliquer dans le worker
+                batch_timeout = self.page_timeout * len(indices) + 5 if self.page_timeout else None
+                try:
+                    results, worker_peak = future.result(timeout=batch_timeout)
+                    guard.observe(worker_peak)
+                except FutureTimeoutError:
+                    logger.warning(f"Pages {indices[0] + 1}-{indices[-1] + 1} ignorées : délai dépassé")
+                    results = [(None, batch_timeout / len(indices))] * len(indices)
+                for index, result in zip(indices, results):
+                    ready[index] = self._store_page(keys[index], self._observe(result))
+                guard.check()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,282 @@
+import ipaddress
+import logging
+import math
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """File d'attente pleine ; `retry_after` estime le délai (s) avant une place libre"""
+
+    def __init__(self, retry_after):
+        super().__init__("File d'attente pleine")
+        self.retry_after = retry_after
+
+
+def check_callback_url(url, allowed_hosts=()):
+    """
+    Message d'erreur si `url` ne peut pas recevoir de webhook, sinon None.
+    Seuls http(s) et les hôtes publics sont acceptés : un hôte qui se résout vers une
+    adresse de bouclage, privée, link-local ou réservée est refusé (SSRF), sauf s'il
+    figure dans `allowed_hosts`.
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return "callback_url invalide"
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "callback_url invalide"
+    host = parts.hostname.lower()
+    if host in allowed_hosts:
+        return None
+    try:
+        infos = socket.getaddrinfo(host, port or (443 if parts.scheme == "https" else 80),
+                                   proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        return f"callback_url : hôte introuvable ({host})"
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            return f"callback_url : adresse non publique refusée ({address})"
+    return None
+
+
+class Job:
+    def __init__(self, endpoint, params, callback_url=None, size=0):
+        self.id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.params = params
+        self.callback_url = callback_url
+        self.size = size
+        self.cancel_requested = False
+        self.status = QUEUED
+        self.result = None
+        self.status_code = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "cancel_requested": self.cancel_requested,
+            "result": self.result,
+            "status_code": self.status_code,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    File de tâches de génération exécutées par un pool de threads.
+
+    `runner(job)` exécute la tâche et retourne (résultat JSON, code HTTP).
+    La file est bornée en nombre de tâches en attente (`max_queued`) et en octets
+    retenus par les tâches non terminées (`max_queued_bytes`, taille déclarée à
+    `submit`) : au-delà, `submit` lève QueueFull. `release(params)` est appelé quand une
+    tâche se termine, pour libérer ce que ses paramètres retiennent (fichier temporaire).
+    Les tâches terminées restent consultables `retention` secondes, et le résultat est
+    envoyé en POST à `callback_url` si le client en a fourni une (adresse revérifiée
+    avant l'envoi, sans suivre de redirection ; `callback_allowed_hosts` lève le refus
+    des hôtes non publics).
+    Une tâche en cours ne peut pas être interrompue : l'annuler la marque
+    `cancel_requested`, elle reste `running` jusqu'au bout puis passe `cancelled` et
+    son résultat est ignoré.
+    """
+
+    def __init__(self, runner, workers=4, max_queued=64, retention=3600, callback_timeout=10,
+                 max_queued_bytes=0, release=None, callback_allowed_hosts=()):
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_bytes = max_queued_bytes
+        self.release = release
+        self.retention = retention
+        self.callback_timeout = callback_timeout
+        self.callback_allowed_hosts = callback_allowed_hosts
+        self._jobs = OrderedDict()
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._queued_bytes = 0
+        self._running = 0
+        self._average_duration = None
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = {SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, endpoint, params, callback_url=None, size=0):
+        """
+        Ajoute une tâche et retourne son identifiant ; `size` : octets retenus par `params`.
+        Lève QueueFull si la file est pleine (en tâches ou en octets) ; les paramètres
+        sont alors libérés.
+        """
+        job = Job(endpoint, params, callback_url, size)
+        with self._lock:
+            self._expire(time.time())
+            if self._queued >= self.max_queued or (
+                self.max_queued_bytes and self._queued_bytes + size > self.max_queued_bytes
+            ):
+                self.rejected += 1
+                retry_after = self._retry_after()
+            else:
+                retry_after = None
+                self._jobs[job.id] = job
+                self._queued += 1
+                self._queued_bytes += size
+                self.submitted += 1
+        if retry_after is not None:
+            self._release(params)
+            raise QueueFull(retry_after)
+        self._pending.put(job)
+        return job.id
+
+    def get(self, job_id):
+        """État de la tâche (dict) ou None"""
+        with self._lock:
+            self._expire(time.time())
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def cancel(self, job_id):
+        """
+        Annule une tâche en attente, demande l'annulation d'une tâche en cours (elle
+        continue, son résultat sera ignoré), ou oublie une tâche terminée.
+        Retourne l'état de la tâche (dict), ou None si la tâche est inconnue.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            params = None
+            if job.status in FINISHED:
+                del self._jobs[job_id]
+            elif job.status == RUNNING:
+                job.cancel_requested = True
+            else:
+                self._queued -= 1
+                params = self._finish(job, CANCELLED)
+            state = job.to_dict()
+        self._release(params)
+        return state
+
+    def _retry_after(self):
+        # Temps pour écouler la file au rythme moyen observé (30 s par défaut)
+        duration = self._average_duration or 30.0
+        return max(1, math.ceil(duration * (self._queued + 1) / self.workers))
+
+    def _finish(self, job, status, result=None, status_code=None, error=None):
+        """Termine la tâche (verrou tenu) ; retourne ses paramètres, à libérer hors du verrou"""
+        params, job.params = job.params, None
+        job.status = status
+        job.result = result
+        job.status_code = status_code
+        job.error = error
+        job.finished_at = time.time()
+        self._queued_bytes -= job.size
+        self.completed[status] += 1
+        return params
+
+    def _release(self, params):
+        if params is not None and self.release is not None:
+            try:
+                self.release(params)
+            except Exception as e:
+                logger.warning(f"Libération des paramètres d'une tâche impossible: {e}")
+
+    def _expire(self, now):
+        # Les tâches sont ordonnées par création : on ne retire que les tâches terminées
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.status in FINISHED and now - job.finished_at > self.retention]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._pending.get()
+            with self._lock:
+                if job.status != QUEUED:
+                    continue
+                self._queued -= 1
+                self._running += 1
+                job.status = RUNNING
+                job.started_at = time.time()
+
+            try:
+                result, status_code = self.runner(job)
+                outcome = (SUCCEEDED if status_code < 400 else FAILED, result, status_code, None)
+            except Exception as e:
+                logger.error(f"Tâche {job.id} en échec: {e}")
+                outcome = (FAILED, None, 500, str(e))
+
+            with self._lock:
+                self._running -= 1
+                duration = time.time() - job.started_at
+                self._average_duration = duration if self._average_duration is None \
+                    else 0.8 * self._average_duration + 0.2 * duration
+                if job.cancel_requested:
+                    # Annulée pendant l'exécution : le résultat est ignoré
+                    params = self._finish(job, CANCELLED, error="Annulée pendant l'exécution, résultat ignoré")
+                else:
+                    params = self._finish(job, *outcome)
+                payload = job.to_dict() if job.callback_url and not job.cancel_requested else None
+
+            self._release(params)
+            if payload:
+                self._notify(job.callback_url, payload)
+
+    def _notify(self, callback_url, payload):
+        # L'adresse est revérifiée : le DNS a pu changer depuis la soumission
+        error = check_callback_url(callback_url, self.callback_allowed_hosts)
+        if error:
+            logger.warning(f"Webhook non envoyé: {error}")
+            return
+        try:
+            requests.post(callback_url, json=payload, timeout=self.callback_timeout, allow_redirects=False)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Webhook {callback_url} injoignable: {e}")
+
+    def stats(self):
+        """Compteurs exposés par /health"""
+        with self._lock:
+            return {
+                "queued": self._queued,
+                "queued_bytes": self._queued_bytes,
+                "running": self._running,
+                "capacity": self.max_queued,
+                "capacity_bytes": self.max_queued_bytes,
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": dict(self.completed),
+                "average_duration_seconds": round(self._average_duration, 3)
+                if self._average_duration is not None else None,
+            }
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_llm_key(model, payload):
+    """Clé de cache d'un appel : hash du modèle, de la generationConfig et du prompt complet"""
+    material = json.dumps(
+        {
+            "model": model,
+            "generationConfig": payload.get("generationConfig"),
+            "contents": payload.get("contents"),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class FlightAborted(Exception):
+    """
+    Levée par la fonction passée à singleflight quand son échec ne vaut que pour
+    l'appelant (son échéance est passée) : les appelants en attente refont l'appel.
+    """
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMCache:
+    """
+    Cache des réponses du modèle.
+
+    - mémoire : LRU borné en nombre d'entrées
+    - disque (optionnel) : base SQLite, purgée des entrées de plus de `ttl` secondes et
+      bornée à `max_disk_bytes` octets de valeurs (les plus anciennes partent d'abord),
+      à l'ouverture puis toutes les `purge_every` écritures
+    La durée de vie est fournie à la lecture, ce qui permet un TTL par endpoint ; `ttl`
+    est la plus longue d'entre elles.
+    Les valeurs sont sérialisées en JSON (texte ou structure déjà parsée).
+
+    `singleflight` regroupe les appels identiques simultanés : un seul appel
+    part vers le modèle, les autres attendent et partagent son résultat.
+    """
+
+    def __init__(self, max_entries=512, db_path=None, ttl=None, max_disk_bytes=None, purge_every=100):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.purge_every = purge_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.purged = 0
+        if db_path:
+            self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_created_at ON llm_responses (created_at)")
+        self.purge()
+
+    def get(self, key, ttl):
+        """Retourne la valeur en cache si elle a moins de `ttl` secondes, sinon None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not ttl or now - entry[1] <= ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        entry = self._disk_get(key) if self.db_path else None
+        with self._lock:
+            if entry is None or (ttl and now - entry[1] > ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        self._memory_set(key, entry)
+        return entry[0]
+
+    def set(self, key, value):
+        entry = (value, time.time())
+        self._memory_set(key, entry)
+        if self.db_path:
+            self._disk_set(key, entry)
+            with self._lock:
+                self._writes += 1
+                due = self.purge_every and self._writes % self.purge_every == 0
+            if due:
+                self.purge()
+
+    def singleflight(self, key, fn, timeout=None):
+        """
+        Exécute fn() une seule fois pour tous les appelants simultanés de même clé.
+        Un appelant qui attend plus de `timeout` secondes, ou dont le meneur a levé
+        FlightAborted, appelle fn() lui-même.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                logger.warning("Appel identique en cours trop long, appel séparé")
+                return fn()
+            if isinstance(flight.error, FlightAborted):
+                return self.singleflight(key, fn, timeout)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _memory_set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_get(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+            return (json.loads(row[0]), row[1]) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Cache LLM indisponible (lecture): {e}")
+            return None
+
+    def _disk_set(self, key, entry):
+        try:
+            with self._connect() as conn:
+                value = json.dumps(entry[0], ensure_ascii=False)
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, value, created_at, size) VALUES (?, ?, ?, ?)",
+                    (key, value, entry[1], len(value.encode("utf-8"))),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Cache LLM indisponible (écriture): {e}")
+
+    def purge(self):
+        """Supprime les entrées disque expirées, puis les plus anciennes au-delà de `max_disk_bytes`"""
+        if not self.db_path:
+            return 0
+        removed = 0
+        try:
+            with self._connect() as conn:
+                if self.ttl:
+                    removed += conn.execute(
+                        "DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl,)
+                    ).rowcount
+                if self.max_disk_bytes:
+                    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+                    if total > self.max_disk_bytes:
+                        # Entrées les plus anciennes jusqu'à libérer l'excédent
+                        removed += conn.execute(
+                            "DELETE FROM llm_responses WHERE key IN ("
+                            "SELECT key FROM (SELECT key, size, SUM(size) OVER (ORDER BY created_at, key) AS running "
+                            "FROM llm_responses) WHERE running - size < ?)",
+                            (total - self.max_disk_bytes,),
+                        ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Cache LLM indisponible (purge): {e}")
+        with self._lock:
+            self.purged += removed
+        return removed
+
+    def stats(self):
+        """Compteurs exposés par /health"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "purged": self.purged,
+                "in_flight": len(self._flights),
+                "entries": len(self._entries),
+                "disk_enabled": bool(self.db_path),
+            }
@@ -0,0 +1,387 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # le client asynchrone est facultatif
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# Statuts pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Délai minimal d'une tentative HTTP partie juste avant l'échéance de l'appel
+MIN_REQUEST_TIMEOUT = 0.5
+
+
+class LLMError(Exception):
+    """Erreur définitive lors d'un appel au modèle"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Délai d'attente exponentiel avec jitter complet ("full jitter")"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def extract_candidate_text(result):
+    """Extrait le texte du premier candidat d'une réponse generateContent"""
+    try:
+        return result["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def usage_tokens(result):
+    """Tokens facturés d'après usageMetadata ; None si l'API ne les donne pas"""
+    usage = (result or {}).get("usageMetadata") or {}
+    if "totalTokenCount" in usage:
+        return usage["totalTokenCount"]
+    if "promptTokenCount" in usage:
+        return usage["promptTokenCount"] + usage.get("candidatesTokenCount", 0)
+    return None
+
+
+def parse_retry_after(value):
+    """Délai (s) d'un en-tête Retry-After exprimé en secondes ; None s'il est absent ou sous forme de date"""
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _BaseGeminiClient:
+    def __init__(self, api_key, model, api_base=DEFAULT_API_BASE, timeout=30,
+                 max_retries=3, backoff_base=0.5, backoff_cap=8.0,
+                 pool_size=10, pool_per_host=10, on_attempt=None, rate_limiter=None):
+        self.api_key = api_key
+        self.model = model
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        # Appelé après chaque tentative HTTP avec (code de statut ou "error", numéro de tentative)
+        self.on_attempt = on_attempt
+        # Facultatif (quota.QuotaGovernor) : chaque tentative HTTP attend son tour et rapporte son issue
+        self.rate_limiter = rate_limiter
+
+    def _record_attempt(self, status, attempt):
+        if self.on_attempt is not None:
+            try:
+                self.on_attempt(status, attempt)
+            except Exception as e:
+                logger.warning(f"Observateur des appels Gemini en échec: {e}")
+
+    def _enqueue(self, payload, endpoint, priority):
+        if self.rate_limiter is None:
+            return None
+        return self.rate_limiter.enqueue(payload, endpoint or "unknown", priority)
+
+    def _record_outcome(self, ticket, status, retry_after=None, result=None):
+        if ticket is not None:
+            self.rate_limiter.record(ticket, status, retry_after, usage_tokens(result))
+
+    def _retry_delay(self, attempt, retry_after=None):
+        # Avec un gouverneur de quota, Retry-After suspend déjà toutes les requêtes
+        if retry_after and self.rate_limiter is None:
+            return max(self.delay(attempt), retry_after)
+        return self.delay(attempt)
+
+    def _request_timeout(self, deadline):
+        """Délai d'une tentative HTTP : `timeout`, réduit au temps restant avant `deadline` (time.monotonic)"""
+        if deadline is None:
+            return self.timeout
+        return min(self.timeout, max(deadline - time.monotonic(), MIN_REQUEST_TIMEOUT))
+
+    def _past_deadline(self, deadline, delay=0):
+        return deadline is not None and time.monotonic() + delay >= deadline
+
+    def url(self, method="generateContent"):
+        return f"{self.api_base}/models/{self.model}:{method}?key={self.api_key}"
+
+    def delay(self, attempt):
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+
+
+class GeminiClient(_BaseGeminiClient):
+    """
+    Client synchrone de l'API Gemini.
+
+    Une seule `requests.Session` est partagée : les connexions TCP/TLS sont
+    conservées (keep-alive) dans un pool de taille configurable.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_per_host,
+            pool_block=True,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def _wait_turn(self, payload, endpoint, priority, deadline=None):
+        """Attend son tour auprès du gouverneur de quota ; retourne le ticket (None sans gouverneur)"""
+        ticket = self._enqueue(payload, endpoint, priority)
+        try:
+            while ticket is not None:
+                delay = self.rate_limiter.poll(ticket)
+                if not delay:
+                    break
+                if self._past_deadline(deadline, delay):
+                    raise LLMError("Délai de l'appel au modèle dépassé en attente du quota")
+                time.sleep(delay)
+        except BaseException:
+            self.rate_limiter.cancel(ticket)
+            raise
+        return ticket
+
+    def generate_content(self, payload, endpoint=None, priority=0, deadline=None):
+        """
+        Envoie une requête generateContent avec nouvelles tentatives.
+        Retourne la réponse JSON décodée ; lève LLMError après épuisement des tentatives
+        (QuotaError, sans attendre, si le gouverneur de quota refuse l'appel).
+        `endpoint` et `priority` (0 = interactif) placent la requête dans la file du gouverneur.
+        `deadline` (time.monotonic) borne l'ensemble : attente du quota, tentatives et pauses.
+        """
+        last_error = None
+        for attempt in range(self.max_retries):
+            if self._past_deadline(deadline):
+                raise last_error or LLMError("Délai de l'appel au modèle dépassé")
+            ticket = self._wait_turn(payload, endpoint, priority, deadline)
+            retry_after = None
+            try:
+                response = self.session.post(self.url(), json=payload, timeout=self._request_timeout(deadline))
+                self._record_attempt(response.status_code, attempt)
+                if response.status_code == 200:
+                    result = response.json()
+                    self._record_outcome(ticket, 200, result=result)
+                    return result
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                self._record_outcome(ticket, response.status_code, retry_after)
+                last_error = LLMError(f"Erreur API: {response.status_code}", response.status_code)
+                logger.error(f"Erreur API: {response.status_code}")
+                if response.status_code not in RETRYABLE_STATUSES:
+                    break
+            except (requests.RequestException, ValueError) as e:
+                self._record_attempt("error", attempt)
+                self._record_outcome(ticket, "error")
+                last_error = LLMError(f"Exception lors de l'appel Gemini: {e}")
+                logger.error(f"Exception lors de l'appel Gemini: {e}")
+
+            if attempt < self.max_retries - 1:
+                delay = self._retry_delay(attempt, retry_after)
+                if self._past_deadline(deadline, delay):
+                    break
+                time.sleep(delay)
+
+        raise last_error or LLMError("Aucune tentative effectuée")
+
+    def generate_text(self, payload, endpoint=None, priority=0, deadline=None):
+        """Comme generate_content, mais retourne directement le texte du premier candidat"""
+        return extract_candidate_text(self.generate_content(payload, endpoint, priority, deadline))
+
+    def stream_text(self, payload, endpoint=None, priority=0):
+        """
+        Appelle streamGenerateContent (SSE) et produit les fragments de texte au fil de l'eau.
+        Les nouvelles tentatives ne sont faites qu'avant la réception du premier fragment.
+        """
+        url = self.url("streamGenerateContent") + "&alt=sse"
+        last_error = None
+        for attempt in range(self.max_retries):
+            ticket = self._wait_turn(payload, endpoint, priority)
+            retry_after = None
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=True)
+                self._record_attempt(response.status_code, attempt)
+                if response.status_code == 200:
+                    self._record_outcome(ticket, 200)
+                    break
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                self._record_outcome(ticket, response.status_code, retry_after)
+                response.close()
+                last_error = LLMError(f"Erreur API: {response.status_code}", response.status_code)
+                logger.error(f"Erreur API: {response.status_code}")
+                if response.status_code not in RETRYABLE_STATUSES:
+                    raise last_error
+            except requests.RequestException as e:
+                self._record_attempt("error", attempt)
+                self._record_outcome(ticket, "error")
+                last_error = LLMError(f"Exception lors de l'appel Gemini: {e}")
+                logger.error(f"Exception lors de l'appel Gemini: {e}")
+
+            if attempt < self.max_retries - 1:
+                time.sleep(self._retry_delay(attempt, retry_after))
+        else:
+            raise last_error or LLMError("Aucune tentative effectuée")
+
+        with response:
+            # text/event-stream sans charset : requests supposerait ISO-8859-1
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                try:
+                    chunk = json.loads(line[5:].strip())
+                except json.JSONDecodeError:
+                    logger.warning("Fragment SSE illisible ignoré")
+                    continue
+                text = extract_candidate_text(chunk)
+                if text:
+                    yield text
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncGeminiClient(_BaseGeminiClient):
+    """
+    Client asynchrone de l'API Gemini (aiohttp).
+
+    Le pool de connexions est limité globalement (`pool_size`) et par hôte
+    (`pool_per_host`). La session est créée au premier appel, dans la boucle courante.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp est requis pour le client asynchrone")
+        super().__init__(*args, **kwargs)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_per_host)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Content-Type": "application/json"},
+            )
+        return self._session
+
+    async def _wait_turn(self, payload, endpoint, priority):
+        """Version asynchrone de GeminiClient._wait_turn (la boucle n'est pas bloquée pendant l'attente)"""
+        ticket = self._enqueue(payload, endpoint, priority)
+        try:
+            while ticket is not None:
+                delay = self.rate_limiter.poll(ticket)
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+        except BaseException:
+            self.rate_limiter.cancel(ticket)
+            raise
+        return ticket
+
+    async def generate_content(self, payload, endpoint=None, priority=0):
+        """Version asynchrone de GeminiClient.generate_content"""
+        session = self._get_session()
+        last_error = None
+        for attempt in range(self.max_retries):
+            ticket = await self._wait_turn(payload, endpoint, priority)
+            retry_after = None
+            try:
+                async with session.post(self.url(), json=payload) as response:
+                    self._record_attempt(response.status, attempt)
+                    if response.status == 200:
+                        result = await response.json(content_type=None)
+                        self._record_outcome(ticket, 200, result=result)
+                        return result
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self._record_outcome(ticket, response.status, retry_after)
+                    last_error = LLMError(f"Erreur API: {response.status}", response.status)
+                    logger.error(f"Erreur API: {response.status}")
+                    if response.status not in RETRYABLE_STATUSES:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self._record_attempt("error", attempt)
+                self._record_outcome(ticket, "error")
+                last_error = LLMError(f"Exception lors de l'appel Gemini: {e}")
+                logger.error(f"Exception lors de l'appel Gemini: {e}")
+
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(self._retry_delay(attempt, retry_after))
+
+        raise last_error or LLMError("Aucune tentative effectuée")
+
+    async def generate_text(self, payload, endpoint=None, priority=0):
+        return extract_candidate_text(await self.generate_content(payload, endpoint, priority))
+
+    async def stream_text(self, payload, endpoint=None, priority=0):
+        """
+        Version asynchrone de GeminiClient.stream_text.
+        Pas de délai total sur un flux SSE : seuls la connexion et l'attente de chaque
+        fragment sont bornés par `timeout` (comme le timeout de requests).
+        """
+        session = self._get_session()
+        url = self.url("streamGenerateContent") + "&alt=sse"
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        last_error = None
+        for attempt in range(self.max_retries):
+            ticket = await self._wait_turn(payload, endpoint, priority)
+            retry_after = None
+            try:
+                response = await session.post(url, json=payload, timeout=timeout)
+                self._record_attempt(response.status, attempt)
+                if response.status == 200:
+                    self._record_outcome(ticket, 200)
+                    break
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                self._record_outcome(ticket, response.status, retry_after)
+                response.release()
+                last_error = LLMError(f"Erreur API: {response.status}", response.status)
+                logger.error(f"Erreur API: {response.status}")
+                if response.status not in RETRYABLE_STATUSES:
+                    raise last_error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._record_attempt("error", attempt)
+                self._record_outcome(ticket, "error")
+                last_error = LLMError(f"Exception lors de l'appel Gemini: {e}")
+                logger.error(f"Exception lors de l'appel Gemini: {e}")
+
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(self._retry_delay(attempt, retry_after))
+        else:
+            raise last_error or LLMError("Aucune tentative effectuée")
+
+        async with response:
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    chunk = json.loads(line[5:].strip())
+                except json.JSONDecodeError:
+                    logger.warning("Fragment SSE illisible ignoré")
+                    continue
+                text = extract_candidate_text(chunk)
+                if text:
+                    yield text
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,64 @@
+"""
+Normalisation des espaces du texte extrait des PDF.
+
+Produit exactement la même sortie que l'ancienne suite de `re.sub` de
+`clean_text_spaces` (voir bench/bench_normalizer.py et son corpus de référence),
+avec des motifs précompilés et moins de passes :
+- les règles qui insèrent un espace entre deux caractères portent sur des paires
+  disjointes ; celles qui partagent un côté sont regroupées dans une même classe ;
+- l'étape 3 reste séparée : ses deux classes se chevauchent (à-ÿ), et la
+  consommation des deux caractères par la regex fait partie du comportement ;
+- les trois remplacements de fin de phrase (étape 7) n'en forment qu'un ;
+- les espaces simples ne sont plus réécrits un par un (étapes 1 et 10) ;
+- les espaces spéciaux (étape 9) passent par `str.replace`, bien plus rapide
+  que `str.translate` sur du texte non ASCII, et seulement s'ils sont présents.
+"""
+import re
+
+_LETTER = "A-Za-zÀ-ÿ"
+
+# 1 et 10. Suites d'au moins deux espaces
+_SPACE_RUN = re.compile(r"  +")
+
+# 2 et 6. Espace après une ponctuation ou ")" suivie d'une lettre
+_AFTER_PUNCTUATION = re.compile(rf"[.,;:!?)](?=[{_LETTER}])")
+
+# 4. Espace entre un chiffre et une lettre...
+_AFTER_DIGIT = re.compile(rf"\d(?=[{_LETTER}])")
+
+# 4 et 5. ... et entre une lettre et un chiffre ou "("
+_BEFORE_DIGIT_OR_PAREN = re.compile(rf"[\d(](?<=[{_LETTER}][\d(])")
+
+# 3. Mots collés (minuscule suivie de majuscule)
+_GLUED_WORDS = re.compile(r"([a-zà-ÿ])([A-ZÀ-Ÿ])")
+
+# 7. Saut de ligne après fin de phrase
+_SENTENCE_END = re.compile(r"([.?!])\s+")
+
+
+def normalize_text(text):
+    """Nettoie et corrige les espaces dans le texte extrait"""
+    if not text:
+        return text
+
+    # `[ \t]+` -> " " équivaut à remplacer les tabulations puis réduire les suites d'espaces
+    text = _SPACE_RUN.sub(" ", text.replace("\t", " "))
+
+    text = _AFTER_PUNCTUATION.sub(r"\g<0> ", text)
+    text = _AFTER_DIGIT.sub(r"\g<0> ", text)
+    text = _BEFORE_DIGIT_OR_PAREN.sub(r" \g<0>", text)
+    text = _GLUED_WORDS.sub(r"\1 \2", text)
+    text = _SENTENCE_END.sub("\\1\n", text)
+
+    # 8. Supprimer les espaces en début/fin de ligne et les lignes vides
+    text = "\n".join([line for line in (raw.strip() for raw in text.split("\n")) if line])
+
+    # 9. Espace insécable -> espace, espace de largeur nulle supprimé
+    if "\u00A0" in text:
+        text = text.replace("\u00A0", " ")
+    if "\u200B" in text:
+        text = text.replace("\u200B", "")
+
+    if "  " in text:
+        text = _SPACE_RUN.sub(" ", text)
+    return text
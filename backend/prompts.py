@@ -0,0 +1,209 @@
+"""
+Construction des prompts envoyés au modèle.
+
+Les modèles de prompt de tous les endpoints sont réunis ici. Le contenu inséré
+(texte du document, passages, résumés partiels) est ajusté à un budget de tokens :
+la taille est estimée localement par `estimate_tokens`, sans appel à l'API, et
+le contenu est coupé à la dernière ligne qui tient dans le budget.
+"""
+import re
+from collections import namedtuple
+
+TRUNCATION_NOTE = "\n\n[Texte tronqué pour des raisons de performance]"
+
+# Approximation d'un tokenizer sous-mot : un token par tranche de 4 caractères de mot
+# et par signe de ponctuation ; les espaces (nombreux avec layout=True) ne comptent pas.
+# L'estimation est un peu pessimiste pour le français, jamais sous-estimée d'un facteur 2.
+_TOKEN_PIECES = re.compile(r"\w{1,4}|[^\w\s]")
+_HORIZONTAL_SPACES = re.compile(r"[ \t]{2,}")
+
+Prompt = namedtuple("Prompt", ["text", "tokens", "truncated"])
+
+SUMMARY_TEMPLATE = """
+Tu es un expert en synthèse de documents.
+Fais un résumé clair, structuré et concis du texte suivant.
+Le résumé doit être en français et ne pas dépasser 300 mots.
+
+Texte à résumer:
+{content}
+"""
+
+SUMMARY_CHUNK_TEMPLATE = """
+Tu es un expert en synthèse de documents.
+Voici une partie d'un document plus long.
+Résume cette partie en français, en 150 mots maximum, en conservant les notions,
+définitions et chiffres importants. N'ajoute ni introduction ni conclusion.
+
+Partie à résumer:
+{content}
+"""
+
+SUMMARY_REDUCE_TEMPLATE = """
+Tu es un expert en synthèse de documents.
+Voici les résumés successifs des différentes parties d'un même document.
+Fais-en un résumé global clair, structuré et concis.
+Le résumé doit être en français et ne pas dépasser 300 mots.
+
+Résumés des parties:
+{content}
+"""
+
+QUIZ_TEMPLATE = """
+Tu es un générateur expert de quiz pédagogiques.
+
+Basé sur le texte suivant, génère un quiz de 5 questions à choix multiples.
+
+INSTRUCTIONS:
+1. Génère exactement 5 questions.
+2. Chaque question doit avoir exactement 4 options.
+3. Formate les options ainsi : "a) ...", "b) ...", "c) ...", "d) ...".
+4. Indique clairement la bonne réponse : "answer": "a) ...".
+5. Ajoute une explication pour chaque bonne réponse.
+6. Utilise uniquement les informations contenues dans le texte.
+7. Retourne la réponse en JSON valide.
+
+Format attendu:
+[
+  {{
+    "question": "Texte",
+    "options": ["a) ...", "b) ...", "c) ...", "d) ..."],
+    "answer": "a) ...",
+    "explanation": "..."
+  }}
+]
+
+Texte:
+{content}
+"""
+
+FLASHCARDS_TEMPLATE = """
+Tu es un expert pédagogique spécialisé dans la création de flashcards.
+
+Basé sur le texte suivant, génère exactement **10 flashcards éducatives**.
+
+INSTRUCTIONS STRICTES :
+1. Génère exactement 10 flashcards.
+2. Chaque flashcard doit contenir :
+   - "recto": une question ou un concept
+   - "verso": la réponse ou l’explication
+3. Les flashcards doivent couvrir les concepts les plus importants du texte.
+4. Sois clair, concis et pédagogique.
+5. Retourne uniquement du JSON valide.
+
+FORMAT EXACT :
+[
+  {{
+    "recto": "Question ou concept",
+    "verso": "Réponse ou explication"
+  }}
+]
+
+Texte :
+{content}
+"""
+
+RESOURCES_TEMPLATE = """
+Tu es un expert en pédagogie et recommandation de ressources d'apprentissage.
+
+Basé sur le texte suivant, génère **5 à 8 ressources éducatives** pour approfondir le sujet.
+
+INSTRUCTIONS STRICTES :
+1. Génère entre 5 et 8 ressources.
+2. Pour chaque ressource, fournis :
+   - "type": (livre, article, vidéo, cours en ligne, MOOC, documentaire, etc.)
+   - "title": titre de la ressource
+   - "description": bref résumé (1 à 3 phrases)
+   - "why_useful": pourquoi cette ressource est pertinente pour comprendre le sujet
+3. Propose des ressources **réelles si possible**, sinon cohérentes.
+4. Retourne uniquement un JSON valide.
+
+FORMAT ATTENDU :
+[
+  {{
+    "type": "livre",
+    "title": "Titre du livre",
+    "description": "Courte description",
+    "why_useful": "Raison de pertinence"
+  }}
+]
+
+Texte :
+{content}
+"""
+
+TEMPLATES = {
+    "summary": SUMMARY_TEMPLATE,
+    "summary_chunk": SUMMARY_CHUNK_TEMPLATE,
+    "summary_reduce": SUMMARY_REDUCE_TEMPLATE,
+    "quiz": QUIZ_TEMPLATE,
+    "flashcards": FLASHCARDS_TEMPLATE,
+    "resources": RESOURCES_TEMPLATE,
+}
+
+
+def estimate_tokens(text):
+    """Nombre de tokens estimé localement (voir _TOKEN_PIECES), en une passe"""
+    return len(_TOKEN_PIECES.findall(text))
+
+
+def pack_text(text, max_tokens=None):
+    """
+    Retourne (texte, tokens estimés, tronqué). Les suites d'espaces sont compactées,
+    puis le texte est coupé à la dernière ligne entière qui tient dans `max_tokens`
+    (la ligne suivante est gardée en partie, jusqu'à son dernier mot qui tient).
+    """
+    text = _HORIZONTAL_SPACES.sub(" ", text)
+    tokens = estimate_tokens(text)
+    if max_tokens is None or tokens <= max_tokens:
+        return text, tokens, False
+
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        line_tokens = estimate_tokens(line)
+        if used + line_tokens > max_tokens:
+            # Part de la ligne proportionnelle au budget restant, coupée sur un espace
+            share = len(line) * (max_tokens - used) // max(line_tokens, 1)
+            head = line[:share].rsplit(" ", 1)[0] if share < len(line) else line
+            head_tokens = estimate_tokens(head)
+            if head and used + head_tokens <= max_tokens:
+                kept.append(head)
+                used += head_tokens
+            break
+        kept.append(line)
+        used += line_tokens
+    return "\n".join(kept), used, True
+
+
+def build_prompt(name, content, max_tokens=None, **fields):
+    """
+    Prompt `name` (voir TEMPLATES) avec `content` ajusté pour que le prompt entier tienne
+    dans `max_tokens` (pas de limite si None). Une mention signale un contenu tronqué.
+    """
+    template = TEMPLATES[name]
+    budget = None
+    if max_tokens is not None:
+        overhead = estimate_tokens(template.format(content=TRUNCATION_NOTE, **fields))
+        budget = max(max_tokens - overhead, 0)
+    content, _, truncated = pack_text(content, budget)
+    if truncated:
+        content += TRUNCATION_NOTE
+    text = template.format(content=content, **fields)
+    return Prompt(text, estimate_tokens(text), truncated)
+
+
+def build_chunk_prompt(chunk):
+    """
+    Prompt de résumé d'un morceau (étape map). Il ne dépend que du texte du morceau :
+    un morceau inchangé garde sa clé de cache quand d'autres sont ajoutés ou retirés.
+    L'ordre des parties n'apparaît qu'à l'étape reduce.
+    """
+    return build_prompt("summary_chunk", chunk).text
+
+
+def build_reduce_prompt(partial_summaries, max_tokens=None):
+    """Prompt de synthèse finale à partir des résumés partiels (étape reduce)"""
+    parts = "\n\n".join(
+        f"Partie {i}:\n{summary}" for i, summary in enumerate(partial_summaries, start=1)
+    )
+    return build_prompt("summary_reduce", parts, max_tokens)
@@ -0,0 +1,306 @@
+"""
+Gouverneur du quota de l'API Gemini, côté client.
+
+Chaque tentative HTTP prend sa place dans une file d'attente avant d'être envoyée :
+- deux seaux de jetons (token bucket) plafonnent les requêtes par minute (`rpm`) et les
+  tokens par minute (`tpm`, prompt estimé + maxOutputTokens, corrigé ensuite par
+  l'usage réel renvoyé par l'API) ;
+- la file est équitable : la priorité la plus haute passe d'abord (les tâches de fond
+  laissent en plus une réserve aux requêtes interactives), puis les endpoints sont
+  servis à tour de rôle, dans l'ordre d'arrivée pour un même endpoint ;
+- un `Retry-After` reçu suspend tous les envois jusqu'à son échéance ;
+- un disjoncteur s'ouvre après `breaker_threshold` échecs consécutifs (429, 5xx,
+  erreurs réseau ; 0 le désactive) : pendant `breaker_cooldown` secondes les appels sont refusés
+  aussitôt (QuotaError), l'appelant sert son contenu de secours sans attendre ;
+  une seule requête d'essai est ensuite autorisée pour le refermer.
+Un appel qui devrait attendre plus de `max_wait` secondes est lui aussi refusé.
+
+L'état (seaux, suspension, disjoncteur) est en mémoire, ou partagé entre processus
+(workers gunicorn, traitement par lots) dans un petit fichier JSON verrouillé par
+flock : placé dans /dev/shm, il reste en mémoire partagée.
+"""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from llm_client import LLMError
+from prompts import estimate_tokens
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas d'état partagé par fichier
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Réponses qui signalent une API saturée ou dégradée (comptées par le disjoncteur)
+FAILURE_STATUSES = {429, 500, 502, 503, 504, "error"}
+
+
+class QuotaError(LLMError):
+    """Appel refusé sans être envoyé : disjoncteur ouvert ou attente trop longue"""
+
+    def __init__(self, message, reason, retry_after=None):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class MemoryState:
+    """État du gouverneur propre au processus"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield self._data
+
+
+class FileState:
+    """État du gouverneur partagé entre processus : fichier JSON lu et réécrit sous flock"""
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise RuntimeError("fcntl est requis pour partager l'état du quota par fichier")
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, "r+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    raw = f.read()
+                    try:
+                        data = json.loads(raw) if raw else {}
+                    except json.JSONDecodeError:
+                        data = {}
+                    before = dict(data)
+                    yield data
+                    if data != before:
+                        f.seek(0)
+                        f.truncate()
+                        f.write(json.dumps(data))
+                        f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def payload_tokens(payload):
+    """Tokens décomptés d'une requête avant envoi : prompt estimé + plafond de la réponse"""
+    prompt = sum(
+        estimate_tokens(part.get("text", ""))
+        for content in payload.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    return prompt + payload.get("generationConfig", {}).get("maxOutputTokens", 0)
+
+
+class Ticket:
+    __slots__ = ("seq", "endpoint", "priority", "cost", "enqueued", "deadline", "probe")
+
+    def __init__(self, seq, endpoint, priority, cost, enqueued, deadline):
+        self.seq = seq
+        self.endpoint = endpoint
+        self.priority = priority
+        self.cost = cost
+        self.enqueued = enqueued
+        self.deadline = deadline
+        self.probe = False
+
+
+class QuotaGovernor:
+    """
+    Limiteur de débit et disjoncteur branché sur le client Gemini (`rate_limiter`).
+
+    Le client appelle `enqueue` puis `poll` jusqu'à obtenir 0 (le délai retourné
+    sinon est à attendre avant de réessayer, avec time.sleep ou asyncio.sleep),
+    envoie la requête et rapporte son issue à `record`. `cancel` retire un ticket abandonné.
+    `rpm` / `tpm` à 0 : pas de limite de ce côté.
+    `on_wait(secondes, endpoint)` est appelé avec le temps passé dans la file par chaque ticket accordé.
+    """
+
+    def __init__(self, rpm=0, tpm=0, state=None, burst_seconds=10.0, max_wait=30.0,
+                 breaker_threshold=5, breaker_cooldown=30.0, background_reserve=0.2,
+                 poll_interval=0.05, on_wait=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state = state or MemoryState()
+        # Capacité des seaux : `burst_seconds` de débit (au moins une requête)
+        self.request_capacity = max(rpm * burst_seconds / 60.0, 1.0) if rpm else 0
+        self.token_capacity = tpm * burst_seconds / 60.0 if tpm else 0
+        self.max_wait = max_wait
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.background_reserve = background_reserve
+        self.poll_interval = poll_interval
+        self.on_wait = on_wait
+        self._lock = threading.Lock()
+        self._waiting = []          # tickets en attente, dans l'ordre d'arrivée
+        self._head = None           # prochain ticket à servir (recalculé quand la file change)
+        self._last_served = {}      # endpoint -> rang du dernier ticket accordé (tour de rôle)
+        self._served = itertools.count()
+        self._seq = itertools.count()
+        self._open_until = 0        # dernière échéance connue du disjoncteur (refus sans lire l'état)
+        self.rejected = {"circuit_open": 0, "max_wait": 0}
+
+    def enqueue(self, payload, endpoint="unknown", priority=PRIORITY_INTERACTIVE):
+        now = time.monotonic()
+        ticket = Ticket(next(self._seq), endpoint, priority, payload_tokens(payload), now, now + self.max_wait)
+        with self._lock:
+            self._waiting.append(ticket)
+            self._head = None
+        return ticket
+
+    def cancel(self, ticket):
+        with self._lock:
+            self._remove(ticket)
+
+    def _remove(self, ticket):
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            self._head = None
+
+    def _current_head(self):
+        """Prochain ticket à servir : meilleure priorité, endpoint servi le moins récemment, puis FIFO"""
+        if self._head is None and self._waiting:
+            self._head = min(
+                self._waiting,
+                key=lambda t: (t.priority, self._last_served.get(t.endpoint, -1), t.seq),
+            )
+        return self._head
+
+    def poll(self, ticket):
+        """
+        0 si le ticket peut partir (il quitte alors la file), sinon le délai (s) avant de
+        redemander. Lève QuotaError (et retire le ticket) si l'appel doit être abandonné.
+        """
+        with self._lock:
+            is_head = self._current_head() is ticket
+        if not is_head:
+            if self._open_until > time.time():
+                self._reject(ticket, "circuit_open", self._open_until - time.time())
+            self._check_deadline(ticket, self.poll_interval)
+            return self.poll_interval
+
+        with self.state.transaction() as state:
+            now = time.time()
+            self._check_breaker(state, ticket, now)
+            wait = max(state.get("blocked_until", 0) - now, 0)
+            if not wait:
+                wait = self._take(state, ticket, now)
+            if ticket.probe and wait:
+                # Une requête d'essai qui doit attendre libère sa place d'essai
+                ticket.probe = False
+                state.pop("probe_until", None)
+
+        if wait:
+            self._check_deadline(ticket, wait)
+            return min(wait, 1.0)
+
+        with self._lock:
+            self._remove(ticket)
+            self._last_served[ticket.endpoint] = next(self._served)
+        if self.on_wait is not None:
+            self.on_wait(time.monotonic() - ticket.enqueued, ticket.endpoint)
+        return 0
+
+    def _reject(self, ticket, reason, retry_after):
+        with self._lock:
+            self._remove(ticket)
+            self.rejected[reason] += 1
+        if reason == "circuit_open":
+            raise QuotaError("API Gemini indisponible (disjoncteur ouvert)", reason, retry_after)
+        raise QuotaError(f"Quota de l'API atteint : attente supérieure à {self.max_wait:g}s", reason, retry_after)
+
+    def _check_deadline(self, ticket, wait):
+        if time.monotonic() + wait > ticket.deadline:
+            self._reject(ticket, "max_wait", wait)
+
+    def _check_breaker(self, state, ticket, now):
+        open_until = self._open_until = state.get("open_until", 0)
+        if not open_until:
+            return
+        if open_until > now or state.get("probe_until", 0) > now:
+            # Ouvert, ou requête d'essai déjà en cours : refus immédiat
+            self._reject(ticket, "circuit_open", max(open_until - now, 0) or self.breaker_cooldown)
+        # Demi-ouvert : ce ticket est la requête d'essai
+        ticket.probe = True
+        state["probe_until"] = now + self.max_wait
+
+    def _take(self, state, ticket, now):
+        """Prélève le ticket dans les seaux ; retourne 0, ou le délai avant qu'ils soient assez remplis"""
+        elapsed = max(now - state.get("updated", now), 0)
+        state["updated"] = now
+        reserve = self.background_reserve if ticket.priority > PRIORITY_INTERACTIVE else 0
+        wait = 0
+        levels = {}
+        for key, capacity, rate, cost in (
+            ("requests", self.request_capacity, self.rpm / 60.0, 1),
+            ("tokens", self.token_capacity, self.tpm / 60.0, ticket.cost),
+        ):
+            if not capacity:
+                continue
+            level = min(state.get(key, capacity) + elapsed * rate, capacity)
+            state[key] = levels[key] = level
+            # Une requête plus grosse que le seau part quand il est plein (le niveau devient négatif)
+            needed = min(cost, capacity) + reserve * capacity
+            needed = min(needed, capacity)
+            if level < needed:
+                wait = max(wait, (needed - level) / rate)
+        if wait:
+            return wait
+        if "requests" in levels:
+            state["requests"] = levels["requests"] - 1
+        if "tokens" in levels:
+            state["tokens"] = levels["tokens"] - ticket.cost
+        return 0
+
+    def record(self, ticket, status, retry_after=None, tokens=None):
+        """Issue d'une requête envoyée : met à jour le disjoncteur, Retry-After et l'usage réel en tokens"""
+        with self.state.transaction() as state:
+            now = time.time()
+            if retry_after:
+                state["blocked_until"] = max(state.get("blocked_until", 0), now + retry_after)
+            if status in FAILURE_STATUSES:
+                failures = state.get("failures", 0) + 1
+                state["failures"] = failures
+                if ticket.probe or (self.breaker_threshold and failures >= self.breaker_threshold):
+                    state["open_until"] = self._open_until = now + max(self.breaker_cooldown, retry_after or 0)
+                    state.pop("probe_until", None)
+                    logger.warning(f"Disjoncteur ouvert pour {self.breaker_cooldown:g}s "
+                                   f"({failures} échec(s) consécutif(s), dernier statut {status})")
+            else:
+                if state.get("open_until"):
+                    logger.info("Disjoncteur refermé")
+                for key in ("failures", "open_until", "probe_until"):
+                    state.pop(key, None)
+                self._open_until = 0
+            if tokens is not None and self.token_capacity and "tokens" in state:
+                # Correction de l'estimation par l'usage facturé
+                state["tokens"] = min(state["tokens"] + ticket.cost - tokens, self.token_capacity)
+
+    def stats(self):
+        with self.state.transaction() as state:
+            now = time.time()
+            circuit = "closed"
+            if state.get("open_until"):
+                circuit = "open" if state["open_until"] > now else "half_open"
+        with self._lock:
+            return {
+                "waiting": len(self._waiting),
+                "circuit": circuit,
+                "rejected": dict(self.rejected),
+            }
@@ -0,0 +1,166 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from prompts import estimate_tokens
+
+# Mots trop fréquents pour distinguer un passage (le texte des cours est surtout en français)
+STOPWORDS = frozenset("""
+les des une que qui dans pour par sur avec est sont pas plus mais ont aux ces cette
+son ses leur leurs tout tous elle elles ils nous vous mon mes entre comme peut
+aussi donc ainsi être avoir fait faire sous lors dont car été était très
+the and for are with that this from have has was were not but can its their
+""".split())
+
+_TOKEN = re.compile(r"\w{3,}")
+
+
+def tokenize(text):
+    """Termes d'un texte : mots d'au moins 3 caractères, en minuscules, hors mots vides"""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS and not token.isdigit()]
+
+
+def text_digest(text):
+    """Clé d'un texte pour le cache d'index"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PassageIndex:
+    """
+    Index BM25 d'un document découpé en passages.
+
+    La matrice passages x termes est stockée en CSR avec des tableaux NumPy
+    (`indptr`, `indices`, `weights`), où `weights` contient directement le poids
+    BM25 de chaque terme dans chaque passage : le score d'une requête est une
+    somme pondérée calculée en une seule passe vectorisée.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = list(passages)
+        vocabulary = {}
+        term_ids = []
+        lengths = []
+        for passage in self.passages:
+            tokens = tokenize(passage)
+            lengths.append(len(tokens))
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+
+        self.vocabulary = vocabulary
+        n_passages = len(self.passages)
+        n_terms = max(len(vocabulary), 1)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        rows = np.repeat(np.arange(n_passages, dtype=np.int64), lengths)
+
+        # Fréquence de chaque couple (passage, terme), triée par passage
+        pairs, tf = np.unique(rows * n_terms + np.asarray(term_ids, dtype=np.int64), return_counts=True)
+        self.rows = pairs // n_terms
+        self.indices = pairs % n_terms
+        self.indptr = np.searchsorted(self.rows, np.arange(n_passages + 1))
+
+        df = np.bincount(self.indices, minlength=n_terms)
+        self.idf = np.log1p((n_passages - df + 0.5) / (df + 0.5))
+        self.term_frequency = np.bincount(self.indices, weights=tf, minlength=n_terms)
+
+        average_length = lengths.mean() if n_passages else 0.0
+        norm = k1 * (1 - b + b * lengths / average_length) if average_length else np.full(n_passages, k1)
+        self.weights = self.idf[self.indices] * tf * (k1 + 1) / (tf + norm[self.rows])
+        self.tokens = np.array([estimate_tokens(passage) for passage in self.passages], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.passages)
+
+    def query_weights(self, query=None, top_terms=200):
+        """
+        Poids des termes de la requête. Sans requête, on prend les termes les plus
+        saillants du document (fréquents mais discriminants), ce qui sert de requête
+        « couvrir les notions importantes » pour les quiz et flashcards.
+        """
+        weights = np.zeros(len(self.idf))
+        if query:
+            for token in tokenize(query):
+                term = self.vocabulary.get(token)
+                if term is not None:
+                    weights[term] += 1.0
+            return weights
+
+        salience = self.idf * np.log1p(self.term_frequency)
+        if len(salience) > top_terms:
+            top = np.argpartition(salience, -top_terms)[-top_terms:]
+            weights[top] = salience[top]
+        else:
+            weights[:] = salience
+        return weights
+
+    def scores(self, query_weights):
+        """Score BM25 de chaque passage pour des poids de requête donnés"""
+        contributions = self.weights * query_weights[self.indices]
+        return np.bincount(self.rows, weights=contributions, minlength=len(self.passages))
+
+    def select(self, max_tokens, query=None, decay=0.5):
+        """
+        Choisit les passages les mieux classés dans la limite de `max_tokens`, puis
+        les remet dans l'ordre du document.
+
+        Après chaque choix, le poids des termes déjà couverts est multiplié par
+        `decay` : les passages suivants apportent d'autres notions au lieu de
+        répéter les mêmes.
+        """
+        if not self.passages:
+            return []
+        query_weights = self.query_weights(query)
+        available = np.ones(len(self.passages), dtype=bool)
+        chosen = []
+        remaining = max_tokens
+        while remaining > 0:
+            candidates = available & (self.tokens <= remaining)
+            if not candidates.any():
+                break
+            scores = np.where(candidates, self.scores(query_weights), -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] <= 0:
+                break
+            chosen.append(best)
+            available[best] = False
+            remaining -= int(self.tokens[best])
+            query_weights[self.indices[self.indptr[best]:self.indptr[best + 1]]] *= decay
+        return [self.passages[i] for i in sorted(chosen)]
+
+
+class PassageIndexCache:
+    """LRU des index de passages, indexé par le hash du texte extrait"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        index = build()
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def stats(self):
+        """Compteurs exposés par /health"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,399 @@
+"""
+Lecture tolérante des réponses structurées du modèle.
+
+`extract_json` parcourt le texte une seule fois (temps linéaire, sans retour
+arrière) : il ignore ce qui précède le premier tableau ou objet JSON (texte,
+balises ```json), s'arrête dès que celui-ci est équilibré et répare au passage
+les défauts courants — virgules finales ou doublées, guillemets typographiques
+utilisés comme délimiteurs, fermetures manquantes ou mal appariées, réponse
+tronquée (le dernier élément incomplet est abandonné).
+
+Les éléments sont ensuite validés par endpoint (quiz, flashcards, ressources) :
+les éléments invalides sont écartés, et seule une réponse sans aucun élément
+exploitable justifie un nouvel appel au modèle. Les mêmes formes sont décrites
+dans RESPONSE_SCHEMAS (sous-ensemble OpenAPI de `responseSchema`) pour que le
+modèle les respecte dès la génération.
+"""
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+OPENERS = {"[": "]", "{": "}"}
+CLOSERS = set(OPENERS.values())
+SMART_QUOTES = {"“", "”", "„", "‟"}
+WHITESPACE = {" ", "\t", "\n", "\r"}
+
+# Caractères qui peuvent suivre l'ouverture d'un JSON (hors texte du type "[voir page 3]")
+_VALUE_STARTS = set('[{"]}-0123456789tfn') | SMART_QUOTES
+_KEY_STARTS = {'"', "}"} | SMART_QUOTES
+
+DEFAULT_EXPLANATION = "Pas d'explication disponible."
+
+
+def _array_of(properties, required, min_items=None, max_items=None):
+    schema = {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": properties,
+            "required": list(required),
+            "propertyOrdering": list(properties),
+        },
+    }
+    if min_items is not None:
+        schema["minItems"] = min_items
+    if max_items is not None:
+        schema["maxItems"] = max_items
+    return schema
+
+
+_STRING = {"type": "STRING"}
+
+# Schémas envoyés dans generationConfig.responseSchema (mêmes champs que les validateurs)
+RESPONSE_SCHEMAS = {
+    "quiz": _array_of(
+        {
+            "question": _STRING,
+            "options": {"type": "ARRAY", "items": _STRING, "minItems": 4, "maxItems": 4},
+            "answer": _STRING,
+            "explanation": _STRING,
+        },
+        ("question", "options", "answer", "explanation"),
+        min_items=5, max_items=5,
+    ),
+    "flashcards": _array_of(
+        {"recto": _STRING, "verso": _STRING},
+        ("recto", "verso"),
+        min_items=10, max_items=10,
+    ),
+    "resources": _array_of(
+        {"type": _STRING, "title": _STRING, "description": _STRING, "why_useful": _STRING},
+        ("type", "title", "description", "why_useful"),
+        min_items=5, max_items=8,
+    ),
+}
+
+
+_OPENER = re.compile(r"[\[{]")
+
+
+# Nombre maximal de débuts de JSON essayés (ex. "Voici [5 questions] : [...]") : le coût reste linéaire
+MAX_CANDIDATES = 4
+
+
+def _candidate_starts(text):
+    """Positions des `[` ou `{` suivis d'un début de valeur JSON plausible"""
+    length = len(text)
+    for match in _OPENER.finditer(text):
+        start = match.start()
+        following = start + 1
+        while following < length and text[following] in WHITESPACE:
+            following += 1
+        allowed = _VALUE_STARTS if text[start] == "[" else _KEY_STARTS
+        if following == length or text[following] in allowed:
+            yield start
+
+
+def repair_json(text, start=None):
+    """
+    Texte du tableau ou objet JSON commençant à `start` (par défaut le premier), réparé ;
+    None s'il n'y en a pas. Un seul passage sur les caractères ; le résultat reste à décoder.
+    """
+    if start is None:
+        start = next(_candidate_starts(text), None)
+        if start is None:
+            return None
+
+    out = []
+    stack = []          # fermetures attendues
+    quote = None        # '"' dans une chaîne normale, "smart" dans une chaîne ouverte par un guillemet typographique
+    escaped = False
+    last = -1           # index dans `out` du dernier caractère significatif hors chaîne
+    # Tableaux ouverts : profondeur -> len(out) juste après leur dernier élément complet
+    # (ou juste après "[" tant qu'aucun élément n'est complet)
+    checkpoints = {}
+
+    def close():
+        nonlocal last
+        if last >= 0 and out[last] == ",":
+            out[last] = ""  # virgule finale
+        checkpoints.pop(len(stack), None)
+        out.append(stack.pop())
+        last = len(out) - 1
+        if stack and stack[-1] == "]":
+            # Objet ou tableau refermé directement dans un tableau : élément complet
+            checkpoints[len(stack)] = len(out)
+
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"' and quote == "smart":
+                out.append('\\"')
+                continue
+            elif char == quote or (quote == "smart" and char in SMART_QUOTES):
+                out.append('"')
+                quote = None
+                last = len(out) - 1
+                continue
+            out.append(char)
+            continue
+
+        if char == '"' or char in SMART_QUOTES:
+            quote = '"' if char == '"' else "smart"
+            out.append('"')
+        elif char in OPENERS:
+            stack.append(OPENERS[char])
+            out.append(char)
+            last = len(out) - 1
+            if char == "[":
+                checkpoints[len(stack)] = len(out)
+        elif char in CLOSERS:
+            if char not in stack:
+                continue
+            while stack[-1] != char:
+                close()
+            close()
+            if not stack:
+                break
+        elif char == ",":
+            if last >= 0 and out[last] in ",[{":
+                continue  # virgule doublée ou en tête
+            if stack[-1] == "]":
+                # Virgule entre deux éléments d'un tableau : le précédent est complet.
+                # Dans un objet, une virgule ne termine qu'un champ : pas de point de reprise
+                checkpoints[len(stack)] = len(out)
+            out.append(char)
+            last = len(out) - 1
+        else:
+            out.append(char)
+            if char not in WHITESPACE:
+                last = len(out) - 1
+
+    if stack:
+        # Réponse tronquée : on revient au dernier élément complet du tableau ouvert le plus
+        # extérieur (l'élément incomplet est abandonné en entier, même si un tableau qu'il
+        # contient a des éléments complets, plutôt que complété par des valeurs par défaut)
+        if not checkpoints:
+            return None
+        depth = min(checkpoints)
+        length = checkpoints[depth]
+        del out[length:]
+        del stack[depth:]
+        last = length - 1
+        while stack:
+            close()
+    return "".join(out)
+
+
+def iter_json(text, limit=MAX_CANDIDATES):
+    """Valeurs JSON (réparées si besoin) trouvées dans `text`, dans l'ordre, au plus `limit`"""
+    if not text:
+        return
+    for attempt, start in enumerate(_candidate_starts(text)):
+        if attempt == limit:
+            return
+        repaired = repair_json(text, start)
+        if repaired is None:
+            continue
+        try:
+            # strict=False : les retours à la ligne bruts dans les chaînes sont acceptés
+            yield json.loads(repaired, strict=False)
+        except (json.JSONDecodeError, RecursionError) as e:
+            logger.warning(f"JSON irréparable: {e}")
+
+
+def extract_json(text):
+    """Premier tableau ou objet JSON de `text` (réparé si besoin), décodé ; None sinon"""
+    return next(iter_json(text), None)
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return ""
+
+
+def _validate_quiz_item(item):
+    question = _text(item.get("question"))
+    options = item.get("options")
+    if not question or not isinstance(options, list):
+        return None
+    options = [option for option in (_text(option) for option in options) if option]
+    if len(options) < 2:
+        return None
+
+    answer = _text(item.get("answer"))
+    if answer not in options:
+        # Réponse donnée sous forme de lettre ("b", "b)") ou sans la lettre : on retrouve l'option
+        letter = answer.rstrip(")").lower()
+        matches = [option for option in options if len(letter) == 1 and option.lower().startswith(f"{letter})")]
+        matches = matches or [option for option in options if answer and option.endswith(answer)]
+        if not matches:
+            return None
+        answer = matches[0]
+
+    return {
+        "question": question,
+        "options": options,
+        "answer": answer,
+        "explanation": _text(item.get("explanation")) or DEFAULT_EXPLANATION,
+    }
+
+
+def _validate_flashcard(item):
+    recto = _text(item.get("recto"))
+    verso = _text(item.get("verso"))
+    if not recto or not verso:
+        return None
+    return {"recto": recto, "verso": verso}
+
+
+def _validate_resource(item):
+    title = _text(item.get("title"))
+    if not title:
+        return None
+    return {
+        "type": _text(item.get("type")) or "Ressource",
+        "title": title,
+        "description": _text(item.get("description")),
+        "why_useful": _text(item.get("why_useful")),
+    }
+
+
+VALIDATORS = {
+    "quiz": _validate_quiz_item,
+    "flashcards": _validate_flashcard,
+    "resources": _validate_resource,
+}
+
+
+def _as_items(data, validator):
+    """Liste des éléments : accepte aussi un élément isolé ou {"quiz": [...]}"""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        if validator(data):
+            return [data]
+        lists = [value for value in data.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return lists[0]
+        return [data]
+    return []
+
+
+def validate_items(data, endpoint, on_invalid=None):
+    """
+    Éléments valides pour l'endpoint (normalisés), ou None si aucun ne l'est.
+    `on_invalid(nombre)` est appelé lorsque des éléments sont écartés.
+    """
+    validator = VALIDATORS[endpoint]
+    items = _as_items(data, validator)
+    valid = [result for result in (validator(item) for item in items if isinstance(item, dict)) if result]
+    if len(valid) < len(items):
+        logger.warning(f"{len(items) - len(valid)} élément(s) sur {len(items)} ignoré(s) ({endpoint})")
+        if on_invalid is not None:
+            on_invalid(len(items) - len(valid))
+    return valid or None
+
+
+_QUESTION = re.compile(r"\*\*\s*(\d+)\.\s*(.*)")
+_OPTION = re.compile(r"([a-d])\)\s*(.*)")
+_CORRECTION = re.compile(r"\*\*\s*(\d+)\.\s*Réponse\s*:\s*([a-d])\)")
+_EXPLANATION = re.compile(r"\*?\s*Explication\s*:\s*(.*)")
+
+
+def _strip_bold(text):
+    return text.strip().strip("*").strip()
+
+
+def parse_markdown_quiz(markdown_text):
+    """
+    Parse le quiz au format Markdown (### Questions / ### Corrections) en structure JSON.
+    Analyse ligne par ligne : chaque expression est ancrée en début de ligne, sans retour arrière.
+    """
+    questions = []
+    corrections = {}
+    explanations = {}
+    section = None
+    current = None  # liste où ajouter les lignes de continuation
+
+    for raw_line in markdown_text.splitlines():
+        line = raw_line.strip()
+        if line.startswith("###"):
+            title = line.lstrip("#").strip().lower()
+            section = "questions" if title.startswith("question") else "corrections" if title.startswith("correction") else None
+            current = None
+            continue
+        if not line:
+            current = None
+            continue
+
+        if section == "questions":
+            match = _QUESTION.match(line)
+            if match:
+                questions.append({"number": int(match.group(1)), "question": _strip_bold(match.group(2)), "options": []})
+                current = None
+                continue
+            match = _OPTION.match(line)
+            if match and questions:
+                questions[-1]["options"].append(f"{match.group(1)}) {match.group(2).strip()}")
+                current = questions[-1]["options"]
+            elif current:
+                current[-1] = f"{current[-1]} {line}"
+        elif section == "corrections":
+            match = _CORRECTION.match(line)
+            if match:
+                number = int(match.group(1))
+                corrections[number] = match.group(2)
+                current = None
+                continue
+            match = _EXPLANATION.match(line)
+            if match and corrections:
+                number = next(reversed(corrections))
+                explanations[number] = [match.group(1).strip()]
+                current = explanations[number]
+            elif current:
+                current.append(line)
+
+    if not questions or not corrections:
+        return None
+
+    quiz_data = []
+    for question in questions:
+        options = (question["options"] + [""] * 4)[:max(4, len(question["options"]))]
+        letter = corrections.get(question["number"])
+        answer = next((option for option in options if letter and option.startswith(f"{letter})")), "")
+        explanation = " ".join(explanations.get(question["number"], [])).rstrip("*").strip()
+        quiz_data.append({
+            "question": question["question"],
+            "options": options,
+            "answer": answer,
+            "explanation": explanation or DEFAULT_EXPLANATION,
+        })
+    return quiz_data
+
+
+def parse_structured_response(text, endpoint=None, on_invalid=None):
+    """
+    Structure exploitable d'une réponse JSON du modèle ; None si rien n'est récupérable.
+    Pour le quiz, le format Markdown reste accepté en dernier recours.
+    """
+    if endpoint not in VALIDATORS:
+        return extract_json(text)
+    for data in iter_json(text):
+        items = validate_items(data, endpoint, on_invalid)
+        if items:
+            return items
+    if endpoint == "quiz" and text:
+        markdown_quiz = parse_markdown_quiz(text)
+        if markdown_quiz:
+            return validate_items(markdown_quiz, endpoint, on_invalid)
+    return None
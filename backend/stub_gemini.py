@@ -0,0 +1,258 @@
+"""
+Serveur local imitant l'API Gemini (generateContent et streamGenerateContent en SSE),
+pour tester hors ligne.
+
+Comme l'API, le stub vérifie la configuration des sorties structurées (400 si
+`responseSchema` est mal formé ou envoyé sans `responseMimeType: application/json`),
+répond par défaut avec un JSON conforme au schéma reçu et coupe la réponse à
+`maxOutputTokens` (finishReason MAX_TOKENS, environ 4 caractères par token).
+Avec `--rpm`, il impose aussi un quota de requêtes par minute (429 + Retry-After).
+
+    python stub_gemini.py --port 8765 --latency 0.2
+    GEMINI_API_BASE=http://localhost:8765/v1beta python app.py
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH_PATTERN = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>\w+)")
+
+DEFAULT_TEXT = "Résumé de test généré par le serveur local."
+
+
+SCHEMA_TYPES = {"STRING", "NUMBER", "INTEGER", "BOOLEAN", "ARRAY", "OBJECT"}
+
+
+def make_response(text, finish_reason="STOP", prompt_tokens=0):
+    """Réponse au format generateContent"""
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": finish_reason,
+            "index": 0
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": prompt_tokens + len(text) // 4,
+        }
+    }
+
+
+def check_schema(schema, path="responseSchema"):
+    """Message d'erreur si le schéma n'est pas un sous-ensemble OpenAPI accepté par l'API, sinon None"""
+    if not isinstance(schema, dict) or str(schema.get("type", "")).upper() not in SCHEMA_TYPES:
+        return f"{path}.type invalide"
+    kind = schema["type"].upper()
+    if kind == "ARRAY":
+        if "items" not in schema:
+            return f"{path}.items manquant"
+        return check_schema(schema["items"], f"{path}.items")
+    if kind == "OBJECT":
+        properties = schema.get("properties")
+        if not isinstance(properties, dict) or not properties:
+            return f"{path}.properties manquant"
+        for name in list(schema.get("required", [])) + list(schema.get("propertyOrdering", [])):
+            if name not in properties:
+                return f"{path} : propriété inconnue {name!r}"
+        for name, sub_schema in properties.items():
+            error = check_schema(sub_schema, f"{path}.properties.{name}")
+            if error:
+                return error
+    return None
+
+
+def check_generation_config(config):
+    """Message d'erreur pour une configuration de sortie structurée invalide, sinon None"""
+    schema = config.get("responseSchema")
+    if schema is None:
+        return None
+    if config.get("responseMimeType") != "application/json":
+        return "responseSchema exige responseMimeType application/json"
+    return check_schema(schema)
+
+
+def sample_from_schema(schema):
+    """Valeur minimale conforme au schéma"""
+    kind = schema["type"].upper()
+    if kind == "ARRAY":
+        return [sample_from_schema(schema["items"]) for _ in range(max(1, schema.get("minItems", 1)))]
+    if kind == "OBJECT":
+        return {name: sample_from_schema(sub_schema) for name, sub_schema in schema["properties"].items()}
+    if kind in ("NUMBER", "INTEGER"):
+        return 1
+    if kind == "BOOLEAN":
+        return True
+    return "Texte de test"
+
+
+def default_responder(payload):
+    """JSON conforme au schéma demandé, ou texte fixe"""
+    schema = payload.get("generationConfig", {}).get("responseSchema")
+    if schema is not None:
+        return json.dumps(sample_from_schema(schema), ensure_ascii=False)
+    return DEFAULT_TEXT
+
+
+class StubGemini:
+    """
+    Serveur stub démarré dans un thread.
+
+    - `responder(payload)` produit le texte de la réponse (par défaut : JSON conforme au
+      schéma demandé, sinon texte fixe)
+    - `latency` ajoute un délai par requête
+    - `fail_statuses` : statuts HTTP renvoyés (dans l'ordre) avant de répondre normalement
+    - `stream_delay` : délai entre deux fragments de streamGenerateContent
+    - `rpm` : requêtes acceptées par minute glissante ; au-delà, 429 avec Retry-After
+    Les requêtes reçues sont conservées dans `requests` pour vérification.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, responder=None, latency=0.0, fail_statuses=(),
+                 stream_delay=0.0, rpm=0):
+        self.responder = responder or default_responder
+        self.rpm = rpm
+        self._accepted = deque()  # instants des requêtes acceptées pendant la dernière minute
+        self.latency = latency
+        self.stream_delay = stream_delay
+        self.fail_statuses = list(fail_statuses)
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def _over_quota(self):
+        """Secondes avant qu'une requête soit de nouveau acceptée (quota `rpm` atteint), sinon None"""
+        if not self.rpm:
+            return None
+        now = time.monotonic()
+        while self._accepted and now - self._accepted[0] >= 60:
+            self._accepted.popleft()
+        if len(self._accepted) >= self.rpm:
+            return math.ceil(60 - (now - self._accepted[0]))
+        self._accepted.append(now)
+        return None
+
+    @property
+    def api_base(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                match = PATH_PATTERN.match(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length) if length else b""
+                if not match:
+                    self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+                    return
+                try:
+                    payload = json.loads(raw or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON"}})
+                    return
+
+                with stub._lock:
+                    stub.requests.append({"model": match.group("model"), "method": match.group("method"),
+                                          "payload": payload, "headers": dict(self.headers)})
+                    status = stub.fail_statuses.pop(0) if stub.fail_statuses else None
+                    retry_after = stub._over_quota() if status is None else None
+
+                if retry_after is not None:
+                    self._send_json(429, {"error": {"code": 429, "message": "Quota exceeded",
+                                                    "status": "RESOURCE_EXHAUSTED"}},
+                                    {"Retry-After": str(retry_after)})
+                    return
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if status is not None:
+                    self._send_json(status, {"error": {"code": status, "message": "Injected failure"}})
+                    return
+                config = payload.get("generationConfig", {})
+                error = check_generation_config(config)
+                if error:
+                    self._send_json(400, {"error": {"code": 400, "message": error, "status": "INVALID_ARGUMENT"}})
+                    return
+
+                text = stub.responder(payload)
+                finish_reason = "STOP"
+                max_chars = config.get("maxOutputTokens", 0) * 4
+                if max_chars and len(text) > max_chars:
+                    text, finish_reason = text[:max_chars], "MAX_TOKENS"
+                if match.group("method") == "streamGenerateContent":
+                    self._send_stream(text)
+                else:
+                    prompt_tokens = sum(len(part.get("text", "")) for content in payload.get("contents", [])
+                                        for part in content.get("parts", [])) // 4
+                    self._send_json(200, make_response(text, finish_reason, prompt_tokens))
+
+            def _send_stream(self, text):
+                # Un événement SSE par mot, comme les fragments renvoyés par Gemini
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for word in re.findall(r"\S+\s*", text):
+                    event = json.dumps(make_response(word), ensure_ascii=False)
+                    self.wfile.write(f"data: {event}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if stub.stream_delay:
+                        time.sleep(stub.stream_delay)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur Gemini local pour tests hors ligne")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="délai (s) par requête")
+    parser.add_argument("--rpm", type=int, default=0, help="quota de requêtes par minute (0 = aucun)")
+    args = parser.parse_args()
+
+    stub = StubGemini(args.host, args.port, latency=args.latency, rpm=args.rpm)
+    print(f"Stub Gemini en écoute sur {stub.api_base}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
@@ -0,0 +1,84 @@
+"""
+Résumé "map-reduce" des documents longs.
+
+Le texte est découpé en morceaux sur des frontières de page (saut de page inséré
+entre les pages à l'extraction) et de phrase (le nettoyage place chaque phrase sur
+sa propre ligne). Les frontières sont choisies d'après le contenu des lignes
+(hash CRC32), et non d'après une position fixe : une petite modification ne déplace
+que les frontières voisines. Le prompt d'un morceau ne dépend que de son texte (ni
+rang ni nombre de morceaux), donc les résumés des autres morceaux restent en cache.
+"""
+import logging
+import zlib
+from concurrent.futures import as_completed
+from contextvars import copy_context
+
+from prompts import build_chunk_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def _split_long_line(line, max_chars):
+    for start in range(0, len(line), max_chars):
+        yield line[start:start + max_chars]
+
+
+def split_into_chunks(text, max_chars=6000, min_chars=None, boundary_modulus=8):
+    """
+    Découpe le texte en morceaux d'au plus `max_chars` caractères.
+
+    Un morceau se termine après une page (saut de page), ou après une ligne dont le
+    hash est multiple de `boundary_modulus` une fois `min_chars` atteint, ou avant de
+    dépasser `max_chars`.
+    """
+    min_chars = min_chars if min_chars is not None else max_chars // 2
+    chunks = []
+    current = []
+    length = 0
+
+    def flush():
+        nonlocal current, length
+        if current:
+            chunks.append("\n".join(current))
+        current = []
+        length = 0
+
+    for page in text.split("\f"):
+        for line in page.split("\n"):
+            if not line.strip():
+                continue
+            for piece in _split_long_line(line, max_chars):
+                if current and length + len(piece) + 1 > max_chars:
+                    flush()
+                current.append(piece)
+                length += len(piece) + 1
+                if length >= min_chars and zlib.crc32(piece.encode("utf-8")) % boundary_modulus == 0:
+                    flush()
+        if length >= min_chars:
+            flush()
+    flush()
+    return chunks
+
+
+def summarize_chunks(chunks, generate, executor):
+    """
+    Étape map : résume chaque morceau en parallèle sur `executor` (parallélisme borné
+    par sa taille). `generate(prompt)` retourne le texte ou None.
+    Les morceaux en échec sont ignorés ; l'ordre des morceaux est conservé.
+    Chaque tâche s'exécute dans une copie du contexte de l'appelant (priorité des appels au modèle).
+    """
+    futures = {
+        executor.submit(copy_context().run, generate, build_chunk_prompt(chunk)): index
+        for index, chunk in enumerate(chunks, start=1)
+    }
+    summaries = {}
+    for future in as_completed(futures):
+        index = futures[future]
+        try:
+            summary = future.result()
+        except Exception as e:
+            logger.warning(f"Résumé de la partie {index} en échec: {e}")
+            continue
+        if summary:
+            summaries[index] = summary
+    return [summaries[index] for index in sorted(summaries)]
@@ -0,0 +1,151 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_text_key(digest, clean_spaces=True, mode="layout"):
+    """Clé de cache d'un PDF : SHA-256 hexadécimal de ses octets + option de nettoyage + mode d'extraction"""
+    return f"{digest}:{int(bool(clean_spaces))}:{mode}"
+
+
+def make_page_key(fingerprint, mode="layout"):
+    """Clé de cache du texte d'une page : empreinte de la page (extraction.page_fingerprint) + mode d'extraction"""
+    return f"page:{fingerprint}:{mode}"
+
+
+class TextCache:
+    """
+    Cache du texte extrait des PDF, adressé par contenu.
+
+    Deux niveaux :
+    - mémoire : LRU borné en nombre d'entrées et en caractères
+    - disque (optionnel) : base SQLite avec texte compressé et expiration (TTL)
+
+    Chaque entrée indique si le texte couvre tout le document (`complete`) ou
+    seulement le début extrait pour un budget de caractères donné.
+    """
+
+    def __init__(self, max_entries=128, max_chars=8_000_000, db_path=None, ttl=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.db_path = db_path
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extracted_text ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, created_at REAL NOT NULL, complete INTEGER NOT NULL)"
+            )
+        self.purge_expired()
+
+    def get(self, key):
+        """Retourne (texte, complete) ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._disk_get(key) if self.db_path else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        self._memory_set(key, entry)
+        return entry
+
+    def set(self, key, text, complete=True):
+        """Enregistre le texte extrait dans les deux niveaux"""
+        if not text:
+            return
+        entry = (text, bool(complete))
+        self._memory_set(key, entry)
+        if self.db_path:
+            self._disk_set(key, entry)
+
+    def _memory_set(self, key, entry):
+        if len(entry[0]) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous[0])
+            self._entries[key] = entry
+            self._chars += len(entry[0])
+            while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted[0])
+
+    def _disk_get(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT data, created_at, complete FROM extracted_text WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if self.ttl and time.time() - row[1] > self.ttl:
+                    conn.execute("DELETE FROM extracted_text WHERE key = ?", (key,))
+                    return None
+                return zlib.decompress(row[0]).decode("utf-8"), bool(row[2])
+        except (sqlite3.Error, zlib.error) as e:
+            logger.warning(f"Cache disque indisponible (lecture): {e}")
+            return None
+
+    def _disk_set(self, key, entry):
+        text, complete = entry
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extracted_text (key, data, created_at, complete) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, zlib.compress(text.encode("utf-8")), time.time(), int(complete)),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Cache disque indisponible (écriture): {e}")
+
+    def purge_expired(self):
+        """Supprime les entrées disque expirées"""
+        if not self.db_path or not self.ttl:
+            return 0
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "DELETE FROM extracted_text WHERE created_at < ?", (time.time() - self.ttl,)
+                )
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Cache disque indisponible (purge): {e}")
+            return 0
+
+    def stats(self):
+        """Compteurs exposés par /health"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "disk_enabled": bool(self.db_path),
+            }
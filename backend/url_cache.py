@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class UrlCache:
+    """
+    Cache HTTP local des PDF téléchargés depuis une URL.
+
+    Pour chaque URL on conserve les octets du PDF, leur SHA-256 (qui sert aussi
+    de clé au cache de texte) et les validateurs `ETag` / `Last-Modified`, afin
+    de revalider avec `If-None-Match` / `If-Modified-Since`. Les fichiers sont
+    évincés par ordre LRU dès que leur taille totale dépasse `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.revalidated = 0
+        self.misses = 0
+        self.stores = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def _name(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, name):
+        base = os.path.join(self.directory, name)
+        return base + ".pdf", base + ".json"
+
+    def _load(self):
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            name = filename[:-5]
+            pdf_path, meta_path = self._paths(name)
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["size"] = os.path.getsize(pdf_path)
+            except (OSError, ValueError):
+                self._remove_files(name)
+                continue
+            entries.append((meta.get("last_used", 0), name, meta))
+        for _, name, meta in sorted(entries):
+            self._entries[name] = meta
+            self._bytes += meta["size"]
+        with self._lock:
+            self._evict()
+
+    def lookup(self, url):
+        """Métadonnées en cache pour cette URL, ou None"""
+        with self._lock:
+            meta = self._entries.get(self._name(url))
+            return dict(meta) if meta else None
+
+    @staticmethod
+    def validators(meta):
+        """En-têtes de requête conditionnelle pour une entrée du cache"""
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def open(self, url):
+        """
+        Ouvre le PDF en cache après une réponse 304 ; retourne (fichier, sha256) ou None
+        si l'entrée a disparu entre-temps.
+        """
+        name = self._name(url)
+        pdf_path, meta_path = self._paths(name)
+        with self._lock:
+            meta = self._entries.get(name)
+            if meta is None:
+                return None
+            try:
+                fileobj = open(pdf_path, "rb")
+            except OSError:
+                self._drop(name)
+                return None
+            meta["last_used"] = time.time()
+            self._entries.move_to_end(name)
+            self.revalidated += 1
+        self._write_meta(meta_path, meta)
+        return fileobj, meta["digest"]
+
+    def store(self, url, fileobj, digest, etag=None, last_modified=None):
+        """Enregistre un PDF téléchargé (seulement s'il porte un validateur)"""
+        if not etag and not last_modified:
+            return
+        name = self._name(url)
+        pdf_path, meta_path = self._paths(name)
+        meta = {
+            "url": url,
+            "digest": digest,
+            "etag": etag,
+            "last_modified": last_modified,
+            "last_used": time.time(),
+        }
+        try:
+            fileobj.seek(0)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as tmp:
+                shutil.copyfileobj(fileobj, tmp)
+            fileobj.seek(0)
+            meta["size"] = os.path.getsize(tmp_path)
+            if meta["size"] > self.max_bytes:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, pdf_path)
+            self._write_meta(meta_path, meta)
+        except OSError as e:
+            logger.warning(f"Cache URL indisponible (écriture): {e}")
+            return
+
+        with self._lock:
+            previous = self._entries.pop(name, None)
+            if previous is not None:
+                self._bytes -= previous["size"]
+            self._entries[name] = meta
+            self._bytes += meta["size"]
+            self.stores += 1
+            self._evict()
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    @staticmethod
+    def _write_meta(meta_path, meta):
+        try:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except OSError as e:
+            logger.warning(f"Cache URL indisponible (métadonnées): {e}")
+
+    def _remove_files(self, name):
+        for path in self._paths(name):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _drop(self, name):
+        meta = self._entries.pop(name, None)
+        if meta is not None:
+            self._bytes -= meta["size"]
+        self._remove_files(name)
+
+    def _evict(self):
+        while self._entries and self._bytes > self.max_bytes:
+            name = next(iter(self._entries))
+            self._drop(name)
+
+    def stats(self):
+        """Compteurs exposés par /health"""
+        with self._lock:
+            return {
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "stores": self.stores,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
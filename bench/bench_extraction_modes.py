@@ -0,0 +1,133 @@
+"""
+Débit et qualité des modes d'extraction (fast, layout, auto), côte à côte.
+
+    python bench/bench_extraction_modes.py                      # corpus synthétique
+    python bench/bench_extraction_modes.py --pdf cours/*.pdf    # + PDF réels
+    python bench/bench_extraction_modes.py --output modes.json
+
+Le corpus synthétique est généré par bench/pdfgen.py (texte, deux colonnes, tableaux,
+pages mélangées). Chaque page est extraite puis nettoyée comme par le serveur
+(normalize_text), sans cache. La qualité est mesurée par rapport au mode layout,
+celui d'origine :
+- `line_similarity` : similarité des suites de lignes, espaces ignorés (ordre de lecture) ;
+- `char_recall`     : part des caractères (hors espaces) du texte layout retrouvés.
+Pour le mode auto, `layout_pages` compte les pages confiées à extract_text(layout=True).
+"""
+import argparse
+import difflib
+import io
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+
+import pdfplumber  # noqa: E402
+
+from extraction import EXTRACTION_MODES, extract_page_text, fast_page_text  # noqa: E402
+from normalizer import normalize_text  # noqa: E402
+from pdfgen import LAYOUTS, make_pdf  # noqa: E402
+
+
+def extract(pdf, mode, max_pages):
+    """Textes nettoyés des pages, dans le mode demandé"""
+    with pdfplumber.open(io.BytesIO(pdf)) as doc:
+        return [normalize_text(extract_page_text(page, None, mode) or "") for page in doc.pages[:max_pages]]
+
+
+def count_layout_pages(pdf, max_pages):
+    with pdfplumber.open(io.BytesIO(pdf)) as doc:
+        return sum(fast_page_text(page)[1] for page in doc.pages[:max_pages])
+
+
+def quality(pages, reference):
+    """(line_similarity, char_recall) du texte `pages` par rapport au texte de référence"""
+    lines = ["".join(line.split()) for text in pages for line in text.splitlines()]
+    expected = ["".join(line.split()) for text in reference for line in text.splitlines()]
+    similarity = difflib.SequenceMatcher(None, lines, expected, autojunk=False).ratio() if expected else 1.0
+    chars = Counter("".join(lines))
+    expected_chars = Counter("".join(expected))
+    total = sum(expected_chars.values())
+    recall = sum((chars & expected_chars).values()) / total if total else 1.0
+    return round(similarity, 4), round(recall, 4)
+
+
+def bench_document(name, pdf, args):
+    page_count = len(extract(pdf, "fast", args.max_pages))
+    rows = []
+    reference = None
+    for mode in ("layout", "fast", "auto"):
+        durations = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            pages = extract(pdf, mode, args.max_pages)
+            durations.append(time.perf_counter() - started)
+        if mode == "layout":
+            reference = pages
+        similarity, recall = quality(pages, reference)
+        median = statistics.median(durations)
+        row = {
+            "document": name,
+            "mode": mode,
+            "pages": page_count,
+            "median_seconds": round(median, 4),
+            "pages_per_second": round(page_count / median, 2) if median else None,
+            "chars": sum(len(text) for text in pages),
+            "line_similarity": similarity,
+            "char_recall": recall,
+        }
+        if mode == "auto":
+            row["layout_pages"] = count_layout_pages(pdf, args.max_pages)
+        rows.append(row)
+    return rows
+
+
+def corpus(args):
+    for layout in args.layouts:
+        yield f"{layout}:{args.pages}", make_pdf(layout, args.pages)
+    for path in args.pdf:
+        yield Path(path).name, Path(path).read_bytes()
+
+
+def print_table(rows):
+    print(f"{'document':<28} {'mode':<7} {'pages/s':>9} {'vs layout':>10} {'lignes':>8} {'caract.':>8} {'layout':>7}",
+          file=sys.stderr)
+    speeds = {}
+    for row in rows:
+        speeds.setdefault(row["document"], {})[row["mode"]] = row["pages_per_second"]
+        base = speeds[row["document"]].get("layout")
+        speedup = f"{row['pages_per_second'] / base:.2f}x" if base and row["pages_per_second"] else "-"
+        print(f"{row['document'][:28]:<28} {row['mode']:<7} {row['pages_per_second'] or 0:>9.1f} {speedup:>10} "
+              f"{row['line_similarity']:>8.3f} {row['char_recall']:>8.3f} {row.get('layout_pages', ''):>7}",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", nargs="*", choices=list(LAYOUTS), default=list(LAYOUTS))
+    parser.add_argument("--pages", type=int, default=10, help="pages de chaque PDF synthétique")
+    parser.add_argument("--pdf", nargs="+", default=[], help="PDF réels ajoutés au corpus")
+    parser.add_argument("--max-pages", type=int, default=50, help="pages lues par document (EXTRACT_MAX_PAGES)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    rows = []
+    for name, pdf in corpus(args):
+        print(f"... {name}", file=sys.stderr)
+        rows.extend(bench_document(name, pdf, args))
+    print_table(rows)
+
+    output = json.dumps({"modes": list(EXTRACTION_MODES), "results": rows}, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
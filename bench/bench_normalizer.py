@@ -0,0 +1,121 @@
+"""
+Corpus de référence et micro-benchmark du normaliseur de texte.
+
+    python bench/bench_normalizer.py            # vérifie le corpus puis mesure
+    python bench/bench_normalizer.py --update   # régénère les sorties attendues
+
+Chaque fichier `golden/NN_nom.txt` est une entrée ; `golden/NN_nom.expected.txt`
+contient la sortie attendue, produite par l'implémentation d'origine
+(`legacy_clean_text_spaces`, conservée ici comme référence).
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+GOLDEN_DIR = BENCH_DIR / "golden"
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+
+from normalizer import normalize_text  # noqa: E402
+
+
+def legacy_clean_text_spaces(text):
+    """Implémentation d'origine de clean_text_spaces (une passe re.sub par règle)"""
+    if not text:
+        return text
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'([.,;:!?])(?=[A-Za-zÀ-ÿ])', r'\1 ', text)
+    text = re.sub(r'([a-zà-ÿ])([A-ZÀ-Ÿ])', r'\1 \2', text)
+    text = re.sub(r'(\d)([A-Za-zÀ-ÿ])', r'\1 \2', text)
+    text = re.sub(r'([A-Za-zÀ-ÿ])(\d)', r'\1 \2', text)
+    text = re.sub(r'([A-Za-zÀ-ÿ])\(', r'\1 (', text)
+    text = re.sub(r'\)(?=[A-Za-zÀ-ÿ])', ') ', text)
+    text = re.sub(r'\.\s+', '.\n', text)
+    text = re.sub(r'\?\s+', '?\n', text)
+    text = re.sub(r'!\s+', '!\n', text)
+    text = '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+    text = text.replace('\u00A0', ' ')
+    text = text.replace('\u200B', '')
+    text = re.sub(r' +', ' ', text)
+    return text
+
+
+def read_text(path):
+    return path.read_bytes().decode("utf-8")
+
+
+def golden_cases():
+    for path in sorted(GOLDEN_DIR.glob("*.txt")):
+        if not path.name.endswith(".expected.txt"):
+            yield path, path.with_name(path.stem + ".expected.txt")
+
+
+def update_golden():
+    for source, expected in golden_cases():
+        expected.write_bytes(legacy_clean_text_spaces(read_text(source)).encode("utf-8"))
+        print(f"écrit {expected.name}")
+
+
+def check_golden():
+    failures = []
+    for source, expected in golden_cases():
+        if normalize_text(read_text(source)) != read_text(expected):
+            failures.append(source.name)
+    return failures
+
+
+def timeit(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(page_counts, repeat):
+    page = "\n".join(read_text(source) for source, _ in golden_cases())
+    results = []
+    for pages in page_counts:
+        text = "\n".join([page] * pages)
+        legacy = timeit(legacy_clean_text_spaces, text, repeat)
+        current = timeit(normalize_text, text, repeat)
+        results.append({
+            "pages": pages,
+            "chars": len(text),
+            "legacy_ms": round(legacy * 1000, 3),
+            "normalizer_ms": round(current * 1000, 3),
+            "speedup": round(legacy / current, 2) if current else None,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="régénère les sorties attendues")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="sortie JSON")
+    args = parser.parse_args()
+
+    if args.update:
+        update_golden()
+        return 0
+
+    failures = check_golden()
+    results = run_benchmark(args.pages, args.repeat)
+    if args.json:
+        print(json.dumps({"golden_failures": failures, "results": results}, indent=2))
+    else:
+        print("Corpus de référence :", "OK" if not failures else f"ÉCHEC ({', '.join(failures)})")
+        for r in results:
+            print(f"{r['pages']:>4} page(s) {r['chars']:>9} car. | "
+                  f"ancien {r['legacy_ms']:>9.3f} ms | nouveau {r['normalizer_ms']:>9.3f} ms | x{r['speedup']}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
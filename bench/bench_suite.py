@@ -0,0 +1,279 @@
+"""
+Suite de benchmarks : extraction, nettoyage, parsing du quiz et endpoints complets.
+
+    python bench/bench_suite.py                           # tous les cas, JSON sur stdout
+    python bench/bench_suite.py --output after.json --compare before.json
+    python bench/bench_suite.py --only extract clean --pages 10 100
+
+Les PDF sont générés par bench/pdfgen.py (texte, deux colonnes, tableaux) ; les
+endpoints `/generate_*` sont appelés contre le stub Gemini local avec une latence
+réglable (`--latency`). Chaque cas tourne dans un processus neuf, ce qui rend son
+pic de mémoire résidente (`peak_rss_mb`) propre au cas. Les caches de texte et de
+réponses sont désactivés pour mesurer le travail réel à chaque répétition.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from stub_gemini import default_responder  # noqa: E402
+
+KINDS = ("extract", "clean", "parse_quiz", "endpoint")
+ENDPOINTS = {
+    "summary": "/generate_summary",
+    "quiz": "/generate_quiz",
+    "flashcards": "/generate_flashcards",
+    "resources": "/generate_educational_resources",
+    "all": "/generate_all",
+}
+
+# Réponses JSON plausibles du stub, selon le prompt reçu (LLM_JSON_MODE=0, sans responseSchema)
+STUB_JSON = {
+    "quiz": [{"question": "Question ?", "options": ["a) 1", "b) 2", "c) 3", "d) 4"],
+              "answer": "a) 1", "explanation": "Parce que."}] * 5,
+    "flashcards": [{"recto": "Concept", "verso": "Définition"}] * 10,
+    "resources": [{"type": "livre", "title": "Titre", "description": "Description",
+                   "why_useful": "Pertinent"}] * 5,
+}
+
+
+def stub_responder(payload):
+    if "responseSchema" in payload.get("generationConfig", {}):
+        return default_responder(payload)
+    prompt = payload["contents"][0]["parts"][0]["text"]
+    if "générateur expert de quiz" in prompt:
+        return json.dumps(STUB_JSON["quiz"])
+    if "flashcards" in prompt:
+        return json.dumps(STUB_JSON["flashcards"])
+    if "ressources éducatives" in prompt:
+        return json.dumps(STUB_JSON["resources"])
+    return "Résumé de test généré par le serveur local."
+
+
+def peak_rss_mb():
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def timed(fn, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return durations, result
+
+
+def summarize(durations):
+    return {
+        "repeat": len(durations),
+        "min_seconds": round(min(durations), 6),
+        "median_seconds": round(statistics.median(durations), 6),
+    }
+
+
+def load_backend(latency=None):
+    """Importe app.py avec des caches désactivés (et le stub Gemini si `latency` est fourni)"""
+    os.environ.update(
+        TEXT_CACHE_SIZE="0", TEXT_CACHE_DB="", LLM_CACHE_DB="", URL_CACHE_MAX_BYTES="0",
+        EXTRACT_MAX_PAGES="0", API_KEY="bench", MODEL="bench-model",
+    )
+    sys.path.insert(0, str(BENCH_DIR))
+    stub = None
+    if latency is not None:
+        from stub_gemini import StubGemini
+        stub = StubGemini(responder=stub_responder, latency=latency).start()
+        os.environ["GEMINI_API_BASE"] = stub.api_base
+    import app
+    return app, stub
+
+
+def run_extract(case, args):
+    app, _ = load_backend()
+    from pdfgen import make_pdf
+    pdf = make_pdf(case["layout"], case["pages"])
+    durations, (text, error) = timed(
+        lambda: app.extract_text_from_pdf(io.BytesIO(pdf), clean_spaces=True, max_chars=10 ** 9), args.repeat
+    )
+    if error:
+        raise RuntimeError(error)
+    result = summarize(durations)
+    result.update(
+        pdf_bytes=len(pdf),
+        chars=len(text),
+        pages_per_second=round(case["pages"] / statistics.median(durations), 2),
+    )
+    return result
+
+
+def run_clean(case, args):
+    app, _ = load_backend()
+    from pdfgen import make_pdf
+    pages = [text for text in app.extraction_engine.extract_pages(make_pdf(case["layout"], case["pages"])) if text]
+    chars = sum(len(text) for text in pages)
+    durations, _ = timed(lambda: [app.clean_text_spaces(text) for text in pages], args.repeat)
+    result = summarize(durations)
+    result.update(chars=chars, chars_per_second=round(chars / statistics.median(durations)))
+    return result
+
+
+def run_parse_quiz(case, args):
+    load_backend()
+    from pdfgen import make_markdown_quiz
+    from structured_output import parse_markdown_quiz
+    markdown = make_markdown_quiz(case["questions"])
+    repeat = args.repeat * 20
+    durations, parsed = timed(lambda: parse_markdown_quiz(markdown), repeat)
+    if not parsed or len(parsed) != case["questions"]:
+        raise RuntimeError("parse_markdown_quiz n'a pas retrouvé toutes les questions")
+    result = summarize(durations)
+    result.update(chars=len(markdown), quizzes_per_second=round(1 / statistics.median(durations), 1))
+    return result
+
+
+def run_endpoint(case, args):
+    app, stub = load_backend(latency=args.latency)
+    from pdfgen import make_pdf
+    pdf = make_pdf(case["layout"], case["pages"])
+    client = app.app.test_client()
+
+    def request():
+        response = client.post(
+            ENDPOINTS[case["endpoint"]],
+            data={"pdf": (io.BytesIO(pdf), "bench.pdf"), "fresh": "true"},
+            content_type="multipart/form-data",
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"{case['endpoint']} : HTTP {response.status_code}")
+        return response.get_json()
+
+    try:
+        durations, body = timed(request, args.repeat)
+    finally:
+        stub.stop()
+    result = summarize(durations)
+    result.update(
+        latency=args.latency,
+        model_calls=len(stub.requests),
+        status=(body.get("metadata") or {}).get("status"),
+    )
+    return result
+
+
+RUNNERS = {
+    "extract": run_extract,
+    "clean": run_clean,
+    "parse_quiz": run_parse_quiz,
+    "endpoint": run_endpoint,
+}
+
+
+def build_cases(args):
+    cases = []
+    for kind in args.only:
+        if kind == "parse_quiz":
+            cases.extend({"kind": kind, "questions": n} for n in args.questions)
+        elif kind == "endpoint":
+            cases.extend(
+                {"kind": kind, "endpoint": name, "layout": "text", "pages": args.endpoint_pages}
+                for name in args.endpoints
+            )
+        else:
+            cases.extend(
+                {"kind": kind, "layout": layout, "pages": pages}
+                for layout in args.layouts for pages in args.pages
+            )
+    for case in cases:
+        case["name"] = ":".join(str(case[key]) for key in ("kind", "endpoint", "layout", "pages", "questions")
+                                if key in case)
+    return cases
+
+
+def run_case_in_subprocess(case, args):
+    """Lance un cas dans un processus neuf et retourne son résultat (avec pic de RSS)"""
+    command = [sys.executable, __file__, "--run-case", json.dumps(case),
+               "--repeat", str(args.repeat), "--latency", str(args.latency)]
+    completed = subprocess.run(command, capture_output=True, text=True, env=dict(os.environ))
+    if completed.returncode != 0:
+        return {**case, "error": completed.stderr.strip().splitlines()[-1:] or ["échec"]}
+    return {**case, **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Affiche le rapport médiane actuelle / médiane de référence, par cas"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {case["name"]: case for case in json.load(f)["cases"]}
+    print(f"{'cas':<40} {'avant (s)':>12} {'après (s)':>12} {'ratio':>8}", file=sys.stderr)
+    for case in results["cases"]:
+        before = baseline.get(case["name"], {}).get("median_seconds")
+        after = case.get("median_seconds")
+        if before and after:
+            print(f"{case['name']:<40} {before:>12.6f} {after:>12.6f} {after / before:>8.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--layouts", nargs="+", choices=["text", "columns", "table"],
+                        default=["text", "columns", "table"])
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 25])
+    parser.add_argument("--questions", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--endpoint-pages", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="latence (s) du stub Gemini")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    parser.add_argument("--compare", help="résultats de référence (JSON) à comparer")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        case = json.loads(args.run_case)
+        result = RUNNERS[case["kind"]](case, args)
+        result["peak_rss_mb"] = peak_rss_mb()
+        print(json.dumps(result))
+        return
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cases": [],
+    }
+    for case in build_cases(args):
+        print(f"... {case['name']}", file=sys.stderr)
+        results["cases"].append(run_case_in_subprocess(case, args))
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
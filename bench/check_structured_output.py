@@ -0,0 +1,62 @@
+"""
+Cas de référence de la réparation des réponses JSON du modèle (structured_output.py).
+
+    python bench/check_structured_output.py
+
+Chaque cas associe une réponse brute à la valeur attendue après extract_json ;
+le script liste les écarts et sort en erreur s'il y en a. Les réponses tronquées
+doivent perdre leur dernier élément incomplet, jamais le garder à moitié rempli.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from structured_output import extract_json, parse_structured_response  # noqa: E402
+
+CASES = [
+    ("virgule finale", '[{"recto": "a", "verso": "b"},]', [{"recto": "a", "verso": "b"}]),
+    ("virgule doublée", '[1,, 2]', [1, 2]),
+    ("balises et texte autour", 'Voici :\n```json\n{"a": [1, 2]}\n```\nBonne révision', {"a": [1, 2]}),
+    ("guillemets typographiques", '[{“recto”: “a”, “verso”: “b”}]', [{"recto": "a", "verso": "b"}]),
+    ("fermeture mal appariée", '[{"a": 1]', [{"a": 1}]),
+    ("tronqué dans le dernier objet",
+     '[{"recto":"a","verso":"b"},{"recto":"c"',
+     [{"recto": "a", "verso": "b"}]),
+    ("tronqué après un champ complet",
+     '[{"recto":"a","verso":"b"},{"recto":"c",',
+     [{"recto": "a", "verso": "b"}]),
+    ("tronqué dans un tableau imbriqué",
+     '[{"question":"q1","options":["a) 1","b) 2"]},{"question":"q2","options":["a) 1",',
+     [{"question": "q1", "options": ["a) 1", "b) 2"]}]),
+    ("tronqué dans un objet enveloppe",
+     '{"quiz": [[1, 2], [3,',
+     {"quiz": [[1, 2]]}),
+    ("tronqué entre deux éléments", '[1, 2, 3', [1, 2]),
+    ("objet tronqué sans tableau", '{"a": "x", "b": "y', None),
+]
+
+# Quiz tronqué : la question incomplète ne doit pas être servie avec l'explication par défaut
+TRUNCATED_QUIZ = (
+    '[{"question": "Q1 ?", "options": ["a) 1", "b) 2"], "answer": "a) 1", "explanation": "Parce que."},'
+    ' {"question": "Q2 ?", "options": ["a) 1", "b) 2"], "answer": "b) 2"'
+)
+
+
+def main():
+    failures = 0
+    for name, raw, expected in CASES:
+        actual = extract_json(raw)
+        if actual != expected:
+            failures += 1
+            print(f"ÉCHEC {name}: {actual!r} au lieu de {expected!r}")
+    quiz = parse_structured_response(TRUNCATED_QUIZ, "quiz")
+    if not quiz or [item["question"] for item in quiz] != ["Q1 ?"]:
+        failures += 1
+        print(f"ÉCHEC quiz tronqué: {quiz!r}")
+    print(f"{len(CASES) + 1 - failures}/{len(CASES) + 1} cas conformes")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Test de charge : débit de requêtes concurrentes, serveur Flask contre serveur ASGI.
+
+    python bench/load_test.py                                  # 200 requêtes, 50 en parallèle
+    python bench/load_test.py --latency 2 --concurrency 100 --memory-mb 1024
+
+Chaque serveur est lancé dans un sous-processus face au stub Gemini local
+(latence fixe, pour mesurer l'attente du modèle et non le modèle lui-même).
+`--memory-mb` fixe un plafond d'espace d'adressage (RLIMIT_AS) identique pour
+les deux serveurs. Les textes envoyés sont tous différents : aucune réponse
+ne vient du cache. Le pic de mémoire résidente (VmHWM) est lu dans /proc.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from stub_gemini import StubGemini  # noqa: E402
+
+SERVERS = {
+    "flask": lambda port: [
+        sys.executable, "-c",
+        f"import app; app.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)",
+    ],
+    "asgi": lambda port: [
+        sys.executable, "-m", "uvicorn", "asgi:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def start_server(name, port, api_base, memory_mb, pool_size):
+    env = dict(
+        os.environ,
+        GEMINI_API_BASE=api_base,
+        LLM_POOL_SIZE=str(pool_size),
+        LLM_POOL_PER_HOST=str(pool_size),
+        API_KEY="bench",
+        MODEL="bench-model",
+        LLM_CACHE_DB="",
+        TEXT_CACHE_DB="",
+        PYTHONUNBUFFERED="1",
+    )
+
+    def limit_memory():
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    return subprocess.Popen(
+        SERVERS[name](port),
+        cwd=BACKEND_DIR,
+        env=env,
+        preexec_fn=limit_memory,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{base_url} ne répond pas")
+
+
+async def run_load(base_url, total, concurrency, endpoint, run_id):
+    latencies = []
+    errors = 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def one(i):
+            nonlocal errors
+            payload = {"text": f"Document {run_id}-{i}. Chapitre sur la photosynthèse et la respiration cellulaire."}
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f"{base_url}{endpoint}", json=payload) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                            return
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_p50": percentile(0.50),
+        "latency_p95": percentile(0.95),
+    }
+
+
+def bench_server(name, args, api_base):
+    port = free_port()
+    process = start_server(name, port, api_base, args.memory_mb, args.pool_size or args.concurrency)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_ready(base_url))
+        result = asyncio.run(run_load(base_url, args.requests, args.concurrency, args.endpoint, name))
+        result["peak_rss_mb"] = peak_rss_mb(process.pid)
+        result["server"] = name
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0, help="latence (s) du stub Gemini")
+    parser.add_argument("--memory-mb", type=int, default=0, help="plafond RLIMIT_AS des serveurs (0 = aucun)")
+    parser.add_argument("--pool-size", type=int, default=0,
+                        help="connexions vers le modèle par serveur (0 = autant que --concurrency)")
+    parser.add_argument("--endpoint", default="/generate_summary")
+    parser.add_argument("--json", action="store_true", help="sortie JSON")
+    args = parser.parse_args()
+
+    results = []
+    with StubGemini(latency=args.latency) as stub:
+        for name in args.servers:
+            results.append(bench_server(name, args, stub.api_base))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.requests} requêtes {args.endpoint}, {args.concurrency} en parallèle, "
+          f"latence du modèle {args.latency} s, mémoire {args.memory_mb or 'illimitée'} Mo")
+    for result in results:
+        print(f"{result['server']:>6} : {result['throughput_rps']} req/s, "
+              f"p50 {result['latency_p50']} s, p95 {result['latency_p95']} s, "
+              f"{result['errors']} erreur(s), pic RSS {result['peak_rss_mb']} Mo")
+
+
+if __name__ == "__main__":
+    main()
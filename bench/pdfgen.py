@@ -0,0 +1,178 @@
+"""
+Génération de PDF synthétiques et reproductibles pour les benchmarks (sans dépendance).
+
+Quatre mises en page :
+- text    : une colonne de paragraphes ;
+- columns : deux colonnes de texte côte à côte ;
+- table   : tableaux quadrillés (lignes tracées + texte dans les cellules) ;
+- mixed   : chaque page tirée au hasard parmi les trois précédentes (une sur deux en texte).
+
+Le contenu est tiré d'un vocabulaire fixe avec une graine : deux appels avec les
+mêmes paramètres produisent exactement les mêmes octets.
+"""
+import random
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 10
+LEADING = 13
+
+WORDS = (
+    "la photosynthèse est un processus biologique par lequel les plantes convertissent "
+    "énergie lumineuse en énergie chimique chlorophylle absorbe lumière dioxyde de carbone "
+    "eau glucose oxygène cellule membrane mitochondrie respiration cellulaire enzyme "
+    "réaction protéine ADN gène chromosome division mitose méiose écosystème population "
+    "évolution sélection naturelle adaptation biodiversité métabolisme hormone système "
+    "nerveux neurone synapse immunité anticorps vaccin bactérie virus"
+).split()
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text_op(x, y, text):
+    # Police Helvetica en WinAnsiEncoding : les accents français sont encodés en cp1252
+    return f"BT /F1 {FONT_SIZE} Tf 1 0 0 1 {x} {y} Tm ({_escape(text)}) Tj ET"
+
+
+def _sentence(rng, min_words=6, max_words=16):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def _wrap(rng, width_chars, line_count):
+    """Lignes de texte d'environ `width_chars` caractères"""
+    lines = []
+    current = ""
+    while len(lines) < line_count:
+        sentence = _sentence(rng)
+        for word in sentence.split():
+            if current and len(current) + 1 + len(word) > width_chars:
+                lines.append(current)
+                current = word
+                if len(lines) == line_count:
+                    break
+            else:
+                current = f"{current} {word}" if current else word
+    return lines
+
+
+def _text_page(rng):
+    ops = []
+    y = PAGE_HEIGHT - MARGIN
+    for line in _wrap(rng, 95, 58):
+        ops.append(_text_op(MARGIN, y, line))
+        y -= LEADING
+    return ops
+
+
+def _columns_page(rng):
+    ops = []
+    column_width = (PAGE_WIDTH - 3 * MARGIN) // 2
+    for column in range(2):
+        x = MARGIN + column * (column_width + MARGIN)
+        y = PAGE_HEIGHT - MARGIN
+        for line in _wrap(rng, 45, 58):
+            ops.append(_text_op(x, y, line))
+            y -= LEADING
+    return ops
+
+
+def _table_page(rng, rows=24, cols=5):
+    ops = ["0.5 w"]
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / cols
+    cell_height = 28
+    top = PAGE_HEIGHT - MARGIN
+    for row in range(rows + 1):
+        y = top - row * cell_height
+        ops.append(f"{MARGIN} {y} m {PAGE_WIDTH - MARGIN} {y} l S")
+    for col in range(cols + 1):
+        x = MARGIN + col * cell_width
+        ops.append(f"{x:.1f} {top} m {x:.1f} {top - rows * cell_height} l S")
+    for row in range(rows):
+        for col in range(cols):
+            if row == 0:
+                text = f"Colonne {col + 1}"
+            elif col == 0:
+                text = rng.choice(WORDS).capitalize()
+            else:
+                text = f"{rng.uniform(0, 1000):.2f}" if rng.random() < 0.6 else rng.choice(WORDS)
+            ops.append(_text_op(round(MARGIN + col * cell_width + 4, 1), top - row * cell_height - 18, text))
+    return ops
+
+
+def _mixed_page(rng):
+    build_page = rng.choice((_text_page, _text_page, _columns_page, _table_page))
+    return build_page(rng)
+
+
+LAYOUTS = {
+    "text": _text_page,
+    "columns": _columns_page,
+    "table": _table_page,
+    "mixed": _mixed_page,
+}
+
+
+def make_pdf(layout="text", pages=10, seed=0, edits=()):
+    """
+    Octets d'un PDF de `pages` pages dans la mise en page demandée.
+    `edits` : numéros (à partir de 0) des pages modifiées, comme dans une nouvelle version
+    du document ; une ligne y est ajoutée en bas de page, les autres pages sont identiques.
+    """
+    rng = random.Random(f"{layout}:{pages}:{seed}")
+    build_page = LAYOUTS[layout]
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    # Numéro d'objet réservé pour /Pages : 2 objets (contenu + page) par page
+    pages_id = len(objects) + 2 * pages + 1
+    page_ids = []
+    for number in range(pages):
+        ops = build_page(rng)
+        if number in edits:
+            ops.append(_text_op(MARGIN, MARGIN // 2, f"Page {number + 1} modifiée"))
+        content = "\n".join(ops).encode("cp1252")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>"
+            % (pages_id, PAGE_WIDTH, PAGE_HEIGHT, content_id, font)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    assert add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)) == pages_id
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def make_markdown_quiz(questions=5, seed=0):
+    """Quiz au format Markdown attendu par parse_markdown_quiz"""
+    rng = random.Random(f"quiz:{questions}:{seed}")
+    parts = ["### Questions\n"]
+    for number in range(1, questions + 1):
+        parts.append(f"**{number}. {_sentence(rng)[:-1]} ?**\n")
+        for letter in "abcd":
+            parts.append(f"{letter}) {_sentence(rng, 2, 5)}\n")
+        parts.append("\n")
+    parts.append("### Corrections\n")
+    for number in range(1, questions + 1):
+        letter = rng.choice("abcd")
+        parts.append(f"**{number}. Réponse : {letter}) {_sentence(rng, 2, 5)}**\n")
+        parts.append(f"*Explication : {_sentence(rng)}\n\n")
+    return "".join(parts)
@@ -4,6 +4,10 @@ let quizSubmitted = false;
 let currentFlashcards = [];
 let currentPDF = null;
 
+// Document extrait côté serveur (POST /documents), réutilisé par tous les boutons
+// L'envoi en cours est partagé : deux clics simultanés n'envoient le PDF qu'une fois
+let currentDocument = null; // { key, promise, id }
+
 // Variables pour suivre l'état des chargements
 let isLoadingSummary = false;
 let isLoadingQuiz = false;
@@ -137,18 +141,122 @@ function checkPDFSelected() {
 
      return true; // Fichier PDF valide
 }
-// Générer uniquement le résumé
-async function generateSummary() {
-    if (!checkPDFSelected()) return;
+// Clé identifiant la source PDF actuellement sélectionnée
+function getSourceKey() {
+    const file = document.getElementById("pdfInput").files[0];
+    const url = document.getElementById("pdfUrlInput").value.trim();
+    if (file) {
+        return `file:${file.name}:${file.size}:${file.lastModified}`;
+    }
+    return `url:${url}`;
+}
+
+// Envoie le PDF une seule fois et retourne son document_id
+function getDocumentId() {
+    const key = getSourceKey();
+    if (currentDocument && currentDocument.key === key) {
+        return currentDocument.promise;
+    }
+
+    const entry = { key, promise: null, id: null };
+    entry.promise = uploadDocument().then(
+        (id) => {
+            entry.id = id;
+            return id;
+        },
+        (error) => {
+            // Échec : le prochain clic renvoie le PDF
+            if (currentDocument === entry) {
+                currentDocument = null;
+            }
+            throw error;
+        }
+    );
+    currentDocument = entry;
+    return entry.promise;
+}
+
+async function uploadDocument() {
     const file = document.getElementById("pdfInput").files[0];
     const url = document.getElementById("pdfUrlInput").value.trim();
     const formData = new FormData();
-    if(file){
+    if (file) {
         formData.append("pdf", file);
-    }
-    if(url){
+    } else {
         formData.append("url", url);
     }
+
+    const response = await fetch("http://localhost:5000/documents", {
+        method: "POST",
+        body: formData
+    });
+    const data = await response.json();
+    if (!response.ok || data.error) {
+        throw new Error(data.error || `Erreur serveur: ${response.status}`);
+    }
+
+    return data.document_id;
+}
+
+// Appelle un endpoint de génération avec le document_id (réenvoie le PDF si expiré)
+async function fetchWithDocument(endpoint) {
+    for (let attempt = 0; attempt < 2; attempt++) {
+        const documentId = await getDocumentId();
+        const response = await fetch(`http://localhost:5000/${endpoint}`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ document_id: documentId })
+        });
+
+        if (response.status === 404 && attempt === 0) {
+            // Document expiré : oublié, sauf si un autre clic l'a déjà renvoyé
+            if (currentDocument && currentDocument.id === documentId) {
+                currentDocument = null;
+            }
+            continue;
+        }
+        if (!response.ok) {
+            throw new Error(`Erreur serveur: ${response.status}`);
+        }
+        return response;
+    }
+}
+
+async function postWithDocument(endpoint) {
+    const response = await fetchWithDocument(endpoint);
+    return response.json();
+}
+
+// Lit un flux Server-Sent Events et appelle onEvent(event, data) pour chaque événement
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let separator;
+        while ((separator = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+
+            let event = "message";
+            let data = "";
+            rawEvent.split("\n").forEach(line => {
+                if (line.startsWith("event:")) event = line.slice(6).trim();
+                else if (line.startsWith("data:")) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+// Générer uniquement le résumé
+async function generateSummary() {
+    if (!checkPDFSelected()) return;
     setLoadingState('summaryBtn', true);
     isLoadingSummary = true;
     
@@ -157,22 +265,19 @@ async function generateSummary() {
     document.getElementById("summary").innerHTML = '<div class="loading">⏳ Génération du résumé en cours...</div>';
     
     try {
-        const response = await fetch("http://localhost:5000/generate_summary", {
-            method: "POST",
-            body: formData
+        const response = await fetchWithDocument("generate_summary_stream");
+        const summaryElement = document.getElementById("summary");
+        let summaryText = "";
+
+        // Afficher le résumé au fur et à mesure de sa génération
+        await readEventStream(response, (event, data) => {
+            if (event === "chunk") {
+                summaryText += data.text;
+                summaryElement.innerText = summaryText;
+            } else if (event === "error") {
+                summaryElement.innerHTML = `<div class="error">❌ ${data.error}</div>`;
+            }
         });
-
-        if (!response.ok) {
-            throw new Error(`Erreur serveur: ${response.status}`);
-        }
-
-        const data = await response.json();
-        
-        if (data.error) {
-            document.getElementById("summary").innerHTML = `<div class="error">❌ ${data.error}</div>`;
-        } else {
-            document.getElementById("summary").innerText = data.summary;
-        }
         
     } catch (err) {
         console.error(err);
@@ -187,15 +292,6 @@ async function generateSummary() {
 async function generateQuiz() {
     if (!checkPDFSelected()) return;
 
-    const file = document.getElementById("pdfInput").files[0];
-    const url = document.getElementById("pdfUrlInput").value.trim();
-    const formData = new FormData();
-    if(file){
-        formData.append("pdf", file);
-    }
-    if(url){
-        formData.append("url", url);
-    }
     setLoadingState('quizBtn', true);
     isLoadingQuiz = true;
     
@@ -212,16 +308,7 @@ async function generateQuiz() {
     currentQuiz = null;
 
     try {
-        const response = await fetch("http://localhost:5000/generate_quiz", {
-            method: "POST",
-            body: formData
-        });
-
-        if (!response.ok) {
-            throw new Error(`Erreur serveur: ${response.status}`);
-        }
-
-        const data = await response.json();
+        const data = await postWithDocument("generate_quiz");
         
         if (data.error) {
             document.getElementById("quizForm").innerHTML = `<div class="error">❌ ${data.error}</div>`;
@@ -243,15 +330,6 @@ async function generateQuiz() {
 // Générer les flashcards
 async function generateFlashcards() {
     if (!checkPDFSelected()) return;
-    const file = document.getElementById("pdfInput").files[0];
-    const url = document.getElementById("pdfUrlInput").value.trim();
-    const formData = new FormData();
-    if(file){
-        formData.append("pdf", file);
-    }
-    if(url){
-        formData.append("url", url);
-    }
     setLoadingState('flashcardsBtn', true);
     isLoadingFlashcards = true;
     
@@ -261,16 +339,7 @@ async function generateFlashcards() {
     document.getElementById("flashcardsContent").innerHTML = '<div class="loading">⏳ Génération des flashcards en cours...</div>';
     
     try {
-        const response = await fetch("http://localhost:5000/generate_flashcards", {
-            method: "POST",
-            body: formData
-        });
-
-        if (!response.ok) {
-            throw new Error(`Erreur serveur: ${response.status}`);
-        }
-
-        const data = await response.json();
+        const data = await postWithDocument("generate_flashcards");
         
         if (data.error) {
             document.getElementById("flashcardsContent").innerHTML = `<div class="error">❌ ${data.error}</div>`;
@@ -291,15 +360,6 @@ async function generateFlashcards() {
 // Générer les ressources éducatives
 async function generateResources() {
     if (!checkPDFSelected()) return;
-    const file = document.getElementById("pdfInput").files[0];
-    const url = document.getElementById("pdfUrlInput").value.trim();
-    const formData = new FormData();
-    if(file){
-        formData.append("pdf", file);
-    }
-    if(url){
-        formData.append("url", url);
-    }
     
     setLoadingState('resourcesBtn', true);
     isLoadingResources = true;
@@ -309,14 +369,7 @@ async function generateResources() {
     document.getElementById("resourcesContent").innerHTML = '<div class="loading">⏳ Génération des ressources en cours...</div>';
     
     try {
-        const response = await fetch("http://localhost:5000/generate_educational_resources", {
-            method: "POST",
-            body: formData
-        });
-        if (!response.ok) {
-            throw new Error(`Erreur serveur: ${response.status}`);
-        }
-        const data = await response.json();
+        const data = await postWithDocument("generate_educational_resources");
         
         if (data.error) {
             document.getElementById("resourcesContent").innerHTML = `<div class="error">❌ ${data.error}</div>`;